@@ -0,0 +1,225 @@
+import re
+import time
+import asyncio
+import logging
+import unicodedata
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# USPS-style abbreviations, so "123 Beach Drive" and "123 beach dr." agree
+ADDRESS_ABBREVIATIONS = {
+    "street": "st",
+    "avenue": "ave",
+    "drive": "dr",
+    "road": "rd",
+    "boulevard": "blvd",
+    "lane": "ln",
+    "court": "ct",
+    "circle": "cir",
+    "place": "pl",
+    "parkway": "pkwy",
+    "highway": "hwy",
+    "terrace": "ter",
+    "trail": "trl",
+    "north": "n",
+    "south": "s",
+    "east": "e",
+    "west": "w",
+    "apartment": "unit",
+    "apt": "unit",
+    "suite": "unit",
+    "ste": "unit",
+    "florida": "fl",
+}
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_address(address: Optional[str]) -> str:
+    """Canonical form of a free-text address for equality lookups."""
+    if not address:
+        return ""
+    text = unicodedata.normalize("NFKC", address).lower()
+    text = _PUNCTUATION.sub(" ", text)
+    words = [ADDRESS_ABBREVIATIONS.get(word, word) for word in _WHITESPACE.split(text.strip())]
+    return " ".join(word for word in words if word)
+
+
+def address_pattern(address: Optional[str]) -> str:
+    """Regex (to apply case-insensitively) matching the raw spellings that
+    normalize like ``address``, e.g. "123 Beach Drive" and "123 beach dr."."""
+    alternatives = []
+    for word in normalize_address(address).split():
+        spellings = {word, *(full for full, short in ADDRESS_ABBREVIATIONS.items() if short == word)}
+        alternatives.append("(?:" + "|".join(re.escape(spelling) for spelling in sorted(spellings, key=len, reverse=True)) + ")")
+    return r"^\W*" + r"\W+".join(alternatives) + r"\W*$"
+
+
+class PropertyAddressIndex:
+    """In-memory normalized address -> property id map for active properties.
+
+    Loaded from the properties collection on first use and reloaded after
+    ``invalidate()`` (called on every property write) or after ``ttl``
+    seconds. Addresses shared by two active properties map to None rather
+    than to an arbitrary one of them.
+    """
+
+    def __init__(self, collection, ttl: float = 300.0):
+        self.collection = collection
+        self.ttl = ttl
+        self._mapping: Optional[Dict[str, Optional[str]]] = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self.loads = 0
+
+    async def resolve(self, address: Optional[str]) -> Optional[str]:
+        key = normalize_address(address)
+        if not key:
+            return None
+        mapping = await self._current()
+        return mapping.get(key)
+
+    async def _current(self) -> Dict[str, Optional[str]]:
+        if self._mapping is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return self._mapping
+        async with self._lock:
+            if self._mapping is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return self._mapping
+            generation = self._generation
+            mapping: Dict[str, Optional[str]] = {}
+            async for prop in self.collection.find({"isActive": True}, {"id": 1, "propertyAddress": 1}):
+                key = normalize_address(prop.get("propertyAddress"))
+                if not key:
+                    continue
+                mapping[key] = None if key in mapping and mapping[key] != prop["id"] else prop["id"]
+            self.loads += 1
+            # A write during the load may not be in it; keep it for this call only
+            if generation == self._generation:
+                self._mapping = mapping
+                self._loaded_at = time.monotonic()
+            return mapping
+
+    def invalidate(self):
+        self._generation += 1
+        self._mapping = None
+
+    def stats(self) -> dict:
+        return {
+            "name": "property_address",
+            "size": len(self._mapping) if self._mapping is not None else None,
+            "loads": self.loads
+        }
+
+
+async def stamp_property_ids(
+    collection,
+    index: PropertyAddressIndex,
+    batch_size: int = 500,
+    updated_field: Optional[str] = None,
+    addresses: Optional[Set[str]] = None
+) -> int:
+    """Set propertyId on documents whose address resolves to a property.
+
+    Without ``addresses`` only documents lacking a propertyId are stamped.
+    ``addresses`` (normalized) are ones whose property changed (address
+    edited, property added or deleted): every document with one of them is
+    restamped, whatever its current propertyId, which is cleared if the
+    address no longer resolves. ``updated_field`` names the collection's
+    last-modified timestamp, bumped with the stamp so delta sync and ETags
+    see the change.
+    """
+    stamped = 0
+    updates = []
+    query = {"propertyId": None, "propertyAddress": {"$ne": None}}
+    if addresses is not None:
+        if not addresses:
+            return 0
+        query = {"propertyAddress": {"$regex": "|".join(address_pattern(address) for address in sorted(addresses)), "$options": "i"}}
+    async for doc in collection.find(query, {"propertyAddress": 1, "propertyId": 1}):
+        current = doc.get("propertyId")
+        property_id = await index.resolve(doc.get("propertyAddress"))
+        if property_id != current and (property_id or addresses is not None):
+            fields = {"propertyId": property_id}
+            if updated_field:
+                fields[updated_field] = datetime.utcnow()
+            # Unless another write restamped it meanwhile
+            updates.append(UpdateOne({"_id": doc["_id"], "propertyId": current}, {"$set": fields}))
+        if len(updates) >= batch_size:
+            await collection.bulk_write(updates, ordered=False)
+            stamped += len(updates)
+            updates = []
+    if updates:
+        await collection.bulk_write(updates, ordered=False)
+        stamped += len(updates)
+    return stamped
+
+
+class PropertyIdStamper:
+    """Runs ``stamp(addresses)`` in the background after property writes,
+    one run at a time.
+
+    Addresses requested while a run is going are coalesced into the next
+    run; ``None`` asks for every address. Until a requested address has been
+    stamped, ``settling(address)`` is true so readers can also match records
+    by address. Addresses changed on other workers (``note_remote``) count
+    as settling for ``grace`` seconds, the time their worker has to stamp.
+    """
+
+    def __init__(self, stamp: Callable[[Optional[Set[str]]], Awaitable[None]], grace: float = 300.0):
+        self.stamp = stamp
+        self.grace = grace
+        self._pending: Optional[Set[str]] = set()
+        self._active: Optional[Set[str]] = set()
+        self._remote: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+
+    def request(self, addresses: Optional[Iterable[str]] = None):
+        if addresses is None:
+            self._pending = None
+        elif self._pending is not None:
+            self._pending.update(key for key in map(normalize_address, addresses) if key)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self._pending is None or self._pending:
+            self._active, self._pending = self._pending, set()
+            try:
+                await self.stamp(self._active)
+                self.runs += 1
+            except Exception as e:
+                logger.error(f"Error stamping property ids: {str(e)}")
+            finally:
+                self._active = set()
+
+    def note_remote(self, addresses: Iterable[str]):
+        deadline = time.monotonic() + self.grace
+        for key in map(normalize_address, addresses):
+            if key:
+                self._remote[key] = deadline
+
+    def settling(self, address: Optional[str]) -> bool:
+        if self._pending is None or self._active is None:
+            return True
+        key = normalize_address(address)
+        if key in self._pending or key in self._active:
+            return True
+        deadline = self._remote.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            del self._remote[key]
+            return False
+        return deadline is not None
+
+    async def stop(self):
+        # Stamping is idempotent; the startup backfill finishes an interrupted run
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for LuxServ 365 backend hot paths.
+
+Usage:
+    python benchmarks.py serialization --rows 1000 10000
+    python benchmarks.py compression --rows 50 1000
+    python benchmarks.py ids --rows 100000      # needs a reachable MONGO_URL
+    python benchmarks.py bookings --rows 10000 [--write]
+    python benchmarks.py booking-endpoint --rows 10000   # writes to MONGO_URL's database
+"""
+
+import os
+import sys
+import json
+import asyncio
+import time
+import zlib
+import uuid
+import argparse
+from datetime import datetime, timedelta
+
+# server.py needs a Mongo URL at import time; nothing connects until a query runs
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017/luxserv365_bench')
+
+from fastapi.encoders import jsonable_encoder
+
+from server import GuestRequest, GUEST_REQUEST_SUMMARY_FIELDS, booking_from_webhook
+from serialization import dumps, to_rows
+from compression import brotli
+from ids import new_id, document_for
+from booking_ingest import parse_batch_body, upsert_bookings
+
+
+def make_guest_request_docs(count: int) -> list:
+    """Build documents shaped like stored guest requests."""
+    now = datetime.utcnow()
+    docs = []
+    for i in range(count):
+        docs.append({
+            "_id": uuid.uuid4().hex[:24],
+            "id": str(uuid.uuid4()),
+            "bookingId": None,
+            "guestName": f"Guest {i}",
+            "guestEmail": f"guest{i}@example.com",
+            "guestPhone": "(850) 555-0123",
+            "numberOfGuests": 4,
+            "propertyAddress": f"{100 + i % 50} Beach Drive, Panama City Beach, FL 32413",
+            "checkInDate": "2025-06-01",
+            "checkOutDate": "2025-06-08",
+            "unitNumber": "12B",
+            "requestType": "housekeeping-requests",
+            "priority": "normal",
+            "message": "Could we get extra towels and a late checkout? " * 10,
+            "photos": [{"id": str(uuid.uuid4()), "filename": "a.jpg", "originalName": "a.jpg", "uploadedAt": now}],
+            "createdAt": now - timedelta(minutes=i),
+            "status": "pending",
+            "respondedAt": None,
+            "internalNotes": [f"[2025-06-01 10:00 - admin] note {n}" for n in range(3)],
+            "adminPhotos": [],
+            "lastUpdatedBy": "admin",
+            "lastUpdatedAt": now
+        })
+    return docs
+
+
+def _time_per_row(fn, docs, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(docs)
+        best = min(best, time.perf_counter() - started)
+    return best / len(docs) * 1e6
+
+
+def _validate_and_encode(docs):
+    # Previous read path: validate every row, then jsonable_encoder + json.dumps
+    payload = {"success": True, "data": [GuestRequest(**doc).dict() for doc in docs]}
+    return json.dumps(jsonable_encoder(payload)).encode("utf-8")
+
+
+def _project_and_orjson(docs):
+    return dumps({"success": True, "data": to_rows(GuestRequest, docs)})
+
+
+def bench_serialization(rows: list, repeat: int):
+    print(f"{'rows':>8} {'validate+encode us/row':>24} {'project+orjson us/row':>23} {'speedup':>8}")
+    for count in rows:
+        docs = make_guest_request_docs(count)
+        old = _time_per_row(_validate_and_encode, docs, repeat)
+        new = _time_per_row(_project_and_orjson, docs, repeat)
+        print(f"{count:>8} {old:>24.2f} {new:>23.2f} {old / new:>7.1f}x")
+
+
+def _time_call(fn, repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return result, best * 1000
+
+
+def bench_compression(rows: list, repeat: int):
+    codecs = [
+        ("gzip-1", lambda data: zlib.compress(data, 1)),
+        ("gzip-6", lambda data: zlib.compress(data, 6)),
+    ]
+    if brotli is not None:
+        codecs.append(("br-4", lambda data: brotli.compress(data, quality=4)))
+    else:
+        print("brotli not installed; skipping br")
+
+    print(f"{'rows':>6} {'view':>8} {'raw KiB':>9} {'codec':>7} {'KiB':>8} {'ratio':>6} {'ms':>7}")
+    for count in rows:
+        docs = make_guest_request_docs(count)
+        for view, fields in (("full", None), ("summary", GUEST_REQUEST_SUMMARY_FIELDS)):
+            payload = dumps({"success": True, "data": to_rows(GuestRequest, docs, fields)})
+            for name, codec in codecs:
+                compressed, elapsed = _time_call(lambda: codec(payload), repeat)
+                print(
+                    f"{count:>6} {view:>8} {len(payload) / 1024:>9.1f} {name:>7} "
+                    f"{len(compressed) / 1024:>8.1f} {len(payload) / len(compressed):>5.1f}x {elapsed:>7.2f}"
+                )
+
+
+def _insert_keyed(collection, docs, batch_size: int) -> float:
+    started = time.perf_counter()
+    for start in range(0, len(docs), batch_size):
+        collection.insert_many(docs[start:start + batch_size], ordered=False)
+    return time.perf_counter() - started
+
+
+def bench_ids(rows: list, batch_size: int):
+    """Insert throughput and index size: uuid4 ``id`` + ObjectId ``_id`` vs UUIDv7 ``_id``."""
+    from pymongo import MongoClient
+
+    db = MongoClient(os.environ['MONGO_URL'])["luxserv365_bench"]
+    layouts = [
+        ("uuid4 id + _id", lambda doc: {**doc, "id": str(uuid.uuid4())}, ["id"]),
+        ("uuid7 _id", lambda doc: {**doc, "_id": doc["id"]}, []),
+    ]
+    print(f"{'rows':>8} {'layout':>16} {'inserts/s':>11} {'index KiB':>10} {'indexes':>8}")
+    for count in rows:
+        base = make_guest_request_docs(count)
+        for doc in base:
+            del doc["_id"]
+        for name, shape, extra_indexes in layouts:
+            collection = db[f"ids_{count}"]
+            collection.drop()
+            for field in extra_indexes:
+                collection.create_index(field)
+            docs = [shape({**doc, "id": new_id()}) for doc in base]
+            elapsed = _insert_keyed(collection, docs, batch_size)
+            stats = db.command("collStats", collection.name)
+            print(
+                f"{count:>8} {name:>16} {count / elapsed:>11.0f} "
+                f"{stats['totalIndexSize'] / 1024:>10.0f} {stats['nindexes']:>8}"
+            )
+            collection.drop()
+
+
+def make_booking_payloads(count: int) -> list:
+    """Build booking-created webhook payloads, as an onboarding import sends them."""
+    return [{
+        "booking_id": f"HM{i:08d}",
+        "platform": "airbnb",
+        "property_address": f"{100 + i % 50} Beach Drive, Panama City Beach, FL 32413",
+        "guest_name": f"Guest {i}",
+        "guest_email": f"guest{i}@example.com",
+        "guest_count": 4,
+        "check_in_date": "2025-06-01",
+        "check_out_date": "2025-06-08",
+        "special_requests": "Late check-in"
+    } for i in range(count)]
+
+
+def bench_bookings(rows: list, write: bool, chunk_size: int):
+    """Batch ingestion rate: parse + validate alone, and with bulk upserts."""
+    collection = None
+    if write:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        collection = AsyncIOMotorClient(os.environ['MONGO_URL'])["luxserv365_bench"]["bookings"]
+
+    async def ingest(body: bytes):
+        documents = [document_for(booking_from_webhook(item)) for item in parse_batch_body(body, "application/json")]
+        if collection is not None:
+            for start in range(0, len(documents), chunk_size):
+                await upsert_bookings(collection, documents[start:start + chunk_size])
+        return documents
+
+    async def run():
+        print(f"{'rows':>8} {'stage':>16} {'bookings/s':>11}")
+        for count in rows:
+            body = dumps(make_booking_payloads(count))
+            if collection is not None:
+                await collection.drop()
+                await collection.create_index([("platform", 1), ("platformBookingId", 1)], unique=True)
+            started = time.perf_counter()
+            await ingest(body)
+            elapsed = time.perf_counter() - started
+            stage = "validate+upsert" if collection is not None else "validate"
+            print(f"{count:>8} {stage:>16} {count / elapsed:>11.0f}")
+            if collection is not None:
+                # Replaying the same batch: every row is a duplicate
+                started = time.perf_counter()
+                await ingest(body)
+                print(f"{count:>8} {'replay':>16} {count / (time.perf_counter() - started):>11.0f}")
+                await collection.drop()
+
+    asyncio.run(run())
+
+
+def bench_booking_endpoint(rows: list):
+    """The whole POST /webhooks/bookings/batch path: validation, upserts and
+    the follow-up work for created bookings (occupancy, service jobs, parked
+    events). Writes to the database named in MONGO_URL."""
+    import server
+    from starlette.requests import Request
+
+    if not server.db.name.endswith("_bench"):
+        print(f"Refusing to write to {server.db.name}; point MONGO_URL at a *_bench database")
+        return
+
+    def request_for(body: bytes) -> Request:
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+        scope = {"type": "http", "method": "POST", "path": "/api/webhooks/bookings/batch", "headers": [(b"content-type", b"application/json")]}
+        return Request(scope, receive)
+
+    async def reset():
+        for name in ("bookings", "scheduled_jobs", "parked_booking_events"):
+            await server.db[name].drop()
+        await server.db.bookings.create_index([("platform", 1), ("platformBookingId", 1)], unique=True)
+        await server.service_scheduler.ensure_indexes()
+        await server.db.parked_booking_events.create_index([("platform", 1), ("platformBookingId", 1), ("receivedAt", 1)])
+        await server.occupancy.load()
+
+    async def run():
+        print(f"{'rows':>8} {'stage':>16} {'bookings/s':>11}")
+        for count in rows:
+            payloads = make_booking_payloads(count)
+            # Stays in the future, so every booking gets its service jobs
+            check_in = datetime.utcnow().date() + timedelta(days=30)
+            for payload in payloads:
+                payload["check_in_date"] = check_in.isoformat()
+                payload["check_out_date"] = (check_in + timedelta(days=7)).isoformat()
+            body = dumps(payloads)
+            await reset()
+            for stage in ("endpoint", "endpoint replay"):
+                started = time.perf_counter()
+                await server.handle_booking_batch(request_for(body))
+                print(f"{count:>8} {stage:>16} {count / (time.perf_counter() - started):>11.0f}")
+        await reset()
+
+    asyncio.run(run())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    serialization = subparsers.add_parser("serialization", help="Per-row cost of building read responses")
+    serialization.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    serialization.add_argument("--repeat", type=int, default=5)
+
+    compression = subparsers.add_parser("compression", help="Size and cost of compressing list payloads")
+    compression.add_argument("--rows", type=int, nargs="+", default=[50, 1000])
+    compression.add_argument("--repeat", type=int, default=5)
+
+    ids = subparsers.add_parser("ids", help="Insert throughput and index size by primary key layout")
+    ids.add_argument("--rows", type=int, nargs="+", default=[100000])
+    ids.add_argument("--batch-size", type=int, default=1000)
+
+    bookings = subparsers.add_parser("bookings", help="Batch booking ingestion rate")
+    bookings.add_argument("--rows", type=int, nargs="+", default=[10000])
+    bookings.add_argument("--write", action="store_true", help="Also bulk upsert into MONGO_URL")
+    bookings.add_argument("--chunk-size", type=int, default=1000)
+
+    booking_endpoint = subparsers.add_parser("booking-endpoint", help="Batch booking endpoint, follow-up work included")
+    booking_endpoint.add_argument("--rows", type=int, nargs="+", default=[10000])
+
+    args = parser.parse_args(argv)
+    if args.benchmark == "serialization":
+        bench_serialization(args.rows, args.repeat)
+    elif args.benchmark == "compression":
+        bench_compression(args.rows, args.repeat)
+    elif args.benchmark == "ids":
+        bench_ids(args.rows, args.batch_size)
+    elif args.benchmark == "bookings":
+        bench_bookings(args.rows, args.write, args.chunk_size)
+    elif args.benchmark == "booking-endpoint":
+        bench_booking_endpoint(args.rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
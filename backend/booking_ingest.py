@@ -0,0 +1,226 @@
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+# Natural key of a booking: the same reservation always arrives with the
+# same platform and platform booking id, however often it is retried
+BOOKING_KEY_FIELDS = ("platform", "platformBookingId")
+
+# How long an update for a booking we never saw created is kept waiting
+PARKED_EVENT_RETENTION = timedelta(days=int(os.environ.get('BOOKING_PARKED_EVENT_RETENTION_DAYS', '30')))
+
+
+def booking_key(document: Dict) -> Dict:
+    return {field: document[field] for field in BOOKING_KEY_FIELDS}
+
+
+async def upsert_booking(bookings, document: Dict) -> Tuple[str, bool]:
+    """Insert ``document`` unless its (platform, platformBookingId) exists.
+
+    Returns ``(booking_id, created)``; on a replay the id is the stored one.
+    """
+    try:
+        stored = await bookings.find_one_and_update(
+            booking_key(document),
+            {"$setOnInsert": document},
+            upsert=True,
+            projection={"id": 1},
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Lost an upsert race on the unique index; the winner's row is there now
+        stored = await bookings.find_one(booking_key(document), {"id": 1})
+    return stored["id"], stored["id"] == document["id"]
+
+
+def parse_batch_body(body: bytes, content_type: str) -> List[Any]:
+    """Items of a batch upload: a JSON array, or NDJSON (one object per line).
+
+    An NDJSON line that is not valid JSON becomes a ``ValueError`` in its
+    slot, so one bad line fails only that item.
+    """
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        items = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(orjson.loads(line))
+            except orjson.JSONDecodeError as e:
+                items.append(ValueError(f"Invalid JSON: {str(e)}"))
+        return items
+    items = orjson.loads(body)
+    if not isinstance(items, list):
+        raise ValueError("Expected a JSON array of bookings")
+    return items
+
+
+async def upsert_bookings(bookings, documents: List[Dict]) -> List[Dict]:
+    """Bulk form of :func:`upsert_booking`: one unordered ``bulk_write``.
+
+    Returns one result per document, in order: ``{"booking_id", "created"}``
+    or ``{"error"}``. Existing bookings (including repeats within the same
+    batch) come back with their stored id.
+    """
+    if not documents:
+        return []
+    operations = [UpdateOne(booking_key(document), {"$setOnInsert": document}, upsert=True) for document in documents]
+    errors = {}
+    try:
+        result = await bookings.bulk_write(operations, ordered=False)
+        upserted = set(result.upserted_ids.values())
+    except BulkWriteError as e:
+        upserted = {item["_id"] for item in e.details.get("upserted", [])}
+        # Duplicate-key errors are upsert races; those rows exist and are looked up below
+        errors = {
+            error["index"]: error.get("errmsg", "Write failed")
+            for error in e.details.get("writeErrors", [])
+            if error.get("code") != DUPLICATE_KEY
+        }
+
+    # Inserted rows carry the _id we supplied, so match on that rather than on op index
+    existing = [
+        booking_key(document) for index, document in enumerate(documents)
+        if document["_id"] not in upserted and index not in errors
+    ]
+    stored_ids = {}
+    if existing:
+        projection = {"id": 1, **{field: 1 for field in BOOKING_KEY_FIELDS}}
+        async for stored in bookings.find({"$or": existing}, projection):
+            stored_ids[tuple(stored[field] for field in BOOKING_KEY_FIELDS)] = stored["id"]
+
+    results = []
+    for index, document in enumerate(documents):
+        if document["_id"] in upserted:
+            results.append({"booking_id": document["id"], "created": True})
+        elif index in errors:
+            results.append({"error": errors[index]})
+        else:
+            key = tuple(document[field] for field in BOOKING_KEY_FIELDS)
+            results.append({"booking_id": stored_ids.get(key), "created": False})
+    return results
+
+
+async def apply_booking_event(
+    bookings,
+    key: Dict,
+    changes: Dict,
+    event_at: Optional[datetime],
+    received_at: datetime
+) -> Tuple[Optional[Dict], Optional[Dict], str]:
+    """Apply a partial update from a booking event unless a newer one won.
+
+    Platform clocks and ours are never compared with each other: an event
+    carrying the platform's time (``event_at``) only applies while the
+    stored ``lastEventAt`` is older, and one without it only while the
+    stored ``lastReceivedAt`` (our arrival time) is older. So a delayed or
+    replayed event cannot undo a later one. ``updatedAt`` is bumped to the
+    local time of the write. Returns ``(before, after, outcome)`` with
+    outcome ``applied``, ``stale`` or ``missing``.
+    """
+    clock, value = ("lastEventAt", event_at) if event_at is not None else ("lastReceivedAt", received_at)
+    update = {"$set": {**changes, "updatedAt": datetime.utcnow()}, "$max": {"lastReceivedAt": received_at}}
+    if event_at is not None:
+        update["$set"]["lastEventAt"] = event_at
+    before = await bookings.find_one_and_update(
+        {**key, "$or": [{clock: {"$lt": value}}, {clock: None}]},
+        update,
+        return_document=ReturnDocument.BEFORE
+    )
+    if before is None:
+        exists = await bookings.find_one(key, {"_id": 1})
+        return None, None, "stale" if exists else "missing"
+    after = {**before, **update["$set"], "lastReceivedAt": max(received_at, before.get("lastReceivedAt") or received_at)}
+    return before, after, "applied"
+
+
+async def park_booking_event(parked, key: Dict, event_type: str, payload: Dict, received_at: datetime):
+    """Hold an event for a booking whose create has not been processed yet;
+    :func:`take_parked_booking_event` hands it back once the booking exists."""
+    await parked.insert_one({
+        **key,
+        "eventType": event_type,
+        "payload": payload,
+        "receivedAt": received_at,
+        "expiresAt": datetime.utcnow() + PARKED_EVENT_RETENTION
+    })
+
+
+async def take_parked_booking_event(parked, key: Dict) -> Optional[Dict]:
+    """Remove and return the oldest parked event for ``key`` (each goes to one caller)."""
+    return await parked.find_one_and_delete(key, sort=[("receivedAt", 1)])
+
+
+async def parked_booking_keys(parked, keys: List[Dict]) -> List[Dict]:
+    """Those of ``keys`` with parked events, found with one query."""
+    if not keys:
+        return []
+    found = set()
+    projection = {field: 1 for field in BOOKING_KEY_FIELDS}
+    async for entry in parked.find({"$or": keys}, projection):
+        found.add(tuple(entry[field] for field in BOOKING_KEY_FIELDS))
+    return [key for key in keys if tuple(key[field] for field in BOOKING_KEY_FIELDS) in found]
+
+
+async def archive_duplicate_bookings(bookings, archive) -> int:
+    """Move all but the earliest booking per (platform, platformBookingId)
+    into ``archive`` so the unique index can be built."""
+    pipeline = [
+        {"$sort": {"createdAt": 1, "_id": 1}},
+        {"$group": {
+            "_id": {field: f"${field}" for field in BOOKING_KEY_FIELDS},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}}
+    ]
+    archived = 0
+    async for group in bookings.aggregate(pipeline, allowDiskUse=True):
+        extra_ids = group["ids"][1:]
+        duplicates = await bookings.find({"_id": {"$in": extra_ids}}).to_list(len(extra_ids))
+        for duplicate in duplicates:
+            duplicate["archivedAt"] = datetime.utcnow()
+            await archive.replace_one({"_id": duplicate["_id"]}, duplicate, upsert=True)
+        await bookings.delete_many({"_id": {"$in": extra_ids}})
+        archived += len(extra_ids)
+    return archived
+
+
+class IdempotencyStore:
+    """Short-lived record of webhook responses, keyed by Idempotency-Key.
+
+    A retried delivery carrying a key that was already handled gets the
+    original response back without touching the bookings collection.
+    Entries expire through a TTL index on ``createdAt``.
+    """
+
+    def __init__(self, collection, ttl: Optional[int] = None):
+        self.collection = collection
+        self.ttl = ttl if ttl is not None else int(os.environ.get('WEBHOOK_IDEMPOTENCY_TTL_SECONDS', '86400'))
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("createdAt", expireAfterSeconds=self.ttl)
+
+    async def get(self, scope: str, key: str) -> Optional[Any]:
+        entry = await self.collection.find_one({"_id": f"{scope}:{key}"})
+        return entry["response"] if entry else None
+
+    async def put(self, scope: str, key: str, response: Any):
+        try:
+            await self.collection.insert_one({
+                "_id": f"{scope}:{key}",
+                "response": response,
+                "createdAt": datetime.utcnow()
+            })
+        except DuplicateKeyError:
+            # A concurrent delivery of the same event recorded it first
+            pass
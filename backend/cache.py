@@ -0,0 +1,556 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+import orjson
+
+from serialization import dumps
+from singleflight import SingleFlight
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis is only needed when CACHE_REDIS_URL is set
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 300.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        if self._entries.pop(key, _MISSING) is not _MISSING:
+            self.invalidations += 1
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]):
+        """Drop every entry whose key matches ``predicate``."""
+        for key in [key for key in self._entries if predicate(key)]:
+            del self._entries[key]
+            self.invalidations += 1
+
+    def clear(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+
+class MemoryCacheBackend:
+    """Process-local backend; each uvicorn worker holds its own copy."""
+
+    shared = False
+
+    def __init__(self, maxsize: int = 4096):
+        self._entries = TTLCache("memory_backend", maxsize=maxsize)
+        self._generations: Dict[tuple, int] = {}
+        self._locks: Dict[str, float] = {}
+
+    async def start(self, on_invalidate: Callable[[str, str], None], on_resubscribe: Optional[Callable[[], None]] = None):
+        pass
+
+    async def close(self):
+        pass
+
+    async def get(self, namespace: str, group: str, key: str) -> Any:
+        return self._entries.get((namespace, group, key), _MISSING)
+
+    async def generation(self, namespace: str, group: str) -> int:
+        return self._generations.get((namespace, group), 0)
+
+    async def set(self, namespace: str, group: str, key: str, value: Any, ttl: float, generation: Optional[int] = None) -> bool:
+        if generation is not None and generation != self._generations.get((namespace, group), 0):
+            return False
+        self._entries.set((namespace, group, key), value, ttl)
+        return True
+
+    async def invalidate(self, namespace: str, group: str):
+        self._generations[(namespace, group)] = self._generations.get((namespace, group), 0) + 1
+        self._entries.invalidate_where(lambda entry: entry[0] == namespace and entry[1] == group)
+
+    async def acquire_lock(self, name: str, ttl: float) -> Optional[str]:
+        now = time.monotonic()
+        if self._locks.get(name, 0) > now:
+            return None
+        self._locks[name] = now + ttl
+        return name
+
+    async def release_lock(self, name: str, token: str):
+        self._locks.pop(name, None)
+
+
+class RedisCacheBackend:
+    """Backend speaking the Redis protocol, shared by every worker.
+
+    Each cache group is one Redis hash so a whole group (e.g. all lookups for
+    one owner) is dropped with a single DEL. Invalidations are also published
+    on a channel so workers can evict their local copies.
+
+    Each group also has a generation counter, bumped with the DEL. A loader
+    reads it before loading and its write only lands if it is unchanged, so
+    a slow load on one worker cannot store data another worker has since
+    invalidated.
+    """
+
+    shared = True
+
+    # Outlives any load; an expired counter reads as 0 and fails the check
+    GENERATION_TTL = 86400
+
+    _SET_SCRIPT = """
+    if (redis.call('get', KEYS[2]) or '0') ~= ARGV[1] then
+        return 0
+    end
+    redis.call('hset', KEYS[1], ARGV[2], ARGV[3])
+    redis.call('expire', KEYS[1], ARGV[4])
+    return 1
+    """
+
+    _RELEASE_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, url: str, prefix: str = "luxserv"):
+        if aioredis is None:
+            raise RuntimeError("CACHE_REDIS_URL is set but the redis package is not installed")
+        self.redis = aioredis.from_url(url)
+        self.prefix = prefix
+        self.channel = f"{prefix}:cache:invalidate"
+        self.origin = uuid.uuid4().hex
+        self._listener: Optional[asyncio.Task] = None
+
+    def _hash_key(self, namespace: str, group: str) -> str:
+        return f"{self.prefix}:cache:{namespace}:{group}"
+
+    def _generation_key(self, namespace: str, group: str) -> str:
+        return f"{self.prefix}:cache-generation:{namespace}:{group}"
+
+    async def start(self, on_invalidate: Callable[[str, str], None], on_resubscribe: Optional[Callable[[], None]] = None):
+        self._listener = asyncio.create_task(self._listen(on_invalidate, on_resubscribe))
+
+    async def _listen(self, on_invalidate, on_resubscribe):
+        """Relay invalidations until cancelled, resubscribing after errors.
+
+        Messages published while the subscription was down are lost, so
+        ``on_resubscribe`` is called after every reconnect to drop whatever
+        local state they might have invalidated.
+        """
+        delay = 1.0
+        reconnecting = False
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                if reconnecting:
+                    logger.info("Cache invalidation channel resubscribed")
+                    if on_resubscribe is not None:
+                        on_resubscribe()
+                delay = 1.0
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    try:
+                        payload = json.loads(message["data"])
+                        if payload.get("origin") != self.origin:
+                            on_invalidate(payload["namespace"], payload["group"])
+                    except Exception as e:
+                        logger.error(f"Invalid cache invalidation message: {str(e)}")
+                raise ConnectionError("subscription closed")
+            except asyncio.CancelledError:
+                return
+            except Exception as e:
+                logger.error(f"Cache invalidation listener failed, resubscribing in {delay:.0f}s: {str(e)}")
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+            reconnecting = True
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    async def close(self):
+        if self._listener:
+            self._listener.cancel()
+        await self.redis.close()
+
+    async def get(self, namespace: str, group: str, key: str) -> Any:
+        raw = await self.redis.hget(self._hash_key(namespace, group), key)
+        if raw is None:
+            return _MISSING
+        expires_at, value = orjson.loads(raw)
+        if expires_at <= time.time():
+            return _MISSING
+        return value
+
+    async def generation(self, namespace: str, group: str) -> int:
+        return int(await self.redis.get(self._generation_key(namespace, group)) or 0)
+
+    async def set(self, namespace: str, group: str, key: str, value: Any, ttl: float, generation: Optional[int] = None) -> bool:
+        hash_key = self._hash_key(namespace, group)
+        # orjson writes datetimes as isoformat(), so cached and fresh responses match
+        raw = dumps([time.time() + ttl, value])
+        if generation is not None:
+            # Fields carry their own expiry; the hash expires with its newest field
+            stored = await self.redis.eval(
+                self._SET_SCRIPT, 2, hash_key, self._generation_key(namespace, group),
+                str(generation), key, raw, int(ttl) + 1
+            )
+            return bool(stored)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hset(hash_key, key, raw)
+            pipe.expire(hash_key, int(ttl) + 1)
+            await pipe.execute()
+        return True
+
+    async def invalidate(self, namespace: str, group: str):
+        generation_key = self._generation_key(namespace, group)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.incr(generation_key)
+            pipe.expire(generation_key, self.GENERATION_TTL)
+            pipe.delete(self._hash_key(namespace, group))
+            await pipe.execute()
+        await self.redis.publish(self.channel, json.dumps({
+            "origin": self.origin,
+            "namespace": namespace,
+            "group": group
+        }))
+
+    async def acquire_lock(self, name: str, ttl: float) -> Optional[str]:
+        token = uuid.uuid4().hex
+        acquired = await self.redis.set(f"{self.prefix}:lock:{name}", token, nx=True, px=int(ttl * 1000))
+        return token if acquired else None
+
+    async def release_lock(self, name: str, token: str):
+        await self.redis.eval(self._RELEASE_SCRIPT, 1, f"{self.prefix}:lock:{name}", token)
+
+
+class SharedCache:
+    """Read-through cache shared across workers.
+
+    Values live in the backend (Redis when configured) with a short-lived
+    local copy in front. A miss is coalesced twice: callers in this process
+    wait on one in-flight load, and across workers a short backend lock lets
+    a single worker run the loader while the others poll for its result.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        backend,
+        ttl: float = 300.0,
+        local_ttl: float = 30.0,
+        local_maxsize: int = 1024,
+        lock_ttl: float = 5.0,
+        poll_interval: float = 0.05
+    ):
+        self.namespace = namespace
+        self.backend = backend
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        # Without a shared backend the local copy is the only copy
+        self.local = TTLCache(namespace, maxsize=local_maxsize, ttl=local_ttl if backend.shared else ttl)
+        self._flight = SingleFlight(namespace)
+        # Bumped on every invalidation so a load racing a write is not cached
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+        self.backend_hits = 0
+        self.loads = 0
+        self.discarded = 0
+        self.coalesced = 0
+
+    def evict_local(self, group: str):
+        self._generations[group] = self._generations.get(group, 0) + 1
+        self.local.invalidate_where(lambda key: key[0] == group)
+
+    def evict_all_local(self):
+        self._epoch += 1
+        self.local.clear()
+
+    async def get_or_load(self, group: str, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value or run ``loader`` once; ``None`` results are not cached."""
+        cache_key = (group, key)
+        value = self.local.get(cache_key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        return await self._flight.do(cache_key, lambda: self._load_shared(group, key, loader))
+
+    async def _load_shared(self, group: str, key: str, loader) -> Any:
+        if not self.backend.shared:
+            return await self._load(group, key, loader)
+
+        value = await self.backend.get(self.namespace, group, key)
+        if value is not _MISSING:
+            self.backend_hits += 1
+            self.local.set((group, key), value)
+            return value
+
+        lock_name = f"{self.namespace}:{group}:{key}"
+        token = await self.backend.acquire_lock(lock_name, self.lock_ttl)
+        if token is None:
+            # Another worker is loading this key; wait for it to publish
+            deadline = time.monotonic() + self.lock_ttl
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                value = await self.backend.get(self.namespace, group, key)
+                if value is not _MISSING:
+                    self.coalesced += 1
+                    self.local.set((group, key), value)
+                    return value
+            return await self._load(group, key, loader)
+
+        try:
+            return await self._load(group, key, loader)
+        finally:
+            await self.backend.release_lock(lock_name, token)
+
+    async def _load(self, group: str, key: str, loader) -> Any:
+        self.loads += 1
+        generation = (self._epoch, self._generations.get(group, 0))
+        # Invalidations from other workers, even ones not heard of yet
+        shared_generation = await self.backend.generation(self.namespace, group)
+        value = await loader()
+        if value is not None and generation == (self._epoch, self._generations.get(group, 0)):
+            if await self.backend.set(self.namespace, group, key, value, self.ttl, shared_generation):
+                self.local.set((group, key), value)
+            else:
+                self.discarded += 1
+        return value
+
+    async def invalidate(self, group: str):
+        self.evict_local(group)
+        await self.backend.invalidate(self.namespace, group)
+
+    def stats(self) -> dict:
+        return {
+            **self.local.stats(),
+            "backend": "redis" if self.backend.shared else "memory",
+            "backend_hits": self.backend_hits,
+            "loads": self.loads,
+            "discarded": self.discarded,
+            "coalesced": self.coalesced + self._flight.collapsed
+        }
+
+
+class StaleWhileRevalidateCache:
+    """Single cached value served stale while one background task refreshes it.
+
+    Within ``ttl`` the value is returned as-is. Between ``ttl`` and
+    ``max_stale`` the stale value is returned immediately and a refresh is
+    started unless one is already running. Past ``max_stale`` (or with
+    ``fresh=True``) callers wait for the refresh, still sharing one load.
+    """
+
+    def __init__(self, name: str, ttl: float = 30.0, max_stale: float = 300.0):
+        self.name = name
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._value: Any = _MISSING
+        self._fetched_at = 0.0
+        self._refresh: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.updates = 0
+
+    async def get(self, loader: Callable[[], Awaitable[Any]], fresh: bool = False) -> Any:
+        age = time.monotonic() - self._fetched_at
+        if self._value is _MISSING or fresh or age > self.max_stale:
+            self.misses += 1
+            return await asyncio.shield(self._start_refresh(loader))
+
+        if age > self.ttl:
+            self.stale_hits += 1
+            self._start_refresh(loader)
+        else:
+            self.hits += 1
+        return self._value
+
+    def _start_refresh(self, loader) -> asyncio.Task:
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.create_task(self._run_refresh(loader))
+            # Background refresh failures are logged; keep asyncio from warning
+            self._refresh.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return self._refresh
+
+    async def _run_refresh(self, loader) -> Any:
+        self.refreshes += 1
+        try:
+            value = await loader()
+        except Exception as e:
+            self.refresh_errors += 1
+            logger.error(f"Refreshing {self.name} cache failed: {str(e)}")
+            raise
+        self._value = value
+        self._fetched_at = time.monotonic()
+        return value
+
+    @property
+    def age(self) -> Optional[float]:
+        if self._value is _MISSING:
+            return None
+        return time.monotonic() - self._fetched_at
+
+    def invalidate(self):
+        self._value = _MISSING
+
+    def update(self, mutate: Callable[[Any], Any]):
+        """Apply an incremental change to the cached value instead of reloading.
+
+        No-op when nothing is cached. A refresh already in flight may finish
+        with a snapshot from before the change; that is corrected at the
+        next refresh, as with any other staleness within ``ttl``.
+        """
+        if self._value is not _MISSING:
+            self._value = mutate(self._value)
+            self.updates += 1
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "ttl": self.ttl,
+            "max_stale": self.max_stale,
+            "age": round(self.age, 3) if self.age is not None else None,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "updates": self.updates
+        }
+
+
+class CacheRegistry:
+    """Owns the cache backend and routes invalidation messages to caches."""
+
+    def __init__(self):
+        redis_url = os.environ.get('CACHE_REDIS_URL')
+        self.backend = RedisCacheBackend(redis_url) if redis_url else MemoryCacheBackend()
+        self.caches: Dict[str, SharedCache] = {}
+        self.local_caches: list = []
+        self.listeners: Dict[str, Callable[[str], None]] = {}
+
+    def create(self, namespace: str, **kwargs) -> SharedCache:
+        cache = SharedCache(namespace, self.backend, **kwargs)
+        self.caches[namespace] = cache
+        return cache
+
+    def register_local(self, cache):
+        """Track a process-local cache so it shows up in stats."""
+        self.local_caches.append(cache)
+        return cache
+
+    def add_listener(self, namespace: str, callback: Callable[[str], None]):
+        """Call ``callback(group)`` when another worker invalidates ``namespace``."""
+        self.listeners[namespace] = callback
+
+    async def publish_invalidation(self, namespace: str, group: str):
+        await self.backend.invalidate(namespace, group)
+
+    def _on_invalidate(self, namespace: str, group: str):
+        cache = self.caches.get(namespace)
+        if cache is not None:
+            cache.evict_local(group)
+        listener = self.listeners.get(namespace)
+        if listener is not None:
+            listener(group)
+
+    def _on_resubscribe(self):
+        # Invalidations may have been missed while disconnected
+        for cache in self.caches.values():
+            cache.evict_all_local()
+        for listener in self.listeners.values():
+            listener("*")
+
+    async def start(self):
+        await self.backend.start(self._on_invalidate, self._on_resubscribe)
+        logger.info(f"Cache backend started: {type(self.backend).__name__}")
+
+    async def close(self):
+        await self.backend.close()
+
+    def stats(self) -> list:
+        caches = [*self.caches.values(), *self.local_caches]
+        return [cache.stats() for cache in caches]
+
+
+cache_registry = CacheRegistry()
+
+# Owner portal property lookups: group = ownerEmail, key = address filter
+owner_property_cache = cache_registry.create(
+    "owner_property",
+    ttl=float(os.environ.get('OWNER_PROPERTY_CACHE_TTL', '300')),
+    local_maxsize=int(os.environ.get('OWNER_PROPERTY_CACHE_SIZE', '2048'))
+)
+
+# Guest request status lookups: group = confirmation number
+guest_request_cache = cache_registry.create(
+    "guest_request",
+    ttl=float(os.environ.get('GUEST_REQUEST_CACHE_TTL', '60'))
+)
+
+# Admin dashboard analytics payload
+analytics_cache = cache_registry.register_local(StaleWhileRevalidateCache(
+    "admin_analytics",
+    ttl=float(os.environ.get('ANALYTICS_CACHE_TTL', '30')),
+    max_stale=float(os.environ.get('ANALYTICS_CACHE_MAX_STALE', '300'))
+))
@@ -0,0 +1,115 @@
+"""Backend maintenance commands.
+
+    python cli.py jobs list
+    python cli.py jobs run upload_gc --param dry_run=false
+    python cli.py jobs run id_migration
+    python cli.py jobs enqueue upload_gc
+    python cli.py jobs worker
+
+``jobs worker`` runs scheduled and queued jobs in a dedicated process; set
+JOB_RUNNER_IN_PROCESS=false on the API workers when using it.
+"""
+import asyncio
+import json
+from typing import List, Optional
+
+import typer
+
+app = typer.Typer(help="LuxServ 365 backend maintenance commands")
+jobs_app = typer.Typer(help="Scheduled and one-off background jobs")
+app.add_typer(jobs_app, name="jobs")
+
+
+def _load_server():
+    # Imported lazily: loads .env and registers every job with the runner
+    import server
+    return server
+
+
+def _parse_params(params: List[str]) -> dict:
+    parsed = {}
+    for param in params:
+        key, sep, value = param.partition("=")
+        if not sep:
+            raise typer.BadParameter(f"Expected key=value, got {param}")
+        try:
+            parsed[key] = json.loads(value)
+        except ValueError:
+            parsed[key] = value
+    return parsed
+
+
+@jobs_app.command("list")
+def list_jobs(job: Optional[str] = typer.Option(None, help="Only runs of this job"), limit: int = 20):
+    """Show registered jobs and recent runs."""
+    server = _load_server()
+
+    async def main():
+        definitions = await server.job_runner.definitions()
+        runs = await server.job_runner.recent_runs(job, limit=limit)
+        server.client.close()
+        return definitions, runs
+
+    definitions, runs = asyncio.run(main())
+    for definition in definitions:
+        typer.echo(f"{definition['name']:<24} {definition['schedule'] or 'manual':<20} next: {definition['nextRunAt']}  concurrency: {definition['concurrency']}")
+    typer.echo("")
+    for run in runs:
+        typer.echo(f"{run['createdAt']:%Y-%m-%d %H:%M:%S}  {run['job']:<24} {run['status']:<10} {run.get('durationSeconds', '')}  {run.get('error', '')}")
+
+
+@jobs_app.command("run")
+def run_job(name: str, param: List[str] = typer.Option([], "--param", "-p", help="key=value (JSON values allowed)")):
+    """Run a job now in this process and print its result."""
+    server = _load_server()
+    params = _parse_params(param)
+
+    async def main():
+        try:
+            await server.job_runner.ensure_indexes()
+            return await server.job_runner.run_now(name, params)
+        finally:
+            server.client.close()
+
+    run = asyncio.run(main())
+    typer.echo(json.dumps({key: run.get(key) for key in ("id", "status", "durationSeconds", "result", "error")}, default=str, indent=2))
+    if run["status"] != "succeeded":
+        raise typer.Exit(1)
+
+
+@jobs_app.command("enqueue")
+def enqueue_job(name: str, param: List[str] = typer.Option([], "--param", "-p", help="key=value (JSON values allowed)")):
+    """Queue a one-off run for whichever worker has a free slot."""
+    server = _load_server()
+    params = _parse_params(param)
+
+    async def main():
+        try:
+            return await server.job_runner.enqueue(name, params)
+        finally:
+            server.client.close()
+
+    typer.echo(asyncio.run(main()))
+
+
+@jobs_app.command("worker")
+def worker():
+    """Run scheduled and queued jobs until interrupted."""
+    server = _load_server()
+
+    async def main():
+        await server.job_runner.ensure_indexes()
+        try:
+            await server.job_runner.run_forever()
+        finally:
+            await server.job_runner.stop()
+            server.client.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    app()
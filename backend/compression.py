@@ -0,0 +1,156 @@
+import zlib
+from typing import Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Content that is already compressed gains nothing from another pass
+EXCLUDED_CONTENT_TYPES: Tuple[str, ...] = (
+    "image/",
+    "video/",
+    "audio/",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/pdf",
+    "application/vnd.openxmlformats",
+    "text/event-stream",
+)
+
+
+class _GzipEncoder:
+    def __init__(self, level: int):
+        # wbits=31 selects the gzip container
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        # Sync flush so each streamed chunk reaches the client promptly
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick ``br`` when brotli is installed and accepted, else ``gzip``."""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(token.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """Compress responses with brotli or gzip.
+
+    Complete bodies are only compressed above ``minimum_size``. Streamed
+    bodies (exports, list pages) are compressed chunk by chunk with a flush
+    after each one, so streaming and flat memory use are preserved.
+    Responses that already carry a Content-Encoding or whose type is
+    already compressed (images, PDFs, archives) pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def create_encoder(self, encoding: str):
+        if encoding == "br":
+            return _BrotliEncoder(self.brotli_quality)
+        return _GzipEncoder(self.gzip_level)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.downstream = send
+        self.start_message = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def send(self, message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # Hold the headers until the first body chunk shows the response shape
+            self.start_message = message
+            return
+        if message_type != "http.response.body" or self.passthrough:
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            headers = MutableHeaders(scope=start)
+            content_type = headers.get("content-type", "")
+            if (
+                "content-encoding" in headers
+                or content_type.startswith(EXCLUDED_CONTENT_TYPES)
+                or (not more_body and len(body) < self.middleware.minimum_size)
+            ):
+                self.passthrough = True
+                await self.downstream(start)
+                await self.downstream(message)
+                return
+
+            self.encoder = self.middleware.create_encoder(self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # The encoded bytes differ from the identity representation
+                headers["ETag"] = f"W/{etag}"
+
+            if not more_body:
+                body = self.encoder.compress(body) + self.encoder.finish()
+                headers["Content-Length"] = str(len(body))
+                await self.downstream(start)
+                await self.downstream({"type": "http.response.body", "body": body})
+                return
+
+            del headers["Content-Length"]
+            await self.downstream(start)
+
+        chunk = self.encoder.compress(body) if body else b""
+        if not more_body:
+            chunk += self.encoder.finish()
+        await self.downstream({"type": "http.response.body", "body": chunk, "more_body": more_body})
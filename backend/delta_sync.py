@@ -0,0 +1,106 @@
+import base64
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+
+from ids import key_from_json, key_to_json, keys_past
+from serialization import to_rows
+
+# Writes stamp lastUpdatedAt just before they reach Mongo, so a change can
+# become visible slightly after its timestamp. Changes are only handed out
+# once they are this old, so a poll can never skip past an in-flight write.
+SETTLE_SECONDS = 2
+
+# Tombstones are kept this long; older sync tokens must do a full resync
+TOMBSTONE_RETENTION_DAYS = 30
+
+Position = Tuple[Optional[datetime], Any]
+
+
+def encode_sync_token(updated: Position, deleted: Position) -> str:
+    payload = {
+        "u": [updated[0].isoformat() if updated[0] else None, key_to_json(updated[1])],
+        "d": [deleted[0].isoformat() if deleted[0] else None, key_to_json(deleted[1])],
+    }
+    return base64.urlsafe_b64encode(orjson.dumps(payload)).decode("ascii").rstrip("=")
+
+
+def decode_sync_token(token: Optional[str]) -> Tuple[Position, Position]:
+    if not token:
+        return (None, ""), (None, "")
+    try:
+        payload = orjson.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        return tuple(
+            (datetime.fromisoformat(payload[key][0]) if payload[key][0] else None, key_from_json(payload[key][1]))
+            for key in ("u", "d")
+        )
+    except Exception:
+        raise ValueError("Invalid sync token")
+
+
+def position_query(field: str, position: Position, upper_bound: datetime) -> Dict:
+    """Documents after ``position`` in (field, _id) order, up to ``upper_bound``."""
+    timestamp, last_id = position
+    bounded = {field: {"$lte": upper_bound}}
+    if timestamp is None:
+        return bounded
+    return {"$and": [bounded, {"$or": [
+        {field: {"$gt": timestamp}},
+        {field: timestamp, **keys_past(last_id, "$gt")}
+    ]}]}
+
+
+async def changes_since(
+    collection,
+    tombstones,
+    model,
+    token: Optional[str],
+    limit: int = 500,
+    fields: Optional[List[str]] = None
+) -> Dict:
+    """Documents changed and ids deleted since ``token``, in commit-safe order.
+
+    Changes are read in (lastUpdatedAt, _id) order and deletions in
+    (deletedAt, _id) order, each from its own index; the returned token
+    records both positions. ``has_more`` means another call will return more.
+    """
+    updated, deleted = decode_sync_token(token)
+    now = datetime.utcnow()
+    upper_bound = now - timedelta(seconds=SETTLE_SECONDS)
+
+    reset = False
+    if deleted[0] is not None and deleted[0] < now - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+        # Tombstones the client needs may already be gone; start over
+        reset = True
+        updated, deleted = (None, ""), (None, "")
+
+    projection = None
+    if fields is not None:
+        projection = {name: 1 for name in fields}
+        projection["lastUpdatedAt"] = 1
+
+    docs = await collection.find(position_query("lastUpdatedAt", updated, upper_bound), projection) \
+        .sort([("lastUpdatedAt", 1), ("_id", 1)]).limit(limit + 1).to_list(limit + 1)
+    removed = await tombstones.find(position_query("deletedAt", deleted, upper_bound)) \
+        .sort([("deletedAt", 1), ("_id", 1)]).limit(limit + 1).to_list(limit + 1)
+
+    has_more = len(docs) > limit or len(removed) > limit
+    docs, removed = docs[:limit], removed[:limit]
+
+    if docs:
+        updated = (docs[-1]["lastUpdatedAt"], docs[-1]["_id"])
+    if removed:
+        deleted = (removed[-1]["deletedAt"], removed[-1]["_id"])
+    else:
+        # No deletions up to the settled bound; moving the position there
+        # also dates the token for the retention check
+        deleted = (upper_bound, "")
+
+    return {
+        "changes": to_rows(model, docs, fields),
+        "deleted": [tombstone["id"] for tombstone in removed],
+        "next_token": encode_sync_token(updated, deleted),
+        "has_more": has_more,
+        "reset": reset
+    }
@@ -0,0 +1,61 @@
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+from fastapi import Request, Response
+
+from serialization import dumps
+
+
+def make_etag(*parts: Any) -> str:
+    """Weak ETag over ``parts``; equal inputs always give the same tag."""
+    digest = hashlib.sha1(dumps([_etag_part(part) for part in parts])).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _etag_part(part: Any) -> Any:
+    if isinstance(part, datetime):
+        return part.isoformat()
+    return part
+
+
+def content_etag(payload: Any) -> str:
+    """ETag derived from the response body itself, for already-cached payloads."""
+    return make_etag(payload)
+
+
+async def collection_version(collection, query: Dict, timestamp_fields: Iterable[str], count: Optional[int] = None) -> tuple:
+    """Cheap change marker for the documents matching ``query``.
+
+    The document count plus the newest value of each timestamp field; each
+    part is one index-backed probe. Any insert, delete or timestamped update
+    changes the result.
+    """
+    if count is None:
+        count = await collection.count_documents(query)
+    version = [count]
+    for field in timestamp_fields:
+        newest = await collection.find(query, {"_id": 0, field: 1}).sort(field, -1).limit(1).to_list(1)
+        version.append(newest[0].get(field) if newest else None)
+    return tuple(version)
+
+
+def matches_if_none_match(request: Request, etag: str) -> bool:
+    """Weak comparison against the request's If-None-Match header."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    if "*" in candidates:
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any((tag[2:] if tag.startswith("W/") else tag) == opaque for tag in candidates)
+
+
+def etag_headers(etag: str) -> Dict[str, str]:
+    # no-cache: clients may store the response but must revalidate every time
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=etag_headers(etag))
@@ -0,0 +1,88 @@
+import io
+import csv
+from datetime import date, datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from fastapi.responses import StreamingResponse
+
+from serialization import dumps, row_projector
+
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return dumps(value).decode("utf-8")
+    return value
+
+
+async def _ndjson_chunks(cursor, project: Callable[[Dict], Dict]) -> AsyncIterator[bytes]:
+    lines = []
+    async for doc in cursor:
+        lines.append(dumps(project(doc)))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+
+async def _csv_chunks(cursor, columns: List[str], project: Callable[[Dict], Dict]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    rows = 0
+    async for doc in cursor:
+        row = project(doc)
+        writer.writerow([_csv_value(row[column]) for column in columns])
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def stream_export(
+    collection,
+    filter_query: Dict,
+    model,
+    export_format: str,
+    basename: str,
+    sort: Optional[List] = None
+) -> StreamingResponse:
+    """Stream every matching document as NDJSON or CSV.
+
+    Documents come straight off a batched cursor and are written out in
+    chunks, so memory use does not depend on the size of the export. Rows
+    are projected onto ``model``'s fields without re-validating them.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f'Format must be one of: {", ".join(EXPORT_FORMATS)}')
+
+    columns = list(model.model_fields)
+    cursor = collection.find(filter_query, {"_id": 0}).batch_size(EXPORT_BATCH_SIZE)
+    if sort:
+        cursor = cursor.sort(sort)
+
+    project = row_projector(model)
+    if export_format == "csv":
+        chunks = _csv_chunks(cursor, columns, project)
+    else:
+        chunks = _ndjson_chunks(cursor, project)
+    filename = f"{basename}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
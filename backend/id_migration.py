@@ -0,0 +1,285 @@
+"""
+Re-key documents written before ids were stored as ``_id``.
+
+Older documents carry a string ``id`` next to an ObjectId ``_id``. MongoDB
+cannot change an ``_id`` in place, so each document is re-keyed in steps:
+
+1. a journal entry records the move in ``id_migration_journal``;
+2. a copy keyed by ``id`` is inserted, without the fields of any secondary
+   unique index (booking keys, confirmation numbers), which the original
+   still holds; the journal keeps them;
+3. the original is deleted, but only if it is still exactly what was read;
+4. the unique fields are set on the copy and the journal entry removed.
+
+Until step 3 lookups find one or both versions (see :class:`LegacyKeys`),
+so nothing is ever "not found". If the original was written in the
+meantime, the untouched copy is deleted and the document retried; if both
+were written, the copy is kept and the original archived in its journal
+entry. A run interrupted between steps is finished by the next one.
+
+Conflicts are resolved rather than skipped: a document whose ``id`` is
+already taken by a different document is re-keyed under a fresh id, and one
+whose unique fields were taken meanwhile stays under its new ``_id`` with
+the clash recorded in the journal; the next run retries it, once the other
+document has been dealt with. Journal entries with a ``conflict`` are kept
+as the record of what was done.
+
+Indexes on the now-redundant ``id`` field are dropped once every
+collection is done.
+
+The migration must not run twice at once; it is registered as the
+``id_migration`` job, whose single slot serializes runs:
+
+    python cli.py jobs run id_migration
+
+Until it has finished, lookups by id go through :class:`LegacyKeys`, which
+also matches documents still keyed the old way.
+"""
+
+import re
+import time
+import logging
+from typing import Dict, Iterable, Optional, Set
+
+from pymongo.errors import DuplicateKeyError
+
+from ids import new_id
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_COLLECTION = "id_migration_journal"
+
+# Set on a copy until its original is gone; the live feed skips these writes
+REKEYING_FIELD = "_rekeyingFrom"
+
+# Every collection whose documents are addressed by ``id``
+KEYED_COLLECTIONS = (
+    "status_checks",
+    "contact_submissions",
+    "owner_messages",
+    "inspection_reports",
+    "property_photos",
+    "guest_requests",
+    "guest_request_tombstones",
+    "bookings",
+    "properties",
+)
+
+LEGACY_KEY = {"_id": {"$type": "objectId"}, "id": {"$type": "string"}}
+
+
+async def needs_migration(db, collections: Iterable[str] = KEYED_COLLECTIONS) -> bool:
+    # Re-keys in flight; recorded conflicts need no lookup by the old id
+    if await db[JOURNAL_COLLECTION].find_one({"resolved": {"$exists": False}}, {"_id": 1}):
+        return True
+    for name in collections:
+        if await db[name].find_one(LEGACY_KEY, {"_id": 1}):
+            return True
+    return False
+
+
+class LegacyKeys:
+    """Whether documents may still be keyed the old way, and the filters that
+    find them either way meanwhile.
+
+    The answer is re-checked at most every ``recheck`` seconds, so workers
+    notice a migration that finished elsewhere; once it is done it stays
+    done (nothing writes the old layout any more).
+    """
+
+    def __init__(self, db, recheck: float = 60.0):
+        self.db = db
+        self.recheck = recheck
+        self._pending: Optional[bool] = None
+        self._checked_at = 0.0
+
+    async def pending(self) -> bool:
+        if self._pending is False:
+            return False
+        if self._pending is None or time.monotonic() - self._checked_at >= self.recheck:
+            try:
+                self._pending = await needs_migration(self.db)
+            except Exception as e:
+                logger.error(f"Error checking for legacy ids: {str(e)}")
+                self._pending = True
+            self._checked_at = time.monotonic()
+        return self._pending
+
+    def mark_done(self):
+        self._pending = False
+
+    def expire(self):
+        """Re-check on the next lookup (the migration may have finished elsewhere)."""
+        if self._pending:
+            self._pending = None
+
+    async def filter(self, value: str) -> Dict:
+        """Match the document addressed by ``value`` (its ``_id``, or its
+        ``id`` while it may not be re-keyed yet)."""
+        if await self.pending():
+            return {"$or": [{"_id": value}, {"id": value}]}
+        return {"_id": value}
+
+    async def confirmation_filter(self, confirmation_number: str) -> Optional[Dict]:
+        """Old requests were looked up by the first 8 characters of their
+        id until the migration gives them a confirmationNumber; None once
+        there is no such request left."""
+        if not await self.pending():
+            return None
+        return {"confirmationNumber": None, "id": {"$regex": f"^{re.escape(confirmation_number.lower())}"}}
+
+
+async def _unique_fields(collection) -> Set[str]:
+    """Fields of the collection's secondary unique indexes."""
+    return {
+        field
+        for name, info in (await collection.index_information()).items()
+        if info.get("unique") and name != "_id_"
+        for field, _ in info["key"]
+    }
+
+
+def _copy_of(document: Dict, copy_id: str, staged: Dict) -> Dict:
+    """The re-keyed document as inserted in step 2."""
+    copy = {field: value for field, value in document.items() if field not in staged}
+    copy["_id"] = copy_id
+    if "id" in copy:
+        copy["id"] = copy_id
+    copy[REKEYING_FIELD] = document["_id"]
+    return copy
+
+
+async def _finish(collection, journal, entry: Dict) -> str:
+    """Step 4: give the copy its unique fields back."""
+    update = {"$unset": {REKEYING_FIELD: ""}}
+    if entry["fields"]:
+        update["$set"] = entry["fields"]
+    try:
+        await collection.update_one({"_id": entry["copyId"]}, update)
+    except DuplicateKeyError as e:
+        # Another document took one of them meanwhile (a duplicate booking
+        # created while the original's key was off the copy, say); the copy
+        # stays reachable by its _id and the next run retries
+        await journal.update_one({"_id": entry["_id"]}, {"$set": {"conflict": "unique key taken", "error": str(e), "resolved": False}})
+        logger.error(f"Re-keyed {collection.name} {entry['copyId']} but could not restore {sorted(entry['fields'])}: {str(e)}")
+        return "conflict"
+    if entry.get("conflict"):
+        # Kept as the record of how the conflict was resolved
+        await journal.update_one({"_id": entry["_id"]}, {"$set": {"resolved": True}})
+    else:
+        await journal.delete_one({"_id": entry["_id"]})
+    return "migrated"
+
+
+async def _keep_copy(collection, journal, entry: Dict) -> str:
+    """Both versions were written during the re-key: keep the copy, which
+    lookups by ``_id`` already reach, and archive the original."""
+    original = await collection.find_one_and_delete({"_id": entry["_id"]})
+    entry["conflict"] = "written during re-key"
+    await journal.update_one({"_id": entry["_id"]}, {"$set": {"conflict": entry["conflict"], "archived": original}})
+    logger.error(f"{collection.name} {entry['copyId']} was written in both versions during its re-key; kept the new one, the old one is archived in {JOURNAL_COLLECTION}")
+    if await collection.find_one({"_id": entry["copyId"]}, {"_id": 1}) is None:
+        # The copy was deleted: so is the document
+        await journal.update_one({"_id": entry["_id"]}, {"$set": {"resolved": True}})
+        return "migrated"
+    return await _finish(collection, journal, entry)
+
+
+async def _rekey(collection, journal, document: Dict, unique_fields: Set[str]) -> str:
+    """Returns ``migrated``, ``changed`` (retry with the new version) or ``conflict``."""
+    staged = {field: document[field] for field in unique_fields if field in document}
+    entry = {"_id": document["_id"], "collection": collection.name, "copyId": document["id"], "fields": staged, "conflict": None}
+    await journal.replace_one({"_id": entry["_id"]}, entry, upsert=True)
+    copy = _copy_of(document, entry["copyId"], staged)
+    try:
+        await collection.insert_one(copy)
+    except DuplicateKeyError:
+        # A different document already has this id (it was issued twice):
+        # this one moves to a fresh id so that both stay reachable
+        entry["copyId"] = new_id()
+        if "id" in staged:
+            staged["id"] = entry["copyId"]
+        entry["conflict"] = f"id {document['id']} already taken; re-keyed as {entry['copyId']}"
+        await journal.replace_one({"_id": entry["_id"]}, entry)
+        logger.error(f"{collection.name} {entry['conflict']}")
+        copy = _copy_of(document, entry["copyId"], staged)
+        await collection.insert_one(copy)
+
+    unchanged = await collection.delete_one({"_id": document["_id"], "$expr": {"$eq": ["$$ROOT", {"$literal": document}]}})
+    if unchanged.deleted_count:
+        return await _finish(collection, journal, entry)
+    # The original was written or deleted after it was read
+    untouched = await collection.delete_one({"_id": copy["_id"], "$expr": {"$eq": ["$$ROOT", {"$literal": copy}]}})
+    if untouched.deleted_count:
+        await journal.delete_one({"_id": entry["_id"]})
+        return "changed"
+    return await _keep_copy(collection, journal, entry)
+
+
+async def _recover(collection, journal) -> int:
+    """Finish the re-keys an interrupted run left in the journal."""
+    migrated = 0
+    # In flight (no ``resolved`` yet) or waiting on a unique key (False)
+    async for entry in journal.find({"collection": collection.name, "resolved": {"$ne": True}}):
+        original = await collection.find_one({"_id": entry["_id"]})
+        copy = await collection.find_one({"_id": entry["copyId"]})
+        if copy is None:
+            # Stopped before the insert (retried below), or deleted since
+            await journal.delete_one({"_id": entry["_id"]})
+            continue
+        if original is not None:
+            # Stopped between insert and delete: an unwritten copy is just
+            # dropped and the original re-keyed again
+            if copy == _copy_of(original, entry["copyId"], entry["fields"]):
+                await collection.delete_one({"_id": entry["copyId"]})
+                await journal.delete_one({"_id": entry["_id"]})
+                continue
+            outcome = await _keep_copy(collection, journal, entry)
+        else:
+            outcome = await _finish(collection, journal, entry)
+        if outcome == "migrated":
+            migrated += 1
+    return migrated
+
+
+async def migrate_collection(collection, journal, batch_size: int = 500) -> int:
+    migrated = await _recover(collection, journal)
+    unique_fields = await _unique_fields(collection)
+    while True:
+        batch = await collection.find(LEGACY_KEY).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        for document in batch:
+            if await _rekey(collection, journal, document, unique_fields) != "changed":
+                migrated += 1
+    return migrated
+
+
+async def migrate_primary_keys(db, collections: Iterable[str] = KEYED_COLLECTIONS, batch_size: int = 500) -> dict:
+    results = {}
+    for name in collections:
+        results[name] = await migrate_collection(db[name], db[JOURNAL_COLLECTION], batch_size)
+        if results[name]:
+            logger.info(f"Re-keyed {results[name]} documents in {name}")
+    conflicts = await db[JOURNAL_COLLECTION].count_documents({"resolved": False})
+    if conflicts:
+        logger.error(f"{conflicts} re-keyed documents still clash on a unique key; see {JOURNAL_COLLECTION}")
+    results["unresolved_conflicts"] = conflicts
+    return results
+
+
+async def ensure_legacy_id_indexes(db, collections: Iterable[str] = KEYED_COLLECTIONS):
+    """Index ``id`` for the :class:`LegacyKeys` lookups while they are needed."""
+    for name in collections:
+        await db[name].create_index("id")
+
+
+async def drop_legacy_id_indexes(db, collections: Iterable[str] = KEYED_COLLECTIONS):
+    """Drop indexes on the now-redundant ``id`` field. They serve the
+    :class:`LegacyKeys` lookups, so only once nothing is left to migrate."""
+    for name in collections:
+        collection = db[name]
+        for index_name, info in (await collection.index_information()).items():
+            if any(field == "id" for field, _ in info["key"]):
+                await collection.drop_index(index_name)
+                logger.info(f"Dropped index {collection.name}.{index_name}")
@@ -0,0 +1,64 @@
+import os
+import time
+import uuid
+from typing import Any, Dict
+
+from bson import ObjectId
+from pydantic import BaseModel
+
+
+def new_id() -> str:
+    """Time-ordered UUID (version 7) in the usual 36-character form.
+
+    The leading 48 bits are the Unix time in milliseconds, so ids created
+    later sort later and inserts land at the right edge of the ``_id``
+    index instead of at random pages across it.
+    """
+    value = (time.time_ns() // 1_000_000) << 80
+    value |= int.from_bytes(os.urandom(10), "big")
+    value &= ~(0xF << 76) & ~(0x3 << 62)
+    value |= (0x7 << 76) | (0x2 << 62)
+    return str(uuid.UUID(int=value))
+
+
+def new_confirmation_number() -> str:
+    """Guest-facing 8-character code; unique only by index, so callers retry
+    on a duplicate key."""
+    return os.urandom(4).hex().upper()
+
+
+def key_to_json(key: Any) -> Any:
+    """A document ``_id`` in JSON-safe form. Documents not re-keyed yet still
+    have an ObjectId; it is tagged so :func:`key_from_json` restores it."""
+    if isinstance(key, ObjectId):
+        return {"$oid": str(key)}
+    return key
+
+
+def key_from_json(value: Any) -> Any:
+    if isinstance(value, dict) and "$oid" in value:
+        return ObjectId(value["$oid"])
+    return value
+
+
+def keys_past(key: Any, op: str) -> Dict:
+    """Filter for ``_id`` after (``$gt``) or before (``$lt``) ``key`` in
+    index order.
+
+    Comparisons only match ids of the same BSON type and every ObjectId sorts
+    after every string, so the other type is added where it lies past ``key``.
+    """
+    if isinstance(key, ObjectId):
+        other = "string" if op == "$lt" else None
+    else:
+        other = "objectId" if op == "$gt" else None
+    if other is None:
+        return {"_id": {op: key}}
+    return {"$or": [{"_id": {op: key}}, {"_id": {"$type": other}}]}
+
+
+def document_for(obj: BaseModel) -> Dict:
+    """Mongo document for a model, keyed by its ``id`` so no extra index is needed."""
+    document = obj.dict()
+    document["_id"] = document["id"]
+    return document
@@ -0,0 +1,387 @@
+import os
+import uuid
+import socket
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from ids import new_id
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Dict], Awaitable[Any]]
+
+# (low, high) of each cron field: minute, hour, day of month, month, day of week
+CRON_FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+def _parse_cron_field(text: str, low: int, high: int) -> Set[int]:
+    values = set()
+    for item in text.split(","):
+        base, _, step_text = item.partition("/")
+        step = int(step_text) if step_text else 1
+        if base == "*":
+            start, end = low, high
+        elif "-" in base:
+            start, end = (int(part) for part in base.split("-", 1))
+        else:
+            start = int(base)
+            end = high if step_text else start
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"Invalid cron field: {text}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """Standard five-field cron expression (minute hour day month weekday), UTC.
+
+    Supports ``*``, lists, ranges and steps. As in cron, when both day of
+    month and day of week are restricted a day matching either one fires.
+    """
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression}")
+        self.expression = expression
+        fields = [_parse_cron_field(part, low, high) for part, (low, high) in zip(parts, CRON_FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = fields
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = parts[2] == "*"
+        self.any_weekday = parts[4] == "*"
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, after: datetime) -> datetime:
+        moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.months:
+                year, month = (moment.year + 1, 1) if moment.month == 12 else (moment.year, moment.month + 1)
+                moment = moment.replace(year=year, month=month, day=1, hour=0, minute=0)
+            elif not self._day_matches(moment):
+                moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+            elif moment.hour not in self.hours:
+                moment = (moment + timedelta(hours=1)).replace(minute=0)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron expression never fires: {self.expression}")
+
+    def __str__(self) -> str:
+        return self.expression
+
+
+class IntervalSchedule:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def next_after(self, after: datetime) -> datetime:
+        return after + timedelta(seconds=self.seconds)
+
+    def __str__(self) -> str:
+        return f"every {self.seconds:g}s"
+
+
+class JobDefinition:
+    def __init__(self, name: str, handler: JobHandler, schedule, concurrency: int, lease: float):
+        self.name = name
+        self.handler = handler
+        self.schedule = schedule
+        self.concurrency = concurrency
+        self.lease = lease
+
+
+class JobRunner:
+    """Periodic and one-off jobs shared by every worker of a deployment.
+
+    Each run is a ``job_runs`` document: queued, then running, then
+    succeeded / failed / abandoned, kept for ``history_days``. A cron or
+    interval schedule fires once per deployment: the worker that advances
+    the schedule's ``nextRunAt`` in ``job_locks`` (compare-and-set) queues
+    the run. Any worker may execute a queued run once it holds one of the
+    job's ``concurrency`` slot leases in ``job_locks``; the lease is renewed
+    by a heartbeat while the handler runs, and a run whose worker stops
+    heartbeating is marked abandoned so its slot frees up.
+    """
+
+    def __init__(self, db, poll_interval: Optional[float] = None, history_days: Optional[int] = None):
+        self.locks = db.job_locks
+        self.runs = db.job_runs
+        self.poll_interval = poll_interval if poll_interval is not None else float(os.environ.get('JOB_RUNNER_POLL_SECONDS', '5'))
+        self.history = timedelta(days=history_days if history_days is not None else int(os.environ.get('JOB_RUN_HISTORY_DAYS', '30')))
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.jobs: Dict[str, JobDefinition] = {}
+        self._next_fire: Dict[str, datetime] = {}
+        self._executing: Dict[str, asyncio.Task] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def register(
+        self,
+        name: str,
+        handler: JobHandler,
+        cron: Optional[str] = None,
+        every: Optional[float] = None,
+        concurrency: int = 1,
+        lease: float = 60.0
+    ):
+        schedule = CronSchedule(cron) if cron else IntervalSchedule(every) if every else None
+        self.jobs[name] = JobDefinition(name, handler, schedule, concurrency, lease)
+
+    async def ensure_indexes(self):
+        await self.runs.create_index([("status", 1), ("runAt", 1)])
+        await self.runs.create_index([("job", 1), ("createdAt", -1)])
+        await self.runs.create_index("expiresAt", expireAfterSeconds=0)
+
+    async def enqueue(self, name: str, params: Optional[Dict] = None, run_at: Optional[datetime] = None, trigger: str = "manual") -> str:
+        if name not in self.jobs:
+            raise ValueError(f"Unknown job: {name}")
+        run_id = new_id()
+        now = datetime.utcnow()
+        await self.runs.insert_one({
+            "_id": run_id,
+            "id": run_id,
+            "job": name,
+            "params": params or {},
+            "trigger": trigger,
+            "status": "queued",
+            "runAt": run_at or now,
+            "createdAt": now
+        })
+        self._wakeup.set()
+        return run_id
+
+    async def run_now(self, name: str, params: Optional[Dict] = None) -> Dict:
+        """Run a job in this process and wait for it (CLI). Still takes a slot,
+        so it cannot exceed the job's concurrency."""
+        run_id = await self.enqueue(name, params)
+        run = await self._claim(await self.runs.find_one({"_id": run_id}), datetime.utcnow())
+        if run is None:
+            await self.runs.update_one({"_id": run_id, "status": "queued"}, {"$set": {"runAt": datetime.utcnow()}})
+            raise RuntimeError(f"All {self.jobs[name].concurrency} slot(s) of {name} are busy; run {run_id} stays queued")
+        await self._executing[run_id]
+        return await self.runs.find_one({"_id": run_id})
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        executing = list(self._executing.values())
+        for task in executing:
+            task.cancel()
+        # Each run records itself as failed and releases its slot on the way out
+        await asyncio.gather(*executing, return_exceptions=True)
+
+    async def run_forever(self):
+        """Dedicated worker process (``cli.py jobs worker``)."""
+        self.start()
+        await self._task
+
+    async def _run(self):
+        while True:
+            try:
+                now = datetime.utcnow()
+                await self._fire_schedules(now)
+                await self._reap_abandoned(now)
+                await self._start_queued(now)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job runner error: {str(e)}")
+            wake_at = min(self._next_fire.values(), default=None)
+            timeout = self.poll_interval
+            if wake_at is not None:
+                timeout = min(timeout, max((wake_at - datetime.utcnow()).total_seconds(), 0))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire_schedules(self, now: datetime):
+        for job in self.jobs.values():
+            if job.schedule is None or self._next_fire.get(job.name, now) > now:
+                continue
+            lock_id = f"schedule:{job.name}"
+            lock = await self.locks.find_one({"_id": lock_id})
+            if lock is None:
+                # First deployment with this job: start from the next slot, not now
+                next_run = job.schedule.next_after(now)
+                try:
+                    await self.locks.insert_one({"_id": lock_id, "nextRunAt": next_run})
+                except DuplicateKeyError:
+                    pass
+                self._next_fire[job.name] = next_run
+                continue
+            if lock["nextRunAt"] > now:
+                self._next_fire[job.name] = lock["nextRunAt"]
+                continue
+            next_run = job.schedule.next_after(now)
+            won = await self.locks.find_one_and_update(
+                {"_id": lock_id, "nextRunAt": lock["nextRunAt"]},
+                {"$set": {"nextRunAt": next_run, "firedBy": self.worker_id, "firedAt": now}}
+            )
+            self._next_fire[job.name] = next_run
+            if won is not None:
+                await self.enqueue(job.name, trigger="schedule")
+
+    async def _reap_abandoned(self, now: datetime):
+        for job in self.jobs.values():
+            result = await self.runs.update_many(
+                {"job": job.name, "status": "running", "heartbeatAt": {"$lt": now - timedelta(seconds=job.lease)}},
+                {"$set": {
+                    "status": "abandoned",
+                    "error": "Worker stopped heartbeating",
+                    "finishedAt": now,
+                    "expiresAt": now + self.history
+                }}
+            )
+            if result.modified_count:
+                logger.warning(f"Marked {result.modified_count} {job.name} run(s) abandoned")
+
+    async def _start_queued(self, now: datetime):
+        queued = await self.runs.find(
+            {"status": "queued", "runAt": {"$lte": now}, "job": {"$in": list(self.jobs)}}
+        ).sort("runAt", 1).limit(32).to_list(32)
+        for run in queued:
+            await self._claim(run, now)
+
+    async def _claim(self, run: Dict, now: datetime) -> Optional[Dict]:
+        job = self.jobs[run["job"]]
+        slot = await self._acquire_slot(job, run["_id"], now)
+        if slot is None:
+            return None
+        claimed = await self.runs.find_one_and_update(
+            {"_id": run["_id"], "status": "queued"},
+            {"$set": {
+                "status": "running",
+                "worker": self.worker_id,
+                "slot": slot,
+                "startedAt": now,
+                "heartbeatAt": now
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+        if claimed is None:
+            # Another worker started it first
+            await self._release_slot(slot, run["_id"])
+            return None
+        self._executing[run["_id"]] = asyncio.create_task(self._execute(job, claimed, slot))
+        return claimed
+
+    async def _acquire_slot(self, job: JobDefinition, run_id: str, now: datetime) -> Optional[str]:
+        for index in range(job.concurrency):
+            slot = f"slot:{job.name}:{index}"
+            try:
+                lock = await self.locks.find_one_and_update(
+                    {"_id": slot, "$or": [{"lockedUntil": None}, {"lockedUntil": {"$lt": now}}]},
+                    {"$set": {
+                        "job": job.name,
+                        "runId": run_id,
+                        "lockedBy": self.worker_id,
+                        "lockedUntil": now + timedelta(seconds=job.lease)
+                    }},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                # The slot exists and its lease is live
+                continue
+            if lock is not None:
+                return slot
+        return None
+
+    async def _release_slot(self, slot: str, run_id: str):
+        await self.locks.update_one(
+            {"_id": slot, "runId": run_id},
+            {"$unset": {"runId": "", "lockedBy": "", "lockedUntil": ""}}
+        )
+
+    async def _heartbeat(self, job: JobDefinition, run_id: str, slot: str, work: asyncio.Task):
+        while True:
+            await asyncio.sleep(job.lease / 3)
+            now = datetime.utcnow()
+            renewed = await self.locks.update_one(
+                {"_id": slot, "runId": run_id, "lockedBy": self.worker_id},
+                {"$set": {"lockedUntil": now + timedelta(seconds=job.lease)}}
+            )
+            if not renewed.matched_count:
+                # The slot was taken over (e.g. after a long stall); stop
+                # rather than run alongside whoever holds it now
+                logger.error(f"Job {job.name} run {run_id} lost its lease; cancelling")
+                work.cancel()
+                return
+            await self.runs.update_one({"_id": run_id}, {"$set": {"heartbeatAt": now}})
+
+    async def _execute(self, job: JobDefinition, run: Dict, slot: str):
+        run_id = run["_id"]
+        work = asyncio.create_task(job.handler(run.get("params") or {}))
+        heartbeat = asyncio.create_task(self._heartbeat(job, run_id, slot, work))
+        update: Dict[str, Any]
+        try:
+            result = await work
+            update = {"status": "succeeded", "result": result}
+        except asyncio.CancelledError:
+            update = {"status": "failed", "error": "Cancelled"}
+        except Exception as e:
+            logger.error(f"Job {job.name} run {run_id} failed: {str(e)}")
+            update = {"status": "failed", "error": str(e)}
+        finally:
+            heartbeat.cancel()
+            if not work.done():
+                work.cancel()
+        now = datetime.utcnow()
+        update.update({
+            "finishedAt": now,
+            "durationSeconds": round((now - run["startedAt"]).total_seconds(), 3),
+            "expiresAt": now + self.history
+        })
+        try:
+            await self.runs.update_one({"_id": run_id, "status": "running"}, {"$set": update})
+            await self._release_slot(slot, run_id)
+        except Exception as e:
+            logger.error(f"Error recording job run {run_id}: {str(e)}")
+        finally:
+            self._executing.pop(run_id, None)
+        logger.info(f"Job {job.name} run {run_id} {update['status']} in {update['durationSeconds']}s")
+
+    async def definitions(self) -> List[Dict]:
+        locks = {
+            lock["_id"]: lock
+            async for lock in self.locks.find({"_id": {"$in": [f"schedule:{name}" for name in self.jobs]}})
+        }
+        return [
+            {
+                "name": job.name,
+                "schedule": str(job.schedule) if job.schedule else None,
+                "nextRunAt": locks.get(f"schedule:{job.name}", {}).get("nextRunAt"),
+                "concurrency": job.concurrency,
+                "lease": job.lease
+            }
+            for job in self.jobs.values()
+        ]
+
+    async def recent_runs(self, name: Optional[str] = None, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        query = {}
+        if name:
+            query["job"] = name
+        if status:
+            query["status"] = status
+        return await self.runs.find(query, {"_id": 0}).sort("createdAt", -1).limit(limit).to_list(limit)
@@ -0,0 +1,207 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+
+from pymongo.errors import OperationFailure
+
+from delta_sync import SETTLE_SECONDS, position_query
+from id_migration import REKEYING_FIELD
+from serialization import dumps, to_row
+
+logger = logging.getLogger(__name__)
+
+# Server error code for "$changeStream is only supported on replica sets"
+CHANGE_STREAMS_UNSUPPORTED = 40573
+# The resume token fell off the oplog (or is otherwise unusable)
+CHANGE_STREAM_HISTORY_LOST = (280, 286)
+
+# Sent to a subscriber whose queue overflowed; it should reload (or delta sync)
+RESYNC_FRAME = b"event: resync\ndata: {}\n\n"
+KEEPALIVE_FRAME = b": keep-alive\n\n"
+
+
+class ChangeFeed:
+    """One change consumer per worker, fanned out to every connected client.
+
+    ``collections`` maps a collection name to ``(timestamp_field, model)``.
+    The consumer tails a Mongo change stream for inserts and updates on those
+    collections; on a standalone mongod (no change streams) it falls back to
+    polling the timestamp field in (timestamp, _id) order. Each event is
+    serialised once into an SSE frame and pushed onto a bounded queue per
+    subscriber, so a slow client is told to resync instead of holding up the
+    others. The consumer only runs while someone is subscribed. The change
+    stream resume token is kept across failures of any kind, so a reconnect
+    picks up where the stream stopped; if the token is no longer resumable
+    every client is told to resync. The id migration's re-keying writes (the
+    copy's insert and the update that finishes it) are not changes anyone
+    made, so they are left out.
+    """
+
+    def __init__(
+        self,
+        db,
+        collections: Dict[str, Tuple[str, type]],
+        mode: Optional[str] = None,
+        queue_size: Optional[int] = None,
+        heartbeat_interval: Optional[float] = None,
+        poll_interval: Optional[float] = None,
+        retry_delay: float = 5.0
+    ):
+        self.db = db
+        self.collections = collections
+        # auto: change stream, falling back to polling; or force "change_stream" / "poll"
+        self.mode = mode if mode is not None else os.environ.get('LIVE_FEED_MODE', 'auto')
+        self.queue_size = queue_size if queue_size is not None else int(os.environ.get('LIVE_FEED_QUEUE_SIZE', '256'))
+        self.heartbeat_interval = heartbeat_interval if heartbeat_interval is not None else float(os.environ.get('LIVE_FEED_HEARTBEAT_SECONDS', '15'))
+        self.poll_interval = poll_interval if poll_interval is not None else float(os.environ.get('LIVE_FEED_POLL_SECONDS', '2'))
+        self.retry_delay = retry_delay
+        self.poll_batch_size = 500
+        self.source: Optional[str] = None
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._consumer: Optional[asyncio.Task] = None
+        self._resume_token: Optional[Dict] = None
+        self._sequence = 0
+        self.events = 0
+        self.overflows = 0
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._subscribers.add(queue)
+        if self._consumer is None or self._consumer.done():
+            self._consumer = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+        if not self._subscribers and self._consumer is not None:
+            self._consumer.cancel()
+            self._consumer = None
+            self._resume_token = None
+            self.source = None
+
+    async def close(self):
+        self._subscribers.clear()
+        if self._consumer is not None:
+            self._consumer.cancel()
+            self._consumer = None
+
+    async def stream(self, request) -> AsyncIterator[bytes]:
+        """SSE frames for one client, with keep-alive comments while idle."""
+        queue = self.subscribe()
+        try:
+            yield f"retry: {int(self.retry_delay * 1000)}\n\n".encode("ascii")
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), timeout=self.heartbeat_interval)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    frame = KEEPALIVE_FRAME
+                yield frame
+        finally:
+            self.unsubscribe(queue)
+
+    def _broadcast(self, frame: bytes):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # Drop the backlog rather than buffer without bound or stall the feed
+                self.overflows += 1
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC_FRAME)
+
+    def publish(self, collection: str, operation: str, doc: Dict):
+        self._sequence += 1
+        self.events += 1
+        _, model = self.collections[collection]
+        frame = (
+            f"id: {self._sequence}\nevent: {collection}.{operation}\ndata: ".encode("ascii")
+            + dumps(to_row(model, doc))
+            + b"\n\n"
+        )
+        self._broadcast(frame)
+
+    async def _run(self):
+        use_change_stream = self.mode != "poll"
+        while True:
+            try:
+                if use_change_stream:
+                    await self._watch()
+                else:
+                    await self._poll()
+            except asyncio.CancelledError:
+                raise
+            except (OperationFailure, NotImplementedError) as e:
+                unsupported = not isinstance(e, OperationFailure) or e.code == CHANGE_STREAMS_UNSUPPORTED
+                if use_change_stream and unsupported and self.mode == "auto":
+                    logger.info("Change streams unavailable; live feed falling back to polling")
+                    use_change_stream = False
+                    continue
+                logger.error(f"Live feed consumer failed: {str(e)}")
+                await asyncio.sleep(self.retry_delay)
+            except Exception as e:
+                logger.error(f"Live feed consumer failed: {str(e)}")
+                await asyncio.sleep(self.retry_delay)
+
+    async def _watch(self):
+        pipeline = [{"$match": {
+            "operationType": {"$in": ["insert", "update", "replace"]},
+            "ns.coll": {"$in": list(self.collections)},
+            "$nor": [
+                {"operationType": "insert", f"fullDocument.{REKEYING_FIELD}": {"$exists": True}},
+                {"updateDescription.removedFields": REKEYING_FIELD}
+            ]
+        }}]
+        while True:
+            try:
+                async with self.db.watch(pipeline, full_document="updateLookup", resume_after=self._resume_token) as change_stream:
+                    self.source = "change_stream"
+                    async for change in change_stream:
+                        self._resume_token = change_stream.resume_token
+                        document = change.get("fullDocument")
+                        if document is not None:
+                            self.publish(change["ns"]["coll"], change["operationType"], document)
+            except OperationFailure as e:
+                if e.code in CHANGE_STREAM_HISTORY_LOST and self._resume_token is not None:
+                    # Events from the gap are gone; clients must reload
+                    logger.warning(f"Live feed resume token expired, restarting stream: {str(e)}")
+                    self._resume_token = None
+                    self._broadcast(RESYNC_FRAME)
+                    continue
+                if self._resume_token is None or e.code == CHANGE_STREAMS_UNSUPPORTED:
+                    raise
+                # Transient failure mid-stream: pick up where we left off
+                logger.warning(f"Live feed change stream interrupted, resuming: {str(e)}")
+                await asyncio.sleep(self.retry_delay)
+
+    async def _poll(self):
+        self.source = "poll"
+        start = datetime.utcnow() - timedelta(seconds=SETTLE_SECONDS)
+        positions = {name: (start, "") for name in self.collections}
+        while True:
+            upper_bound = datetime.utcnow() - timedelta(seconds=SETTLE_SECONDS)
+            caught_up = True
+            for name, (field, _) in self.collections.items():
+                docs = await self.db[name].find(position_query(field, positions[name], upper_bound)) \
+                    .sort([(field, 1), ("_id", 1)]).limit(self.poll_batch_size).to_list(self.poll_batch_size)
+                for doc in docs:
+                    inserted = field == "createdAt" or doc.get(field) == doc.get("createdAt")
+                    self.publish(name, "insert" if inserted else "update", doc)
+                if docs:
+                    positions[name] = (docs[-1][field], docs[-1]["_id"])
+                caught_up = caught_up and len(docs) < self.poll_batch_size
+            if caught_up:
+                await asyncio.sleep(self.poll_interval)
+
+    def stats(self) -> Dict:
+        return {
+            "source": self.source,
+            "mode": self.mode,
+            "subscribers": len(self._subscribers),
+            "events": self.events,
+            "overflows": self.overflows
+        }
@@ -0,0 +1,348 @@
+import os
+import time
+import asyncio
+import logging
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Fields kept in memory for each stay
+STAY_FIELDS = ("id", "propertyId", "propertyAddress", "guestName", "guestCount", "platform", "checkInAt", "checkOutAt")
+
+# Group name for stays whose address has not resolved to a property
+UNASSIGNED = ""
+
+
+def occupies(booking: Optional[Dict]) -> bool:
+    return bool(
+        booking
+        and booking.get("bookingStatus") == "confirmed"
+        and booking.get("checkInAt")
+        and booking.get("checkOutAt")
+    )
+
+
+def property_key(booking: Dict) -> str:
+    return booking.get("propertyId") or UNASSIGNED
+
+
+# Stays per block of a property's check-in order (a block splits at twice this)
+BLOCK_SIZE = 64
+
+
+def _start_key(stay: Dict) -> Tuple[datetime, str]:
+    return (stay["checkInAt"], stay["id"])
+
+
+def _end_key(stay: Dict) -> Tuple[datetime, str]:
+    return (stay["checkOutAt"], stay["id"])
+
+
+class PropertyIntervals:
+    """Stays of one property sorted by check-in, in blocks that each know
+    their latest check-out, plus the same stays sorted by check-out.
+
+    Stays overlapping a time range are those with check-in before its end
+    (a prefix of the check-in order) and check-out after its start; blocks
+    whose latest check-out is too early are skipped whole. A booking write
+    adds or removes one stay in place, a bisection and a shift within one
+    block, so writes never re-sort the property.
+
+    Positions are bisected on (time, id) keys; ``(time,)`` sorts before
+    every key at that time.
+    """
+
+    def __init__(self, stays: Iterable[Dict] = ()):
+        ordered = sorted(stays, key=_start_key)
+        self._blocks = [ordered[i:i + BLOCK_SIZE] for i in range(0, len(ordered), BLOCK_SIZE)]
+        self._keys = [[_start_key(stay) for stay in block] for block in self._blocks]
+        self._firsts = [keys[0] for keys in self._keys]
+        self._max_end = [max(stay["checkOutAt"] for stay in block) for block in self._blocks]
+        self.by_end = sorted(ordered, key=_end_key)
+        self.end_keys = [_end_key(stay) for stay in self.by_end]
+
+    def __len__(self) -> int:
+        return len(self.by_end)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.by_end)
+
+    def add(self, stay: Dict):
+        key = _start_key(stay)
+        if not self._blocks:
+            self._blocks.append([stay])
+            self._keys.append([key])
+            self._firsts.append(key)
+            self._max_end.append(stay["checkOutAt"])
+        else:
+            index = max(bisect_right(self._firsts, key) - 1, 0)
+            keys = self._keys[index]
+            position = bisect_right(keys, key)
+            keys.insert(position, key)
+            self._blocks[index].insert(position, stay)
+            self._firsts[index] = keys[0]
+            self._max_end[index] = max(self._max_end[index], stay["checkOutAt"])
+            if len(keys) > 2 * BLOCK_SIZE:
+                self._split(index)
+        key = _end_key(stay)
+        position = bisect_right(self.end_keys, key)
+        self.end_keys.insert(position, key)
+        self.by_end.insert(position, stay)
+
+    def remove(self, stay: Dict) -> bool:
+        """Remove ``stay`` (as it was added); False if it is not here."""
+        key = _start_key(stay)
+        index = bisect_right(self._firsts, key) - 1
+        if index < 0:
+            return False
+        keys, block = self._keys[index], self._blocks[index]
+        position = bisect_left(keys, key)
+        if position == len(keys) or keys[position] != key:
+            return False
+        del keys[position]
+        del block[position]
+        if not keys:
+            del self._blocks[index], self._keys[index], self._firsts[index], self._max_end[index]
+        else:
+            self._firsts[index] = keys[0]
+            if stay["checkOutAt"] >= self._max_end[index]:
+                self._max_end[index] = max(other["checkOutAt"] for other in block)
+        key = _end_key(stay)
+        position = bisect_left(self.end_keys, key)
+        del self.end_keys[position]
+        del self.by_end[position]
+        return True
+
+    def _split(self, index: int):
+        keys, block = self._keys[index], self._blocks[index]
+        half = len(keys) // 2
+        self._keys[index:index + 1] = [keys[:half], keys[half:]]
+        self._blocks[index:index + 1] = [block[:half], block[half:]]
+        self._firsts[index:index + 1] = [keys[0], keys[half]]
+        self._max_end[index:index + 1] = [
+            max(stay["checkOutAt"] for stay in block[:half]),
+            max(stay["checkOutAt"] for stay in block[half:])
+        ]
+
+    def _ending_after(self, start_limit: datetime, bound: datetime, inclusive: bool) -> List[Dict]:
+        """Stays checking in before ``start_limit`` that check out after ``bound``."""
+        found = []
+        limit = (start_limit,)
+        for index, keys in enumerate(self._keys):
+            if keys[0] >= limit:
+                break
+            end = self._max_end[index]
+            if end < bound or (end == bound and not inclusive):
+                continue
+            for stay in self._blocks[index][:bisect_left(keys, limit)]:
+                if stay["checkOutAt"] > bound or (inclusive and stay["checkOutAt"] == bound):
+                    found.append(stay)
+        return found
+
+    def occupied_at(self, at: datetime) -> List[Dict]:
+        """Stays with check-in <= at <= check-out (the analytics current-guest rule)."""
+        # Stored times have at most microsecond precision
+        return self._ending_after(at + timedelta(microseconds=1), at, inclusive=True)
+
+    def overlapping(self, start: datetime, end: datetime) -> List[Dict]:
+        return self._ending_after(end, start, inclusive=False)
+
+    def arriving(self, start: datetime, end: datetime) -> List[Dict]:
+        found = []
+        lower, upper = (start,), (end,)
+        for index in range(max(bisect_left(self._firsts, lower) - 1, 0), len(self._keys)):
+            keys = self._keys[index]
+            if keys[0] >= upper:
+                break
+            found.extend(self._blocks[index][bisect_left(keys, lower):bisect_left(keys, upper)])
+        return found
+
+    def departing(self, start: datetime, end: datetime) -> List[Dict]:
+        return self.by_end[bisect_left(self.end_keys, (start,)):bisect_left(self.end_keys, (end,))]
+
+    def free_windows(self, start: datetime, end: datetime, min_length: timedelta = timedelta(0)) -> List[Tuple[datetime, datetime]]:
+        """Gaps of at least ``min_length`` between stays within [start, end)."""
+        windows = []
+        cursor = start
+        for stay in self.overlapping(start, end):
+            if stay["checkInAt"] > cursor and stay["checkInAt"] - cursor >= min_length:
+                windows.append((cursor, stay["checkInAt"]))
+            cursor = max(cursor, stay["checkOutAt"])
+        if end > cursor and end - cursor >= min_length:
+            windows.append((cursor, end))
+        return windows
+
+
+class OccupancyIndex:
+    """Per-property interval index of confirmed stays, kept in memory.
+
+    Loaded from the bookings collection on first use (stays that ended more
+    than ``history_days`` ago are left out) and reloaded after ``ttl``
+    seconds. Booking writes on this worker are applied with ``apply()``,
+    which moves just that stay within its property's intervals; writes on other workers arrive as ``invalidate(property)`` and that
+    property is re-read on the next query. Writes applied while a load is
+    reading are buffered and replayed onto what it read, so a load that
+    started before a write cannot drop it.
+    """
+
+    def __init__(self, collection, ttl: Optional[float] = None, history_days: Optional[int] = None):
+        self.collection = collection
+        self.ttl = ttl if ttl is not None else float(os.environ.get('OCCUPANCY_INDEX_TTL_SECONDS', '900'))
+        self.history_days = history_days if history_days is not None else int(os.environ.get('OCCUPANCY_HISTORY_DAYS', '30'))
+        self._properties: Optional[Dict[str, PropertyIntervals]] = None
+        self._stays: Dict[str, Dict] = {}
+        self._dirty: Set[str] = set()
+        # (before, after) writes applied while a load is in flight
+        self._buffered: Optional[List[Tuple[Optional[Dict], Optional[Dict]]]] = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self.loads = 0
+        self.updates = 0
+
+    def _base_query(self) -> Dict:
+        return {
+            "bookingStatus": "confirmed",
+            "checkInAt": {"$ne": None},
+            "checkOutAt": {"$gte": datetime.utcnow() - timedelta(days=self.history_days)}
+        }
+
+    async def _load(self, query: Dict) -> List[Dict]:
+        projection = {field: 1 for field in STAY_FIELDS}
+        return [
+            {field: doc.get(field) for field in STAY_FIELDS}
+            async for doc in self.collection.find(query, projection)
+        ]
+
+    async def _current(self) -> Dict[str, PropertyIntervals]:
+        if self._properties is not None and not self._dirty and time.monotonic() - self._loaded_at < self.ttl:
+            return self._properties
+        async with self._lock:
+            if self._properties is None or time.monotonic() - self._loaded_at >= self.ttl:
+                generation = self._generation
+                self._buffered = []
+                try:
+                    stays = await self._load(self._base_query())
+                    self.loads += 1
+                    if generation == self._generation:
+                        self._stays = {stay["id"]: stay for stay in stays}
+                        self._properties = self._group(self._stays.values())
+                        self._replay_buffered()
+                        self._dirty.clear()
+                        self._loaded_at = time.monotonic()
+                    else:
+                        # Invalidated mid-load: answer from this snapshot, reload next time
+                        return self._group(stays)
+                finally:
+                    self._buffered = None
+            while self._dirty:
+                key = self._dirty.pop()
+                self._buffered = []
+                try:
+                    stays = await self._load({**self._base_query(), "propertyId": key or None})
+                    for stay in self._properties.pop(key, ()):
+                        self._stays.pop(stay["id"], None)
+                    for stay in stays:
+                        # Moved here from another property by a write elsewhere
+                        moved = self._stays.pop(stay["id"], None)
+                        if moved is not None:
+                            self._remove(moved)
+                        self._stays[stay["id"]] = stay
+                    if stays:
+                        self._properties[key] = PropertyIntervals(stays)
+                    self._replay_buffered()
+                finally:
+                    self._buffered = None
+            return self._properties
+
+    def _remove(self, stay: Dict):
+        key = property_key(stay)
+        intervals = self._properties.get(key)
+        if intervals is not None and intervals.remove(stay) and not intervals:
+            del self._properties[key]
+
+    def _apply_stay(self, before: Optional[Dict], after: Optional[Dict]):
+        # The stored copy, not ``before``, is what the intervals hold
+        for stay_id in {doc.get("id") for doc in (before, after) if doc is not None}:
+            stay = self._stays.pop(stay_id, None)
+            if stay is not None:
+                self._remove(stay)
+        if occupies(after):
+            stay = {field: after.get(field) for field in STAY_FIELDS}
+            self._stays[stay["id"]] = stay
+            self._properties.setdefault(property_key(stay), PropertyIntervals()).add(stay)
+
+    def _replay_buffered(self):
+        """Re-apply the writes made during a load (the load may predate them)."""
+        for before, after in self._buffered:
+            self._apply_stay(before, after)
+
+    @staticmethod
+    def _group(stays) -> Dict[str, PropertyIntervals]:
+        grouped: Dict[str, List[Dict]] = {}
+        for stay in stays:
+            grouped.setdefault(property_key(stay), []).append(stay)
+        return {key: PropertyIntervals(group) for key, group in grouped.items()}
+
+    async def load(self):
+        await self._current()
+
+    def apply(self, before: Optional[Dict], after: Optional[Dict]) -> List[str]:
+        """Apply one booking write; returns the property keys it touched."""
+        touched = {property_key(doc) for doc in (before, after) if occupies(doc)}
+        if not touched:
+            return []
+        if self._buffered is not None:
+            self._buffered.append((before, after))
+        if self._properties is None:
+            # Not loaded: the next load reads it (or replays it, if in flight)
+            return sorted(touched)
+        self._apply_stay(before, after)
+        self.updates += 1
+        return sorted(touched)
+
+    def invalidate(self, key: Optional[str] = None):
+        """Re-read one property (``key``) or everything (None) on the next query."""
+        if key is None:
+            self._generation += 1
+            self._properties = None
+        elif self._properties is not None:
+            self._dirty.add(key)
+
+    async def occupied_at(self, at: datetime, property_id: Optional[str] = None) -> Dict[str, List[Dict]]:
+        return self._per_property(await self._current(), property_id, lambda intervals: intervals.occupied_at(at))
+
+    async def arriving(self, start: datetime, end: datetime, property_id: Optional[str] = None) -> Dict[str, List[Dict]]:
+        return self._per_property(await self._current(), property_id, lambda intervals: intervals.arriving(start, end))
+
+    async def departing(self, start: datetime, end: datetime, property_id: Optional[str] = None) -> Dict[str, List[Dict]]:
+        return self._per_property(await self._current(), property_id, lambda intervals: intervals.departing(start, end))
+
+    async def free_windows(self, property_id: str, start: datetime, end: datetime, min_length: timedelta = timedelta(0)) -> List[Tuple[datetime, datetime]]:
+        intervals = (await self._current()).get(property_id)
+        if intervals is None:
+            return [(start, end)] if end - start >= min_length else []
+        return intervals.free_windows(start, end, min_length)
+
+    @staticmethod
+    def _per_property(properties, property_id, query) -> Dict[str, List[Dict]]:
+        selected = {property_id: properties.get(property_id)} if property_id is not None else properties
+        results = {}
+        for key, intervals in selected.items():
+            if intervals is None:
+                continue
+            stays = query(intervals)
+            if stays:
+                results[key] = stays
+        return results
+
+    def stats(self) -> Dict:
+        return {
+            "name": "occupancy",
+            "properties": len(self._properties) if self._properties is not None else None,
+            "stays": len(self._stays) if self._properties is not None else None,
+            "loads": self.loads,
+            "updates": self.updates
+        }
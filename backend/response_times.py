@@ -0,0 +1,335 @@
+import math
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pymongo import UpdateOne
+
+from ids import new_id
+
+logger = logging.getLogger(__name__)
+
+# Statuses that close a request; the first move into one sets resolvedAt
+RESOLVED_STATUSES = ("completed", "resolved")
+
+PERCENTILES = (0.5, 0.9, 0.99)
+
+# group_by names accepted by the analytics endpoint -> request fields
+GROUP_FIELDS = {
+    "property": "propertyId",
+    "requestType": "requestType",
+    "priority": "priority",
+}
+
+# (output name, timestamp field measured from createdAt)
+METRICS = (("firstResponse", "firstRespondedAt"), ("resolution", "resolvedAt"))
+
+# Rollup histograms use log-spaced buckets: bucket i holds durations up to
+# BUCKET_BASE * BUCKET_RATIO ** i seconds, so a percentile read from them
+# is at most 10% above the exact value
+BUCKET_BASE = 60.0
+BUCKET_RATIO = 1.1
+
+# Days of requests held in memory at once while rebuilding rollups
+ROLLUP_CHUNK_DAYS = 30
+
+
+def response_time_update(fields: Dict, status: Optional[str], replied: bool, now: datetime) -> List[Dict]:
+    """Pipeline update that ``$set``s ``fields`` and records the staff action
+    as the request's first response and/or resolution, unless one was already
+    recorded.
+
+    A reply or any status change away from pending is a response. ``$ifNull``
+    keeps an existing timestamp, so later edits never move it (``$min`` would
+    not do: null sorts before every date). Plain values are wrapped in
+    ``$literal`` so strings starting with ``$`` are not read as field paths.
+    """
+    stage = {field: {"$literal": value} for field, value in fields.items()}
+    if replied or (status and status != "pending"):
+        stage["firstRespondedAt"] = {"$ifNull": ["$firstRespondedAt", now]}
+    if status in RESOLVED_STATUSES:
+        stage["resolvedAt"] = {"$ifNull": ["$resolvedAt", now]}
+    return [{"$set": stage}]
+
+
+async def backfill_response_times(collection, batch_size: int = 500) -> int:
+    """Derive firstRespondedAt / resolvedAt from respondedAt on old requests."""
+    updated = 0
+    while True:
+        docs = await collection.find(
+            {"firstRespondedAt": {"$exists": False}, "respondedAt": {"$ne": None}},
+            {"respondedAt": 1, "status": 1}
+        ).limit(batch_size).to_list(batch_size)
+        if not docs:
+            return updated
+        operations = []
+        for doc in docs:
+            fields = {"firstRespondedAt": doc["respondedAt"]}
+            if doc.get("status") in RESOLVED_STATUSES:
+                fields["resolvedAt"] = doc["respondedAt"]
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+        await collection.bulk_write(operations, ordered=False)
+        updated += len(docs)
+
+
+def _match(start: datetime, end: datetime, filters: Dict) -> Dict:
+    return {"createdAt": {"$gte": start, "$lt": end}, **{field: value for field, value in filters.items() if value is not None}}
+
+
+def _group_id(fields: Sequence[str]) -> Dict:
+    return {field: f"${field}" for field in fields}
+
+
+def _key(doc: Dict, fields: Sequence[str]) -> Tuple:
+    return tuple(doc.get(field) for field in fields)
+
+
+async def exact_percentiles(collection, start: datetime, end: datetime, fields: Sequence[str], filters: Dict) -> List[Dict]:
+    """Nearest-rank percentiles computed in Mongo over the raw requests.
+
+    Durations are sorted before ``$group`` so each pushed array is already
+    ordered and a percentile is one ``$arrayElemAt``.
+    """
+    match = _match(start, end, filters)
+    counts = await collection.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": _group_id(fields),
+            "requests": {"$sum": 1},
+            "propertyAddress": {"$first": "$propertyAddress"}
+        }}
+    ], allowDiskUse=True).to_list(None)
+    rows = {_key(doc["_id"], fields): _row(doc["_id"], fields, doc) for doc in counts}
+
+    for name, timestamp in METRICS:
+        pipeline = [
+            {"$match": {**match, timestamp: {"$ne": None}}},
+            {"$project": {
+                **{field: 1 for field in fields},
+                "seconds": {"$divide": [{"$subtract": [f"${timestamp}", "$createdAt"]}, 1000]}
+            }},
+            {"$sort": {"seconds": 1}},
+            {"$group": {"_id": _group_id(fields), "values": {"$push": "$seconds"}}},
+            {"$project": {
+                "count": {"$size": "$values"},
+                **{
+                    f"p{round(p * 100)}": {"$arrayElemAt": [
+                        "$values",
+                        {"$subtract": [{"$ceil": {"$multiply": [p, {"$size": "$values"}]}}, 1]}
+                    ]}
+                    for p in PERCENTILES
+                }
+            }}
+        ]
+        async for doc in collection.aggregate(pipeline, allowDiskUse=True):
+            row = rows.get(_key(doc["_id"], fields))
+            if row is None:
+                continue
+            row[name] = {
+                "count": doc["count"],
+                **{f"p{round(p * 100)}": round(doc[f"p{round(p * 100)}"], 1) for p in PERCENTILES}
+            }
+    return list(rows.values())
+
+
+def _row(group: Dict, fields: Sequence[str], doc: Dict) -> Dict:
+    row = {field: group.get(field) for field in fields}
+    if "propertyId" in fields:
+        row["propertyAddress"] = doc.get("propertyAddress")
+    row["requests"] = doc.get("requests", 0)
+    for name, _ in METRICS:
+        row[name] = {"count": 0, **{f"p{round(p * 100)}": None for p in PERCENTILES}}
+    return row
+
+
+def bucket_index(seconds: float) -> int:
+    if seconds <= BUCKET_BASE:
+        return 0
+    return math.ceil(math.log(seconds / BUCKET_BASE, BUCKET_RATIO))
+
+
+def bucket_value(index: int) -> float:
+    return BUCKET_BASE * BUCKET_RATIO ** index
+
+
+def _histogram_percentiles(histogram: Dict[int, int]) -> Dict:
+    total = sum(histogram.values())
+    result = {"count": total}
+    ordered = sorted(histogram.items())
+    for p in PERCENTILES:
+        name = f"p{round(p * 100)}"
+        if not total:
+            result[name] = None
+            continue
+        rank = math.ceil(p * total)
+        seen = 0
+        for index, count in ordered:
+            seen += count
+            if seen >= rank:
+                result[name] = round(bucket_value(index), 1)
+                break
+    return result
+
+
+ROLLUP_FIELDS = tuple(GROUP_FIELDS.values())
+
+
+def _day(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+async def _histograms_from_requests(collection, start: datetime, end: datetime, filters: Dict) -> Dict[Tuple, Dict]:
+    """Per (day, property, type, priority) counts and duration histograms."""
+    groups: Dict[Tuple, Dict] = {}
+    projection = {"createdAt": 1, "propertyAddress": 1, **{field: 1 for field in ROLLUP_FIELDS}, **{timestamp: 1 for _, timestamp in METRICS}}
+    async for doc in collection.find(_match(start, end, filters), projection):
+        key = (_day(doc["createdAt"]), *_key(doc, ROLLUP_FIELDS))
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {"requests": 0, "propertyAddress": doc.get("propertyAddress"), **{name: {} for name, _ in METRICS}}
+        group["requests"] += 1
+        for name, timestamp in METRICS:
+            if doc.get(timestamp):
+                index = bucket_index((doc[timestamp] - doc["createdAt"]).total_seconds())
+                group[name][index] = group[name].get(index, 0) + 1
+    return groups
+
+
+async def rollup_days(requests, rollups, start: datetime, end: datetime, chunk_days: int = ROLLUP_CHUNK_DAYS) -> int:
+    """Rebuild the daily rollup documents for requests created in [start, end),
+    ``chunk_days`` at a time."""
+    start, end = _day(start), _day(end)
+    written = 0
+    while start < end:
+        chunk_end = min(start + timedelta(days=chunk_days), end)
+        groups = await _histograms_from_requests(requests, start, chunk_end, {})
+        documents = [
+            {
+                "_id": new_id(),
+                "day": day,
+                **dict(zip(ROLLUP_FIELDS, values)),
+                "propertyAddress": group["propertyAddress"],
+                "requests": group["requests"],
+                **{name: [{"b": index, "n": count} for index, count in sorted(group[name].items())] for name, _ in METRICS}
+            }
+            for (day, *values), group in groups.items()
+        ]
+        await rollups.delete_many({"day": {"$gte": start, "$lt": chunk_end}})
+        if documents:
+            await rollups.insert_many(documents)
+        written += len(documents)
+        start = chunk_end
+    return written
+
+
+async def _changed_days(requests, tombstones, since: datetime, before: datetime) -> List[datetime]:
+    """Creation days before ``before`` of requests updated or deleted since ``since``."""
+    days = set()
+    async for doc in requests.find({"lastUpdatedAt": {"$gte": since}, "createdAt": {"$lt": before}}, {"createdAt": 1}):
+        days.add(_day(doc["createdAt"]))
+    if tombstones is not None:
+        async for doc in tombstones.find({"deletedAt": {"$gte": since}, "createdAt": {"$lt": before}}, {"createdAt": 1}):
+            days.add(_day(doc["createdAt"]))
+    return sorted(days)
+
+
+async def rollup_percentiles(
+    requests,
+    rollups,
+    start: datetime,
+    end: datetime,
+    rolled_through: Optional[datetime],
+    fields: Sequence[str],
+    filters: Dict
+) -> List[Dict]:
+    """Approximate percentiles from daily rollups, plus raw requests for the
+    days after ``rolled_through`` that have no rollup yet."""
+    split = min(max(rolled_through or start, start), end)
+    merged: Dict[Tuple, Dict] = {}
+
+    def merge(key: Tuple, requests_count: int, address: Optional[str], histograms: Iterable[Tuple[str, Dict[int, int]]]):
+        row = merged.get(key)
+        if row is None:
+            row = merged[key] = {"requests": 0, "propertyAddress": address, **{name: {} for name, _ in METRICS}}
+        row["requests"] += requests_count
+        for name, histogram in histograms:
+            for index, count in histogram.items():
+                row[name][index] = row[name].get(index, 0) + count
+
+    if split > start:
+        match = {"day": {"$gte": _day(start), "$lt": split}, **{field: value for field, value in filters.items() if value is not None}}
+        async for doc in rollups.aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": _group_id(fields),
+                "requests": {"$sum": "$requests"},
+                "propertyAddress": {"$first": "$propertyAddress"}
+            }}
+        ]):
+            merge(_key(doc["_id"], fields), doc["requests"], doc.get("propertyAddress"), [])
+        for name, _ in METRICS:
+            async for doc in rollups.aggregate([
+                {"$match": match},
+                {"$unwind": f"${name}"},
+                {"$group": {"_id": {**_group_id(fields), "b": f"${name}.b"}, "n": {"$sum": f"${name}.n"}}}
+            ], allowDiskUse=True):
+                merge(_key(doc["_id"], fields), 0, None, [(name, {doc["_id"]["b"]: doc["n"]})])
+
+    if end > split:
+        recent = await _histograms_from_requests(requests, split, end, filters)
+        for (_, *values), group in recent.items():
+            key = _key(dict(zip(ROLLUP_FIELDS, values)), fields)
+            merge(key, group["requests"], group["propertyAddress"], [(name, group[name]) for name, _ in METRICS])
+
+    rows = []
+    for key, group in merged.items():
+        row = dict(zip(fields, key))
+        if "propertyId" in fields:
+            row["propertyAddress"] = group["propertyAddress"]
+        row["requests"] = group["requests"]
+        for name, _ in METRICS:
+            row[name] = _histogram_percentiles(group[name])
+        rows.append(row)
+    return rows
+
+
+async def refresh_rollups(requests, rollups, state, refresh_days: int, tombstones=None) -> Dict:
+    """Rebuild the trailing ``refresh_days`` of rollups (all history on the
+    first run) and advance the rolled-through watermark to today.
+
+    A request answered, resolved, edited or deleted (``tombstones``) after
+    its day left the window changes that day's histograms, so every older
+    day with a request updated or deleted since the previous run is rebuilt
+    too.
+    """
+    started = datetime.utcnow()
+    today = _day(started)
+    current = await state.find_one({"_id": "response_times"})
+    changed: List[datetime] = []
+    documents = 0
+    if current is None:
+        oldest = await requests.find_one({"createdAt": {"$ne": None}}, {"createdAt": 1}, sort=[("createdAt", 1)])
+        start = _day(oldest["createdAt"]) if oldest else today
+    else:
+        start = min(current["through"], today - timedelta(days=refresh_days))
+        since = current.get("changesFrom") or current["updatedAt"]
+        changed = await _changed_days(requests, tombstones, since, start)
+        # Consecutive changed days are rebuilt as one range
+        range_start = range_end = None
+        for day in changed + [None]:
+            if day is not None and day == range_end:
+                range_end = day + timedelta(days=1)
+                continue
+            if range_start is not None:
+                documents += await rollup_days(requests, rollups, range_start, range_end)
+            if day is not None:
+                range_start, range_end = day, day + timedelta(days=1)
+    documents += await rollup_days(requests, rollups, start, today)
+    await state.update_one(
+        {"_id": "response_times"},
+        # The next run looks for changes made since this one started
+        {"$set": {"through": today, "changesFrom": started, "updatedAt": datetime.utcnow()}},
+        upsert=True
+    )
+    logger.info(f"Response time rollups rebuilt from {start:%Y-%m-%d} and {len(changed)} changed earlier days: {documents} documents")
+    return {"from": start, "through": today, "changed_days": len(changed), "documents": documents}
@@ -0,0 +1,103 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import orjson
+from fastapi.responses import ORJSONResponse
+
+_MISSING = object()
+
+_projectors: Dict[tuple, Callable[[Dict], Dict]] = {}
+
+
+def row_projector(model, fields: Optional[Iterable[str]] = None) -> Callable[[Dict], Dict]:
+    """Build (and memoise) a function turning a stored document into a response row.
+
+    Rows are plain dicts holding ``model``'s fields in declaration order, so
+    they serialise exactly like ``model(**doc).dict()`` but without running
+    validation on data we wrote ourselves. Missing fields get the model
+    default, as construction would.
+    """
+    names = tuple(fields) if fields is not None else tuple(model.model_fields)
+    cache_key = (model, names)
+    projector = _projectors.get(cache_key)
+    if projector is not None:
+        return projector
+
+    model_fields = model.model_fields
+    defaults = {}
+    factories = {}
+    for name in names:
+        field = model_fields[name]
+        if field.default_factory is not None:
+            factories[name] = field.default_factory
+        elif not field.is_required():
+            defaults[name] = field.default
+
+    def project(doc: Dict) -> Dict:
+        row = {}
+        for name in names:
+            value = doc.get(name, _MISSING)
+            if value is _MISSING:
+                if name in factories:
+                    value = factories[name]()
+                else:
+                    value = defaults.get(name)
+            row[name] = value
+        return row
+
+    _projectors[cache_key] = project
+    return project
+
+
+def select_fields(
+    model,
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
+    summary_fields: Optional[Iterable[str]] = None
+) -> Optional[Tuple[str, ...]]:
+    """Resolve a ``fields=a,b`` / ``view=summary`` request into model field names.
+
+    Returns ``None`` for the full document. ``id`` is always included so rows
+    stay addressable. Unknown fields or views raise ``ValueError``.
+    """
+    if fields:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+    elif view == "summary" and summary_fields is not None:
+        names = list(summary_fields)
+    elif view in (None, "", "full"):
+        return None
+    else:
+        raise ValueError(f"Unknown view: {view}")
+
+    unknown = [name for name in names if name not in model.model_fields]
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+    if "id" in model.model_fields and "id" not in names:
+        names.insert(0, "id")
+    return tuple(dict.fromkeys(names))
+
+
+def projection_for(fields: Optional[Iterable[str]]) -> Dict:
+    """Mongo projection returning only ``fields`` (everything when ``None``), never ``_id``."""
+    projection = {"_id": 0}
+    if fields is not None:
+        projection.update({name: 1 for name in fields})
+    return projection
+
+
+def to_row(model, doc: Dict) -> Dict:
+    return row_projector(model)(doc)
+
+
+def to_rows(model, docs: Iterable[Dict], fields: Optional[Iterable[str]] = None) -> List[Dict]:
+    project = row_projector(model, fields)
+    return [project(doc) for doc in docs]
+
+
+def dumps(value: Any) -> bytes:
+    """Encode with orjson; naive datetimes come out as ``isoformat()`` would."""
+    return orjson.dumps(value)
+
+
+def json_response(content: Any, status_code: int = 200, headers: Optional[Dict] = None) -> ORJSONResponse:
+    """Return ``content`` encoded by orjson, bypassing FastAPI's jsonable_encoder pass."""
+    return ORJSONResponse(content, status_code=status_code, headers=headers)
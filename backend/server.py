@@ -1,13 +1,14 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, Form
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, APIRouter, UploadFile, File, Form, Request, Header
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr, validator
-from typing import List, Optional
+from typing import List, Optional, Set
 import uuid
 from datetime import datetime, timedelta
 import shutil
@@ -18,6 +19,34 @@ load_dotenv(ROOT_DIR / '.env')
 # Import services after loading environment variables
 from email_service import email_service
 from telegram_service import telegram_service
+from upload_gc import UploadGarbageCollector
+from cache import cache_registry, owner_property_cache, guest_request_cache, analytics_cache
+from singleflight import single_flight, single_flight_stats
+from exports import stream_export
+from streaming import stream_json_list
+from serialization import to_row, to_rows, json_response, select_fields, projection_for
+from compression import CompressionMiddleware
+from delta_sync import changes_since, TOMBSTONE_RETENTION_DAYS
+from live_feed import ChangeFeed
+from ids import new_id, new_confirmation_number, document_for
+from id_migration import LegacyKeys, drop_legacy_id_indexes, ensure_legacy_id_indexes, migrate_primary_keys, needs_migration
+from stay_dates import parse_stay_date, backfill_stay_dates
+from webhook_inbox import WebhookInbox
+from addresses import PropertyAddressIndex, PropertyIdStamper, address_pattern, normalize_address, stamp_property_ids
+from occupancy import OccupancyIndex
+from service_scheduler import ServiceScheduler, STAY_SERVICES
+from jobs import JobRunner
+from sla import SlaWatcher, sla_due_at, backfill_sla_due
+from response_times import (
+    GROUP_FIELDS, response_time_update, backfill_response_times,
+    exact_percentiles, rollup_percentiles, refresh_rollups
+)
+from booking_ingest import (
+    booking_key, upsert_booking, upsert_bookings, apply_booking_event, parse_batch_body,
+    archive_duplicate_bookings, park_booking_event, take_parked_booking_event, parked_booking_keys,
+    IdempotencyStore
+)
+from etag import make_etag, content_etag, collection_version, matches_if_none_match, etag_headers, not_modified
 
 # Create uploads directory
 UPLOAD_DIR = ROOT_DIR / "uploads"
@@ -38,8 +67,46 @@ parsed_url = urlparse(mongo_url)
 db_name = parsed_url.path.lstrip('/') if parsed_url.path and parsed_url.path != '/' else os.environ.get('DB_NAME', 'luxserv365')
 db = client[db_name]
 
+upload_gc = UploadGarbageCollector(db, UPLOAD_DIR)
+# Periodic and one-off maintenance jobs, coordinated across workers
+job_runner = JobRunner(db)
+# Finds documents by their old ``id`` until the id migration has run
+legacy_keys = LegacyKeys(db)
+cache_registry.add_listener("legacy_keys", lambda group: legacy_keys.expire())
+webhook_idempotency = IdempotencyStore(db.webhook_events)
+booking_inbox = WebhookInbox(db.booking_inbox)
+# Resolves free-text addresses on bookings and requests to a property id
+property_addresses = cache_registry.register_local(PropertyAddressIndex(db.properties))
+
+def on_property_address_invalidated(group: str):
+    property_addresses.invalidate()
+    if group != "*":
+        # The writing worker stamps these; match them by address meanwhile
+        property_id_stamper.note_remote(group.split("|"))
+
+cache_registry.add_listener("property_address", on_property_address_invalidated)
+async def escalate_sla_breach(request: dict) -> bool:
+    """Tell the team on Telegram that a request passed its response deadline."""
+    overdue_minutes = int((datetime.utcnow() - request["slaDueAt"]).total_seconds() // 60)
+    text = f"""⏰ SLA BREACH - {str(request.get('priority', 'normal')).upper()} request unanswered
+
+Confirmation: {request.get('confirmationNumber')}
+Guest: {request.get('guestName')} ({request.get('guestEmail')})
+Property: {request.get('propertyAddress')}
+Type: {request.get('requestType')}
+Due: {request['slaDueAt']:%Y-%m-%d %H:%M} UTC ({overdue_minutes} min overdue)"""
+    return await telegram_service.send_text(text)
+
+# Watches guest request response deadlines and escalates breaches
+sla_watcher = SlaWatcher(db.guest_requests, db.sla_breaches, escalate_sla_breach, on_change=lambda request: invalidate_guest_request_cache(request))
+# Timed pre-arrival / in-stay / post-checkout jobs for each booking
+service_scheduler = ServiceScheduler(db.scheduled_jobs)
+# In-memory interval index of confirmed stays per property; group "*" reloads all
+occupancy = cache_registry.register_local(OccupancyIndex(db.bookings))
+cache_registry.add_listener("occupancy", lambda group: occupancy.invalidate(None if group == "*" else group))
+
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -52,7 +119,7 @@ async def health_check():
 
 # Define Models
 class StatusCheck(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     client_name: str
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
@@ -83,7 +150,7 @@ class ContactSubmissionCreate(BaseModel):
         return v
 
 class ContactSubmission(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     name: str
     email: str
     phone: Optional[str] = None
@@ -109,7 +176,7 @@ class OwnerMessageCreate(BaseModel):
         return v
 
 class OwnerMessage(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     subject: str
     message: str
     priority: str
@@ -128,7 +195,7 @@ class InspectionReportCreate(BaseModel):
     inspectionDate: datetime = Field(default_factory=datetime.utcnow, description="Inspection date")
 
 class InspectionReport(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     title: str
     notes: str
     ownerEmail: str
@@ -138,7 +205,7 @@ class InspectionReport(BaseModel):
     reportFile: Optional[str] = None
 
 class PhotoUpload(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     filename: str
     originalName: str
     ownerEmail: str
@@ -185,16 +252,16 @@ class GuestRequestCreate(BaseModel):
         return v
 
 class GuestRequestPhoto(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     filename: str
     originalName: str
     uploadedAt: datetime = Field(default_factory=datetime.utcnow)
 
 class Booking(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     platformBookingId: str  # Airbnb/VRBO booking ID
     platform: str  # airbnb, vrbo, direct, etc.
-    propertyId: str
+    propertyId: Optional[str] = None
     propertyAddress: str
     guestName: str
     guestEmail: str
@@ -202,13 +269,24 @@ class Booking(BaseModel):
     guestCount: int
     checkInDate: str
     checkOutDate: str
+    # Parsed from the raw strings above for indexed range queries
+    checkInAt: Optional[datetime] = None
+    checkOutAt: Optional[datetime] = None
     bookingAmount: Optional[float] = None
     specialRequests: Optional[str] = None
     bookingStatus: str = Field(default="confirmed")
     createdAt: datetime = Field(default_factory=datetime.utcnow)
+    # Our clock at the last write of any kind; the live feed polls on it
+    updatedAt: Optional[datetime] = None
+    # Platform timestamp of the newest event applied; older events are ignored
+    lastEventAt: Optional[datetime] = None
+    # When the newest applied update reached us; orders events with no
+    # platform timestamp (unset on create, which every update follows)
+    lastReceivedAt: Optional[datetime] = None
+    cancelledAt: Optional[datetime] = None
 
 class Property(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     ownerId: str
     address: str
     propertyType: str  # condo, house, etc.
@@ -220,7 +298,7 @@ class Property(BaseModel):
     createdAt: datetime = Field(default_factory=datetime.utcnow)
 
 class GuestRequest(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     bookingId: Optional[str] = None  # Link to booking
     guestName: str
     guestEmail: str
@@ -229,6 +307,9 @@ class GuestRequest(BaseModel):
     propertyAddress: str
     checkInDate: str
     checkOutDate: str
+    checkInAt: Optional[datetime] = None
+    checkOutAt: Optional[datetime] = None
+    propertyId: Optional[str] = None
     unitNumber: Optional[str] = None
     requestType: str
     priority: str
@@ -241,13 +322,20 @@ class GuestRequest(BaseModel):
     adminPhotos: List[GuestRequestPhoto] = Field(default_factory=list)
     lastUpdatedBy: Optional[str] = None
     lastUpdatedAt: Optional[datetime] = None
+    confirmationNumber: Optional[str] = None
+    # Response deadline by priority; slaBreachedAt is set once it passed unanswered
+    slaDueAt: Optional[datetime] = None
+    slaBreachedAt: Optional[datetime] = None
+    # First staff reply or status change, and first move to completed/resolved
+    firstRespondedAt: Optional[datetime] = None
+    resolvedAt: Optional[datetime] = None
 
 class AdminAuth(BaseModel):
     username: str
     password: str
 
 class AdminLogin(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     username: str
     loginAt: datetime = Field(default_factory=datetime.utcnow)
     ipAddress: Optional[str] = None
@@ -283,7 +371,7 @@ class PropertyCreate(BaseModel):
     notes: Optional[str] = Field(None, description="Admin notes about property")
 
 class PropertyModel(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     ownerEmail: str
     ownerName: str
     propertyAddress: str
@@ -306,6 +394,29 @@ class PropertyUpdate(BaseModel):
     notes: Optional[str] = None
     isActive: Optional[bool] = None
 
+# Columns returned by list endpoints with view=summary (the admin table views)
+GUEST_REQUEST_SUMMARY_FIELDS = [
+    "id", "guestName", "guestEmail", "propertyAddress", "unitNumber",
+    "checkInDate", "checkOutDate", "requestType", "priority", "status",
+    "createdAt", "respondedAt", "lastUpdatedBy", "lastUpdatedAt", "confirmationNumber"
+]
+
+BOOKING_SUMMARY_FIELDS = [
+    "id", "platform", "platformBookingId", "propertyAddress", "guestName",
+    "guestCount", "checkInDate", "checkOutDate", "bookingStatus", "createdAt"
+]
+
+PROPERTY_SUMMARY_FIELDS = [
+    "id", "ownerEmail", "ownerName", "propertyAddress", "propertyType",
+    "isActive", "updatedAt"
+]
+
+# Pushes guest request and booking writes to connected admin dashboards
+live_feed = ChangeFeed(db, {
+    "guest_requests": ("lastUpdatedAt", GuestRequest),
+    "bookings": ("updatedAt", Booking)
+})
+
 # Helper functions for notifications
 def get_priority_emoji(priority: str) -> str:
     """Get emoji for priority level."""
@@ -487,13 +598,16 @@ async def root():
 async def create_status_check(input: StatusCheckCreate):
     status_dict = input.dict()
     status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
+    _ = await db.status_checks.insert_one(document_for(status_obj))
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+async def get_status_checks(limit: int = 1000, cursor: Optional[str] = None):
+    # Bare array response; the next page cursor travels in X-Next-Cursor
+    return await stream_json_list(
+        db.status_checks, {}, StatusCheck, "timestamp", direction=1,
+        limit=limit, cursor=cursor, envelope=False
+    )
 
 @api_router.post("/contact", response_model=dict)
 async def submit_contact_form(submission: ContactSubmissionCreate):
@@ -503,7 +617,7 @@ async def submit_contact_form(submission: ContactSubmissionCreate):
         contact_obj = ContactSubmission(**contact_dict)
         
         # Insert into database
-        result = await db.contact_submissions.insert_one(contact_obj.dict())
+        result = await db.contact_submissions.insert_one(document_for(contact_obj))
         
         if result.inserted_id:
             logger.info(f"Contact form submitted: {contact_obj.email}")
@@ -524,13 +638,12 @@ async def submit_contact_form(submission: ContactSubmissionCreate):
         }
 
 @api_router.get("/contact")
-async def get_contact_submissions():
+async def get_contact_submissions(limit: int = 1000, cursor: Optional[str] = None):
     try:
-        submissions = await db.contact_submissions.find().sort("createdAt", -1).to_list(1000)
-        return {
-            "success": True,
-            "data": [ContactSubmission(**submission).dict() for submission in submissions]
-        }
+        return await stream_json_list(
+            db.contact_submissions, {}, ContactSubmission, "createdAt",
+            limit=limit, cursor=cursor
+        )
     except Exception as e:
         logger.error(f"Error retrieving contact submissions: {str(e)}")
         return {
@@ -547,7 +660,7 @@ async def submit_owner_message(message: OwnerMessageCreate):
         message_obj = OwnerMessage(**message_dict)
         
         # Insert into database
-        result = await db.owner_messages.insert_one(message_obj.dict())
+        result = await db.owner_messages.insert_one(document_for(message_obj))
         
         if result.inserted_id:
             logger.info(f"Owner message submitted: {message_obj.ownerEmail} - {message_obj.subject}")
@@ -581,13 +694,18 @@ async def submit_owner_message(message: OwnerMessageCreate):
         }
 
 @api_router.get("/messages/owner/{owner_email}")
-async def get_owner_messages(owner_email: str):
+async def get_owner_messages(owner_email: str, request: Request):
     try:
-        messages = await db.owner_messages.find({"ownerEmail": owner_email}).sort("createdAt", -1).to_list(100)
-        return {
+        query = {"ownerEmail": owner_email}
+        etag = make_etag("owner_messages", owner_email, await collection_version(db.owner_messages, query, ["createdAt"]))
+        if matches_if_none_match(request, etag):
+            return not_modified(etag)
+
+        messages = await db.owner_messages.find(query, {"_id": 0}).sort("createdAt", -1).to_list(100)
+        return json_response({
             "success": True,
-            "data": [OwnerMessage(**message).dict() for message in messages]
-        }
+            "data": to_rows(OwnerMessage, messages)
+        }, headers=etag_headers(etag))
     except Exception as e:
         logger.error(f"Error retrieving owner messages: {str(e)}")
         return {
@@ -597,13 +715,12 @@ async def get_owner_messages(owner_email: str):
         }
 
 @api_router.get("/messages")
-async def get_all_messages():
+async def get_all_messages(limit: int = 1000, cursor: Optional[str] = None):
     try:
-        messages = await db.owner_messages.find().sort("createdAt", -1).to_list(1000)
-        return {
-            "success": True,
-            "data": [OwnerMessage(**message).dict() for message in messages]
-        }
+        return await stream_json_list(
+            db.owner_messages, {}, OwnerMessage, "createdAt",
+            limit=limit, cursor=cursor
+        )
     except Exception as e:
         logger.error(f"Error retrieving all messages: {str(e)}")
         return {
@@ -645,7 +762,7 @@ async def create_inspection_report(
             inspection_obj.reportFile = unique_filename
         
         # Insert into database
-        result = await db.inspection_reports.insert_one(inspection_obj.dict())
+        result = await db.inspection_reports.insert_one(document_for(inspection_obj))
         
         if result.inserted_id:
             logger.info(f"Inspection report created: {inspection_obj.id}")
@@ -666,13 +783,17 @@ async def create_inspection_report(
         }
 
 @api_router.get("/inspections/owner/{owner_email}")
-async def get_owner_inspections(owner_email: str):
+async def get_owner_inspections(owner_email: str, request: Request, limit: int = 100, cursor: Optional[str] = None):
     try:
-        inspections = await db.inspection_reports.find({"ownerEmail": owner_email}).sort("inspectionDate", -1).to_list(100)
-        return {
-            "success": True,
-            "data": [InspectionReport(**inspection).dict() for inspection in inspections]
-        }
+        query = {"ownerEmail": owner_email}
+        etag = make_etag("owner_inspections", owner_email, limit, cursor, await collection_version(db.inspection_reports, query, ["createdAt"]))
+        if matches_if_none_match(request, etag):
+            return not_modified(etag)
+
+        return await stream_json_list(
+            db.inspection_reports, query, InspectionReport, "inspectionDate",
+            limit=limit, cursor=cursor, headers=etag_headers(etag)
+        )
     except Exception as e:
         logger.error(f"Error retrieving owner inspections: {str(e)}")
         return {
@@ -724,7 +845,7 @@ async def upload_photos(
                 )
                 
                 # Insert into database
-                await db.property_photos.insert_one(photo_obj.dict())
+                await db.property_photos.insert_one(document_for(photo_obj))
                 uploaded_photos.append(photo_obj.dict())
         
         logger.info(f"Uploaded {len(uploaded_photos)} photos for {ownerEmail}")
@@ -743,13 +864,17 @@ async def upload_photos(
         }
 
 @api_router.get("/photos/owner/{owner_email}")
-async def get_owner_photos(owner_email: str):
+async def get_owner_photos(owner_email: str, request: Request, limit: int = 200, cursor: Optional[str] = None):
     try:
-        photos = await db.property_photos.find({"ownerEmail": owner_email}).sort("uploadedAt", -1).to_list(200)
-        return {
-            "success": True,
-            "data": [PhotoUpload(**photo).dict() for photo in photos]
-        }
+        query = {"ownerEmail": owner_email}
+        etag = make_etag("owner_photos", owner_email, limit, cursor, await collection_version(db.property_photos, query, ["uploadedAt"]))
+        if matches_if_none_match(request, etag):
+            return not_modified(etag)
+
+        return await stream_json_list(
+            db.property_photos, query, PhotoUpload, "uploadedAt",
+            limit=limit, cursor=cursor, headers=etag_headers(etag)
+        )
     except Exception as e:
         logger.error(f"Error retrieving owner photos: {str(e)}")
         return {
@@ -770,17 +895,39 @@ async def get_photo_file(filename: str):
         logger.error(f"Error retrieving photo: {str(e)}")
         return {"error": "Unable to retrieve photo"}
 
+CONFIRMATION_NUMBER_ATTEMPTS = 5
+
+async def insert_guest_request(request_obj: GuestRequest):
+    """Insert a new request, drawing a fresh confirmation number whenever the
+    unique index reports it is already taken."""
+    for attempt in range(CONFIRMATION_NUMBER_ATTEMPTS):
+        try:
+            return await db.guest_requests.insert_one(document_for(request_obj))
+        except DuplicateKeyError as e:
+            if "confirmationNumber" not in str(e) or attempt == CONFIRMATION_NUMBER_ATTEMPTS - 1:
+                raise
+            logger.warning(f"Confirmation number {request_obj.confirmationNumber} already issued; drawing another")
+            request_obj.confirmationNumber = new_confirmation_number()
+
 @api_router.post("/guest-requests", response_model=dict)
 async def submit_guest_request(request: GuestRequestCreate):
     try:
         # Create guest request object
         request_obj = GuestRequest(**request.dict())
+        # Every write path stamps lastUpdatedAt so delta sync sees new requests too
+        request_obj.lastUpdatedAt = request_obj.createdAt
+        request_obj.confirmationNumber = new_confirmation_number()
+        request_obj.checkInAt = parse_stay_date(request_obj.checkInDate)
+        request_obj.checkOutAt = parse_stay_date(request_obj.checkOutDate)
+        request_obj.propertyId = await property_addresses.resolve(request_obj.propertyAddress)
+        request_obj.slaDueAt = sla_due_at(request_obj.createdAt, request_obj.priority)
         
         # Insert into database
-        result = await db.guest_requests.insert_one(request_obj.dict())
+        result = await insert_guest_request(request_obj)
         
         if result.inserted_id:
-            confirmation_number = request_obj.id[:8].upper()
+            sla_watcher.notify(request_obj.slaDueAt)
+            confirmation_number = request_obj.confirmationNumber
             logger.info(f"Guest request submitted: {request_obj.guestEmail} - {request_obj.requestType}")
             
             # Send email notification
@@ -842,13 +989,12 @@ async def submit_guest_request(request: GuestRequestCreate):
         }
 
 @api_router.get("/guest-requests")
-async def get_all_guest_requests():
+async def get_all_guest_requests(limit: int = 1000, cursor: Optional[str] = None):
     try:
-        requests = await db.guest_requests.find().sort("createdAt", -1).to_list(1000)
-        return {
-            "success": True,
-            "data": [GuestRequest(**request).dict() for request in requests]
-        }
+        return await stream_json_list(
+            db.guest_requests, {}, GuestRequest, "createdAt",
+            limit=limit, cursor=cursor
+        )
     except Exception as e:
         logger.error(f"Error retrieving guest requests: {str(e)}")
         return {
@@ -858,16 +1004,25 @@ async def get_all_guest_requests():
         }
 
 @api_router.get("/guest-requests/{confirmation_number}")
+@single_flight("guest_request_status", key=lambda confirmation_number: confirmation_number.upper())
 async def get_guest_request_status(confirmation_number: str):
     try:
-        # Find request by confirmation number (first 8 chars of ID)
-        requests = await db.guest_requests.find().to_list(1000)
-        for request in requests:
-            if request['id'][:8].upper() == confirmation_number.upper():
+        async def load_guest_request():
+            request = await db.guest_requests.find_one({"confirmationNumber": confirmation_number.upper()})
+            if request is None:
+                legacy = await legacy_keys.confirmation_filter(confirmation_number)
+                if legacy is not None:
+                    request = await db.guest_requests.find_one(legacy)
+            if request:
                 return {
                     "success": True,
-                    "data": GuestRequest(**request).dict()
+                    "data": to_row(GuestRequest, request)
                 }
+            return None
+
+        response = await guest_request_cache.get_or_load(confirmation_number.upper(), "", load_guest_request)
+        if response:
+            return json_response(response)
         
         return {
             "success": False,
@@ -973,8 +1128,54 @@ async def admin_login(credentials: AdminAuth):
             "message": str(e)
         }
 
+async def invalidate_guest_request_cache(request: dict):
+    """Drop the cached status lookup for a guest request, on every worker."""
+    try:
+        await guest_request_cache.invalidate(request.get("confirmationNumber") or request["id"][:8].upper())
+    except Exception as e:
+        logger.error(f"Error invalidating guest request cache: {str(e)}")
+
+def build_guest_request_filter(
+    search: Optional[str] = None,
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    request_type: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None
+) -> dict:
+    """Build the admin guest request filter shared by listing and export."""
+    filter_query = {}
+    
+    if search:
+        filter_query["$or"] = [
+            {"guestName": {"$regex": search, "$options": "i"}},
+            {"guestEmail": {"$regex": search, "$options": "i"}},
+            {"propertyAddress": {"$regex": search, "$options": "i"}},
+            {"message": {"$regex": search, "$options": "i"}}
+        ]
+    
+    if status:
+        filter_query["status"] = status
+        
+    if priority:
+        filter_query["priority"] = priority
+        
+    if request_type:
+        filter_query["requestType"] = request_type
+        
+    if date_from or date_to:
+        date_filter = {}
+        if date_from:
+            date_filter["$gte"] = datetime.fromisoformat(date_from.replace('Z', '+00:00'))
+        if date_to:
+            date_filter["$lte"] = datetime.fromisoformat(date_to.replace('Z', '+00:00'))
+        filter_query["createdAt"] = date_filter
+    
+    return filter_query
+
 @api_router.get("/admin/guest-requests")
 async def get_admin_guest_requests(
+    request: Request,
     page: int = 1,
     limit: int = 50,
     search: Optional[str] = None,
@@ -982,49 +1183,36 @@ async def get_admin_guest_requests(
     priority: Optional[str] = None,
     request_type: Optional[str] = None,
     date_from: Optional[str] = None,
-    date_to: Optional[str] = None
+    date_to: Optional[str] = None,
+    fields: Optional[str] = None,
+    view: Optional[str] = None
 ):
-    """Get guest requests for admin dashboard with filtering and pagination."""
+    """Get guest requests for admin dashboard with filtering and pagination.
+
+    ``view=summary`` or ``fields=a,b,c`` limits each row to those columns;
+    the projection is applied in the query itself.
+    """
     try:
-        # Build filter query
-        filter_query = {}
-        
-        if search:
-            filter_query["$or"] = [
-                {"guestName": {"$regex": search, "$options": "i"}},
-                {"guestEmail": {"$regex": search, "$options": "i"}},
-                {"propertyAddress": {"$regex": search, "$options": "i"}},
-                {"message": {"$regex": search, "$options": "i"}}
-            ]
-        
-        if status:
-            filter_query["status"] = status
-            
-        if priority:
-            filter_query["priority"] = priority
-            
-        if request_type:
-            filter_query["requestType"] = request_type
-            
-        if date_from or date_to:
-            date_filter = {}
-            if date_from:
-                date_filter["$gte"] = datetime.fromisoformat(date_from.replace('Z', '+00:00'))
-            if date_to:
-                date_filter["$lte"] = datetime.fromisoformat(date_to.replace('Z', '+00:00'))
-            filter_query["createdAt"] = date_filter
+        selected_fields = select_fields(GuestRequest, fields, view, GUEST_REQUEST_SUMMARY_FIELDS)
+        filter_query = build_guest_request_filter(search, status, priority, request_type, date_from, date_to)
         
         # Get total count
         total_count = await db.guest_requests.count_documents(filter_query)
         
+        # Unchanged since the client's copy: skip the page query and serialization
+        version = await collection_version(db.guest_requests, filter_query, ["lastUpdatedAt", "createdAt"], count=total_count)
+        etag = make_etag("admin_guest_requests", str(request.query_params), version)
+        if matches_if_none_match(request, etag):
+            return not_modified(etag)
+        
         # Get paginated results
         skip = (page - 1) * limit
-        requests = await db.guest_requests.find(filter_query).sort("createdAt", -1).skip(skip).limit(limit).to_list(limit)
+        requests = await db.guest_requests.find(filter_query, projection_for(selected_fields)).sort("createdAt", -1).skip(skip).limit(limit).to_list(limit)
         
-        return {
+        return json_response({
             "success": True,
             "data": {
-                "requests": [GuestRequest(**request).dict() for request in requests],
+                "requests": to_rows(GuestRequest, requests, selected_fields),
                 "pagination": {
                     "current_page": page,
                     "total_pages": (total_count + limit - 1) // limit,
@@ -1032,7 +1220,7 @@ async def get_admin_guest_requests(
                     "per_page": limit
                 }
             }
-        }
+        }, headers=etag_headers(etag))
     except Exception as e:
         logger.error(f"Error getting admin guest requests: {str(e)}")
         return {
@@ -1041,12 +1229,83 @@ async def get_admin_guest_requests(
             "message": str(e)
         }
 
+@api_router.get("/admin/guest-requests/changes")
+async def get_guest_request_changes(since: Optional[str] = None, limit: int = 500, fields: Optional[str] = None, view: Optional[str] = None):
+    """Get guest requests created, updated or deleted since a sync token.
+
+    Call without ``since`` for a full sync, then pass back ``next_token``.
+    ``deleted`` lists ids removed since the token; ``reset`` means the token
+    was too old and the client should discard its copy.
+    """
+    try:
+        selected_fields = select_fields(GuestRequest, fields, view, GUEST_REQUEST_SUMMARY_FIELDS)
+        data = await changes_since(
+            db.guest_requests, db.guest_request_tombstones, GuestRequest, since,
+            limit=max(1, min(limit, 1000)), fields=selected_fields
+        )
+        return json_response({
+            "success": True,
+            "data": data
+        })
+    except Exception as e:
+        logger.error(f"Error getting guest request changes: {str(e)}")
+        return {
+            "success": False,
+            "error": "Unable to retrieve changes",
+            "message": str(e)
+        }
+
+@api_router.delete("/admin/guest-requests/{request_id}")
+async def delete_guest_request(request_id: str, adminUsername: Optional[str] = None):
+    """Delete a guest request, leaving a tombstone for delta sync clients."""
+    try:
+        deleted_request = await db.guest_requests.find_one_and_delete(
+            await legacy_keys.filter(request_id),
+            projection={"id": 1, "confirmationNumber": 1, "createdAt": 1}
+        )
+        if not deleted_request:
+            return {
+                "success": False,
+                "error": "Request not found"
+            }
+        
+        await db.guest_request_tombstones.insert_one({
+            "_id": request_id,
+            "id": request_id,
+            "deletedAt": datetime.utcnow(),
+            "deletedBy": adminUsername,
+            # Lets the response time rollups rebuild the request's day
+            "createdAt": deleted_request.get("createdAt")
+        })
+        await invalidate_guest_request_cache(deleted_request)
+        return {
+            "success": True,
+            "message": "Request deleted successfully"
+        }
+    except Exception as e:
+        logger.error(f"Error deleting guest request: {str(e)}")
+        return {
+            "success": False,
+            "error": "Unable to delete request",
+            "message": str(e)
+        }
+
+def sla_fields_for_priority(existing_request: dict, priority: str) -> dict:
+    """Recompute the response deadline after a priority change. A request
+    whose new deadline is still ahead can breach (and escalate) again."""
+    due_at = sla_due_at(existing_request.get("createdAt") or datetime.utcnow(), priority)
+    fields = {"slaDueAt": due_at}
+    if due_at > datetime.utcnow():
+        fields["slaBreachedAt"] = None
+    return fields
+
 @api_router.put("/admin/guest-requests/{request_id}")
 async def update_guest_request(request_id: str, update_data: GuestRequestUpdate):
     """Update guest request status, priority, or add internal notes."""
     try:
         # Find the request
-        existing_request = await db.guest_requests.find_one({"id": request_id})
+        key = await legacy_keys.filter(request_id)
+        existing_request = await db.guest_requests.find_one(key)
         if not existing_request:
             return {
                 "success": False,
@@ -1066,6 +1325,7 @@ async def update_guest_request(request_id: str, update_data: GuestRequestUpdate)
         
         if update_data.priority:
             update_fields["priority"] = update_data.priority
+            update_fields.update(sla_fields_for_priority(existing_request, update_data.priority))
         
         # Handle internal notes
         if update_data.internalNote:
@@ -1076,13 +1336,15 @@ async def update_guest_request(request_id: str, update_data: GuestRequestUpdate)
         
         # Update the request
         result = await db.guest_requests.update_one(
-            {"id": request_id},
-            {"$set": update_fields}
+            key,
+            response_time_update(update_fields, update_data.status, False, update_fields["lastUpdatedAt"])
         )
         
         if result.modified_count > 0:
+            await invalidate_guest_request_cache(existing_request)
+            sla_watcher.notify(update_fields.get("slaDueAt"))
             # Get updated request
-            updated_request = await db.guest_requests.find_one({"id": request_id})
+            updated_request = await db.guest_requests.find_one(key)
             return {
                 "success": True,
                 "data": GuestRequest(**updated_request).dict(),
@@ -1106,7 +1368,8 @@ async def reply_to_guest_request(request_id: str, reply_data: AdminReply):
     """Send email reply to guest for specific request."""
     try:
         # Find the request
-        existing_request = await db.guest_requests.find_one({"id": request_id})
+        key = await legacy_keys.filter(request_id)
+        existing_request = await db.guest_requests.find_one(key)
         if not existing_request:
             return {
                 "success": False,
@@ -1121,7 +1384,7 @@ async def reply_to_guest_request(request_id: str, reply_data: AdminReply):
             guest_name=request_obj.guestName,
             subject=reply_data.subject,
             message=reply_data.message,
-            confirmation_number=request_obj.id[:8].upper(),
+            confirmation_number=request_obj.confirmationNumber or request_obj.id[:8].upper(),
             admin_username=reply_data.adminUsername
         )
         
@@ -1132,15 +1395,17 @@ async def reply_to_guest_request(request_id: str, reply_data: AdminReply):
             current_notes.append(reply_note)
             
             # Update request with reply info
+            now = datetime.utcnow()
             await db.guest_requests.update_one(
-                {"id": request_id},
-                {"$set": {
+                key,
+                response_time_update({
                     "internalNotes": current_notes,
                     "lastUpdatedBy": reply_data.adminUsername,
-                    "lastUpdatedAt": datetime.utcnow(),
-                    "respondedAt": datetime.utcnow()
-                }}
+                    "lastUpdatedAt": now,
+                    "respondedAt": now
+                }, None, True, now)
             )
+            await invalidate_guest_request_cache(existing_request)
             
             return {
                 "success": True,
@@ -1161,78 +1426,537 @@ async def reply_to_guest_request(request_id: str, reply_data: AdminReply):
 
 # Booking Management Endpoints
 
+def booking_from_webhook(booking_data: dict) -> Booking:
+    """Map a channel-manager booking payload onto a Booking."""
+    booking = Booking(
+        platformBookingId=booking_data.get("booking_id"),
+        platform=booking_data.get("platform", "unknown"),
+        propertyId=booking_data.get("property_id"),
+        propertyAddress=booking_data.get("property_address"),
+        guestName=booking_data.get("guest_name"),
+        guestEmail=booking_data.get("guest_email"),
+        guestPhone=booking_data.get("guest_phone"),
+        guestCount=booking_data.get("guest_count", 1),
+        checkInDate=booking_data.get("check_in_date"),
+        checkOutDate=booking_data.get("check_out_date"),
+        checkInAt=parse_stay_date(booking_data.get("check_in_date")),
+        checkOutAt=parse_stay_date(booking_data.get("check_out_date")),
+        specialRequests=booking_data.get("special_requests"),
+        lastEventAt=platform_event_time(booking_data)
+    )
+    booking.updatedAt = booking.createdAt
+    return booking
+
+# Webhook payload keys that a booking-updated event may carry, by Booking field
+BOOKING_WEBHOOK_FIELDS = {
+    "property_id": "propertyId",
+    "property_address": "propertyAddress",
+    "guest_name": "guestName",
+    "guest_email": "guestEmail",
+    "guest_phone": "guestPhone",
+    "guest_count": "guestCount",
+    "check_in_date": "checkInDate",
+    "check_out_date": "checkOutDate",
+    "booking_amount": "bookingAmount",
+    "special_requests": "specialRequests",
+    "booking_status": "bookingStatus"
+}
+
+def booking_changes_from_webhook(booking_data: dict) -> dict:
+    """The Booking fields present in an update payload (not yet validated)."""
+    return {field: booking_data[key] for key, field in BOOKING_WEBHOOK_FIELDS.items() if key in booking_data}
+
+def validated_booking_changes(current: dict, changes: dict) -> dict:
+    """Validate ``changes`` by running the booking they produce through the
+    Booking model, as create does, and re-derive the parsed stay dates."""
+    merged = Booking(**{**current, **changes})
+    validated = merged.dict()
+    changes = {field: validated[field] for field in changes}
+    if "checkInDate" in changes or "checkOutDate" in changes:
+        changes["checkInAt"] = parse_stay_date(merged.checkInDate)
+        changes["checkOutAt"] = parse_stay_date(merged.checkOutDate)
+    return changes
+
+def platform_event_time(booking_data: dict) -> Optional[datetime]:
+    """When the platform says the event happened, if it says."""
+    return parse_stay_date(booking_data.get("event_timestamp") or booking_data.get("updated_at"))
+
+def booking_key_from_webhook(booking_data: dict) -> dict:
+    if not booking_data.get("booking_id"):
+        raise ValueError("booking_id is required")
+    return {"platform": booking_data.get("platform", "unknown"), "platformBookingId": booking_data["booking_id"]}
+
+def is_current_stay(booking: Optional[dict], now: datetime) -> bool:
+    """Same rule as the analytics current_guests count."""
+    if not booking or booking.get("bookingStatus") != "confirmed":
+        return False
+    check_in, check_out = booking.get("checkInAt"), booking.get("checkOutAt")
+    return bool(check_in and check_out and check_in <= now <= check_out)
+
+async def record_booking_change(before: Optional[dict], after: Optional[dict]):
+    """Adjust cached booking counters and the occupancy index for one booking
+    write instead of recounting."""
+    await record_booking_changes([(before, after)])
+
+async def record_booking_changes(changes: list):
+    """Bulk form of record_booking_change for (before, after) pairs: one
+    invalidation per property touched and one counter adjustment."""
+    try:
+        touched = set()
+        for before, after in changes:
+            touched.update(occupancy.apply(before, after))
+        for key in sorted(touched):
+            await cache_registry.publish_invalidation("occupancy", key)
+    except Exception as e:
+        logger.error(f"Error updating occupancy index: {str(e)}")
+
+    now = datetime.utcnow()
+    total_delta = sum((after is not None) - (before is not None) for before, after in changes)
+    current_delta = sum(is_current_stay(after, now) - is_current_stay(before, now) for before, after in changes)
+    if not total_delta and not current_delta:
+        return
+
+    def adjust(payload):
+        overview = dict(payload["overview"])
+        overview["total_bookings"] += total_delta
+        overview["current_guests"] += current_delta
+        return {**payload, "overview": overview}
+    analytics_cache.update(adjust)
+
+SERVICE_LABELS = {
+    "grocery_stocking": "🛒 Pre-arrival grocery stocking",
+    "housekeeping": "🧹 Housekeeping before check-in",
+    "mid_stay_check": "👋 Mid-stay check-in",
+    "post_checkout_inspection": "🔍 Post-checkout inspection",
+}
+
+async def run_stay_service(job: dict) -> dict:
+    """Scheduled job handler: hand a stay service to the team on Telegram."""
+    stay = job.get("booking", {})
+    text = f"""{SERVICE_LABELS.get(job['service'], job['service'])}
+
+Property: {stay.get('propertyAddress')}
+Guest: {stay.get('guestName')} ({stay.get('guestCount')} guests)
+Stay: {stay.get('checkInAt')} → {stay.get('checkOutAt')}"""
+    if stay.get("specialRequests"):
+        text += f"\nSpecial requests: {stay['specialRequests']}"
+    if not await telegram_service.send_text(text):
+        # Fail the job so the scheduler retries it with backoff
+        raise RuntimeError("Telegram notification was not sent")
+    return {"notified": True}
+
+for service_name, _, _ in STAY_SERVICES:
+    service_scheduler.register(service_name, run_stay_service)
+
+async def schedule_automated_services(booking: dict):
+    """(Re)schedule the stay services for a booking after it is written;
+    cancels the pending ones once it is no longer confirmed."""
+    try:
+        await service_scheduler.schedule_for_booking(booking)
+    except Exception as e:
+        logger.error(f"Error scheduling services for booking {booking.get('id')}: {str(e)}")
+
+def booking_partition_key(booking_data: dict) -> str:
+    """Inbox partition for a booking event: all events for one booking run in order.
+
+    Keyed on the booking rather than the property because update and
+    cancellation payloads do not always carry the property.
+    """
+    return f"{booking_data.get('platform', 'unknown')}:{booking_data.get('booking_id')}"
+
+async def process_booking_created(booking_data: dict, received_at: datetime) -> dict:
+    """Inbox handler: store a booking-created event (idempotent upsert), then
+    apply any updates that arrived before it."""
+    booking = booking_from_webhook(booking_data)
+    if not booking.propertyId:
+        booking.propertyId = await property_addresses.resolve(booking.propertyAddress)
+    document = document_for(booking)
+    booking_id, created = await upsert_booking(db.bookings, document)
+    if created:
+        await record_booking_change(None, document)
+        await schedule_automated_services(document)
+        logger.info(f"New booking created: {booking.platformBookingId}")
+    else:
+        # A retry of this event may have stored the booking but failed to
+        # schedule; scheduling is idempotent, so make sure the jobs exist
+        stored = await db.bookings.find_one({"_id": booking_id})
+        if stored:
+            await schedule_automated_services(stored)
+        logger.info(f"Duplicate booking webhook ignored: {booking.platform} {booking.platformBookingId}")
+    await replay_parked_booking_events(booking_key(document))
+    return {"booking_id": booking_id, "created": created}
+
+async def replay_parked_booking_events(key: dict) -> int:
+    """Apply, oldest first, the events parked for ``key`` before it existed."""
+    replayed = 0
+    while True:
+        entry = await take_parked_booking_event(db.parked_booking_events, key)
+        if entry is None:
+            return replayed
+        try:
+            await booking_inbox.handlers[entry["eventType"]](entry["payload"], entry["receivedAt"])
+            replayed += 1
+        except Exception as e:
+            logger.error(f"Error replaying parked {entry['eventType']} for {key['platform']} {key['platformBookingId']}: {str(e)}")
+
+async def apply_booking_webhook(event_type: str, booking_data: dict, received_at: datetime, changes: dict) -> dict:
+    key = booking_key_from_webhook(booking_data)
+    current = await db.bookings.find_one(key)
+    if current is None:
+        # The create has not been processed yet: keep the event for it
+        await park_booking_event(db.parked_booking_events, key, event_type, booking_data, received_at)
+        logger.info(f"Booking event parked until the booking exists: {key['platform']} {key['platformBookingId']}")
+        # Batch ingestion creates bookings outside the inbox; it may have
+        # landed (and replayed) between the lookup and the park
+        if await db.bookings.find_one(key, {"_id": 1}):
+            await replay_parked_booking_events(key)
+        return {"applied": False, "parked": True}
+    changes = validated_booking_changes(current, changes)
+    before, after, outcome = await apply_booking_event(db.bookings, key, changes, platform_event_time(booking_data), received_at)
+    if outcome == "applied":
+        await record_booking_change(before, after)
+        await schedule_automated_services(after)
+        return {"booking_id": before["id"], "applied": True}
+    if outcome == "stale":
+        logger.info(f"Stale booking event ignored: {key['platform']} {key['platformBookingId']}")
+        return {"applied": False, "reason": "newer event already applied"}
+    # Deleted since the lookup; let the inbox retry
+    raise RuntimeError(f"Booking {key['platform']} {key['platformBookingId']} disappeared while applying event")
+
+async def process_booking_updated(booking_data: dict, received_at: datetime) -> dict:
+    """Inbox handler: apply the fields present in a booking-updated event."""
+    changes = booking_changes_from_webhook(booking_data)
+    if "propertyAddress" in changes and not changes.get("propertyId"):
+        changes["propertyId"] = await property_addresses.resolve(changes["propertyAddress"])
+    return await apply_booking_webhook("booking-updated", booking_data, received_at, changes)
+
+async def process_booking_cancelled(booking_data: dict, received_at: datetime) -> dict:
+    """Inbox handler: mark a booking cancelled."""
+    return await apply_booking_webhook("booking-cancelled", booking_data, received_at, {
+        "bookingStatus": "cancelled",
+        "cancelledAt": platform_event_time(booking_data) or received_at
+    })
+
+booking_inbox.register("booking-created", process_booking_created)
+booking_inbox.register("booking-updated", process_booking_updated)
+booking_inbox.register("booking-cancelled", process_booking_cancelled)
+
+async def inbox_event_status(response: dict) -> dict:
+    """Add the inbox event's current status (and booking id once done) to a 202 response."""
+    event = await db.booking_inbox.find_one({"_id": response.get("event_id")}, {"status": 1, "result": 1})
+    if not event:
+        return response
+    response = {**response, "status": event["status"]}
+    if event.get("result"):
+        response["booking_id"] = event["result"].get("booking_id")
+    return response
+
+async def enqueue_booking_event(event_type: str, booking_data: dict, idempotency_key: Optional[str]):
+    """Shared fast path of the booking webhooks: dedupe, store in the inbox, 202."""
+    event_key = idempotency_key or booking_data.get("event_id")
+    if event_key:
+        previous_response = await webhook_idempotency.get(event_type, event_key)
+        if previous_response is not None:
+            return json_response(await inbox_event_status(previous_response), status_code=202)
+    
+    event_id = await booking_inbox.enqueue(event_type, booking_partition_key(booking_data), booking_data)
+    response = {
+        "success": True,
+        "event_id": event_id,
+        "status": "queued",
+        "message": "Booking event received"
+    }
+    if event_key:
+        await webhook_idempotency.put(event_type, event_key, response)
+    return json_response(response, status_code=202)
+
 @api_router.post("/webhooks/booking-created")
-async def handle_booking_webhook(booking_data: dict):
-    """Handle new booking webhooks from channel managers."""
-    try:
-        # Create booking record
-        booking = Booking(
-            platformBookingId=booking_data.get("booking_id"),
-            platform=booking_data.get("platform", "unknown"),
-            propertyAddress=booking_data.get("property_address"),
-            guestName=booking_data.get("guest_name"),
-            guestEmail=booking_data.get("guest_email"),
-            guestPhone=booking_data.get("guest_phone"),
-            guestCount=booking_data.get("guest_count", 1),
-            checkInDate=booking_data.get("check_in_date"),
-            checkOutDate=booking_data.get("check_out_date"),
-            specialRequests=booking_data.get("special_requests")
-        )
-        
-        # Save to database
-        result = await db.bookings.insert_one(booking.dict())
-        
-        if result.inserted_id:
-            # TODO: Trigger automated services based on booking
-            # await schedule_automated_services(booking)
-            
-            logger.info(f"New booking created: {booking.platformBookingId}")
+async def handle_booking_webhook(booking_data: dict, idempotency_key: Optional[str] = Header(None)):
+    """Handle new booking webhooks from channel managers.
+
+    Fast path only: the payload is validated, stored in the booking inbox
+    and acknowledged with 202; the inbox worker writes the booking. Retries
+    are safe: a repeated Idempotency-Key (or ``event_id``) gets the original
+    event back with its current status and booking id, and the worker
+    upserts on (platform, platformBookingId).
+    """
+    try:
+        # Reject malformed payloads now rather than dead-lettering them later
+        booking_from_webhook(booking_data)
+        return await enqueue_booking_event("booking-created", booking_data, idempotency_key)
+    except Exception as e:
+        logger.error(f"Error processing booking webhook: {str(e)}")
+        return {
+            "success": False,
+            "error": "Unable to process booking",
+            "message": str(e)
+        }
+
+@api_router.post("/webhooks/booking-updated")
+async def handle_booking_updated_webhook(booking_data: dict, idempotency_key: Optional[str] = Header(None)):
+    """Handle booking modifications (dates, guests, status) from channel managers.
+
+    Only the fields present in the payload are changed, and the result is
+    validated like a new booking. ``event_timestamp`` (or ``updated_at``)
+    orders events: one older than the last applied event for the booking is
+    ignored; events without a timestamp are ordered by arrival. An update
+    for a booking not created yet is held until its create is processed.
+    """
+    try:
+        booking_key_from_webhook(booking_data)
+        return await enqueue_booking_event("booking-updated", booking_data, idempotency_key)
+    except Exception as e:
+        logger.error(f"Error processing booking update webhook: {str(e)}")
+        return {
+            "success": False,
+            "error": "Unable to process booking update",
+            "message": str(e)
+        }
+
+@api_router.post("/webhooks/booking-cancelled")
+async def handle_booking_cancelled_webhook(booking_data: dict, idempotency_key: Optional[str] = Header(None)):
+    """Handle booking cancellations from channel managers."""
+    try:
+        booking_key_from_webhook(booking_data)
+        return await enqueue_booking_event("booking-cancelled", booking_data, idempotency_key)
+    except Exception as e:
+        logger.error(f"Error processing booking cancellation webhook: {str(e)}")
+        return {
+            "success": False,
+            "error": "Unable to process booking cancellation",
+            "message": str(e)
+        }
+
+@api_router.get("/admin/booking-inbox")
+async def get_booking_inbox(status: Optional[str] = None, limit: int = 50):
+    """List booking inbox events, newest first; ``status=dead`` shows the dead letters."""
+    try:
+        filter_query = {"status": status} if status else {}
+        limit = max(1, min(limit, 500))
+        events = await db.booking_inbox.find(filter_query, {"_id": 0}).sort("_id", -1).limit(limit).to_list(limit)
+        return json_response({
+            "success": True,
+            "data": {
+                "events": events,
+                "stats": await booking_inbox.stats()
+            }
+        })
+    except Exception as e:
+        logger.error(f"Error getting booking inbox: {str(e)}")
+        return {
+            "success": False,
+            "error": "Unable to retrieve booking inbox",
+            "message": str(e)
+        }
+
+@api_router.get("/admin/sla/breaches")
+async def get_sla_breaches(priority: Optional[str] = None, limit: int = 50):
+    """Recent SLA breaches, newest first, with the watcher's next deadline."""
+    try:
+        filter_query = {"priority": priority} if priority else {}
+        limit = max(1, min(limit, 500))
+        breaches = await db.sla_breaches.find(filter_query, {"_id": 0}).sort("detectedAt", -1).limit(limit).to_list(limit)
+        return json_response({
+            "success": True,
+            "data": {
+                "breaches": breaches,
+                "watcher": sla_watcher.stats()
+            }
+        })
+    except Exception as e:
+        logger.error(f"Error getting SLA breaches: {str(e)}")
+        return {
+            "success": False,
+            "error": "Unable to retrieve SLA breaches",
+            "message": str(e)
+        }
+
+@api_router.get("/admin/scheduled-jobs")
+async def get_scheduled_jobs(status: Optional[str] = None, booking_id: Optional[str] = None, limit: int = 50):
+    """List scheduled service jobs, soonest first."""
+    try:
+        filter_query = {}
+        if status:
+            filter_query["status"] = status
+        if booking_id:
+            filter_query["bookingId"] = booking_id
+        limit = max(1, min(limit, 500))
+        jobs = await db.scheduled_jobs.find(filter_query, {"_id": 0}).sort("dueAt", 1).limit(limit).to_list(limit)
+        return json_response({
+            "success": True,
+            "data": {
+                "jobs": jobs,
+                "stats": await service_scheduler.stats()
+            }
+        })
+    except Exception as e:
+        logger.error(f"Error getting scheduled jobs: {str(e)}")
+        return {
+            "success": False,
+            "error": "Unable to retrieve scheduled jobs",
+            "message": str(e)
+        }
+
+@api_router.post("/admin/booking-inbox/{event_id}/retry")
+async def retry_booking_inbox_event(event_id: str):
+    """Requeue a dead-lettered booking event."""
+    try:
+        if await booking_inbox.retry(event_id):
             return {
                 "success": True,
-                "booking_id": booking.id,
-                "message": "Booking processed successfully"
+                "message": "Event requeued"
             }
-        else:
-            raise Exception("Failed to save booking")
-            
+        return {
+            "success": False,
+            "error": "No dead-lettered event with this id"
+        }
     except Exception as e:
-        logger.error(f"Error processing booking webhook: {str(e)}")
+        logger.error(f"Error retrying booking inbox event: {str(e)}")
         return {
             "success": False,
-            "error": "Unable to process booking",
+            "error": "Unable to retry event",
+            "message": str(e)
+        }
+
+BOOKING_BATCH_CHUNK_SIZE = 1000
+BOOKING_BATCH_MAX_ITEMS = int(os.environ.get('BOOKING_BATCH_MAX_ITEMS', '50000'))
+
+@api_router.post("/webhooks/bookings/batch")
+async def handle_booking_batch(request: Request):
+    """Import many bookings at once, e.g. an owner's history at onboarding.
+
+    The body is a JSON array of booking payloads (the booking-created shape)
+    or NDJSON with ``Content-Type: application/x-ndjson``. Items are
+    validated up front and written as unordered bulk upserts on
+    (platform, platformBookingId), so re-sending a batch is safe. Each item
+    gets its own result, in input order.
+    """
+    try:
+        items = parse_batch_body(await request.body(), request.headers.get("content-type", ""))
+        if len(items) > BOOKING_BATCH_MAX_ITEMS:
+            return {
+                "success": False,
+                "error": f"Batch too large (max {BOOKING_BATCH_MAX_ITEMS} bookings)"
+            }
+        
+        results = [None] * len(items)
+        documents, positions = [], []
+        for index, item in enumerate(items):
+            try:
+                if isinstance(item, Exception):
+                    raise item
+                if not isinstance(item, dict):
+                    raise ValueError("Expected a JSON object")
+                booking = booking_from_webhook(item)
+                if not booking.propertyId:
+                    booking.propertyId = await property_addresses.resolve(booking.propertyAddress)
+                documents.append(document_for(booking))
+                positions.append(index)
+            except Exception as e:
+                results[index] = {"index": index, "status": "error", "error": str(e)}
+        
+        for start in range(0, len(documents), BOOKING_BATCH_CHUNK_SIZE):
+            chunk = documents[start:start + BOOKING_BATCH_CHUNK_SIZE]
+            written = await upsert_bookings(db.bookings, chunk)
+            created = []
+            for index, document, outcome in zip(positions[start:start + BOOKING_BATCH_CHUNK_SIZE], chunk, written):
+                if "error" in outcome:
+                    results[index] = {"index": index, "status": "error", "error": outcome["error"]}
+                else:
+                    if outcome["created"]:
+                        created.append(document)
+                    results[index] = {
+                        "index": index,
+                        "status": "created" if outcome["created"] else "duplicate",
+                        "booking_id": outcome["booking_id"]
+                    }
+            if created:
+                # Follow-up work once per chunk rather than once per booking
+                await record_booking_changes([(None, document) for document in created])
+                try:
+                    await service_scheduler.schedule_for_bookings(created)
+                except Exception as e:
+                    logger.error(f"Error scheduling services for booking batch: {str(e)}")
+                for key in await parked_booking_keys(db.parked_booking_events, [booking_key(document) for document in created]):
+                    await replay_parked_booking_events(key)
+        
+        counts = {"created": 0, "duplicate": 0, "error": 0}
+        for result in results:
+            counts[result["status"]] += 1
+        logger.info(f"Booking batch processed: {counts['created']} created, {counts['duplicate']} duplicates, {counts['error']} failed")
+        return json_response({
+            "success": True,
+            "data": {
+                "received": len(items),
+                "created": counts["created"],
+                "duplicates": counts["duplicate"],
+                "failed": counts["error"],
+                "results": results
+            }
+        })
+    except Exception as e:
+        logger.error(f"Error processing booking batch: {str(e)}")
+        return {
+            "success": False,
+            "error": "Unable to process booking batch",
             "message": str(e)
         }
 
+async def build_booking_filter(
+    property_address: Optional[str] = None,
+    platform: Optional[str] = None,
+    status: Optional[str] = None
+) -> dict:
+    """Build the admin booking filter shared by listing and export."""
+    filter_query = {}
+    
+    if property_address:
+        # A full address of a known property is an indexed equality match;
+        # anything else is treated as a search term
+        property_id = await property_addresses.resolve(property_address)
+        if property_id and property_id_stamper.settling(property_address):
+            # Bookings with this address may not be stamped with it yet
+            filter_query["$or"] = [
+                {"propertyId": property_id},
+                {"propertyId": None, "propertyAddress": {"$regex": address_pattern(property_address), "$options": "i"}}
+            ]
+        elif property_id:
+            filter_query["propertyId"] = property_id
+        else:
+            filter_query["propertyAddress"] = {"$regex": property_address, "$options": "i"}
+    if platform:
+        filter_query["platform"] = platform
+    if status:
+        filter_query["bookingStatus"] = status
+    
+    return filter_query
+
 @api_router.get("/admin/bookings")
 async def get_admin_bookings(
     page: int = 1,
     limit: int = 50,
     property_address: Optional[str] = None,
     platform: Optional[str] = None,
-    status: Optional[str] = None
+    status: Optional[str] = None,
+    fields: Optional[str] = None,
+    view: Optional[str] = None
 ):
-    """Get bookings for admin dashboard."""
+    """Get bookings for admin dashboard; supports ``view=summary`` / ``fields=``."""
     try:
-        filter_query = {}
-        
-        if property_address:
-            filter_query["propertyAddress"] = {"$regex": property_address, "$options": "i"}
-        if platform:
-            filter_query["platform"] = platform
-        if status:
-            filter_query["bookingStatus"] = status
+        selected_fields = select_fields(Booking, fields, view, BOOKING_SUMMARY_FIELDS)
+        filter_query = await build_booking_filter(property_address, platform, status)
             
         # Get total count
         total_count = await db.bookings.count_documents(filter_query)
         
         # Get paginated results
         skip = (page - 1) * limit
-        bookings = await db.bookings.find(filter_query).sort("checkInDate", -1).skip(skip).limit(limit).to_list(limit)
+        bookings = await db.bookings.find(filter_query, projection_for(selected_fields)).sort("checkInAt", -1).skip(skip).limit(limit).to_list(limit)
         
-        return {
+        return json_response({
             "success": True,
             "data": {
-                "bookings": [Booking(**booking).dict() for booking in bookings],
+                "bookings": to_rows(Booking, bookings, selected_fields),
                 "pagination": {
                     "current_page": page,
                     "total_pages": (total_count + limit - 1) // limit,
@@ -1240,7 +1964,7 @@ async def get_admin_bookings(
                     "per_page": limit
                 }
             }
-        }
+        })
     except Exception as e:
         logger.error(f"Error getting admin bookings: {str(e)}")
         return {
@@ -1250,6 +1974,7 @@ async def get_admin_bookings(
         }
 
 @api_router.get("/guest-portal/booking/{booking_code}")
+@single_flight("guest_portal_booking")
 async def get_booking_for_guest_portal(booking_code: str):
     """Get booking data for pre-filling guest portal."""
     try:
@@ -1257,15 +1982,15 @@ async def get_booking_for_guest_portal(booking_code: str):
         booking = await db.bookings.find_one({
             "$or": [
                 {"platformBookingId": booking_code},
-                {"id": booking_code}
+                await legacy_keys.filter(booking_code)
             ]
-        })
+        }, {"_id": 0})
         
         if booking:
-            return {
+            return json_response({
                 "success": True,
-                "booking": Booking(**booking).dict()
-            }
+                "booking": to_row(Booking, booking)
+            })
         else:
             return {
                 "success": False,
@@ -1289,7 +2014,8 @@ async def bulk_update_guest_requests(bulk_data: BulkUpdateRequest):
         for request_id in bulk_data.requestIds:
             try:
                 # Find the request
-                existing_request = await db.guest_requests.find_one({"id": request_id})
+                key = await legacy_keys.filter(request_id)
+                existing_request = await db.guest_requests.find_one(key)
                 if not existing_request:
                     failed_updates.append({"id": request_id, "error": "Request not found"})
                     continue
@@ -1307,6 +2033,7 @@ async def bulk_update_guest_requests(bulk_data: BulkUpdateRequest):
                 
                 if bulk_data.priority:
                     update_fields["priority"] = bulk_data.priority
+                    update_fields.update(sla_fields_for_priority(existing_request, bulk_data.priority))
                 
                 # Handle internal notes for bulk operations
                 if bulk_data.internalNote:
@@ -1317,11 +2044,13 @@ async def bulk_update_guest_requests(bulk_data: BulkUpdateRequest):
                 
                 # Update the request
                 result = await db.guest_requests.update_one(
-                    {"id": request_id},
-                    {"$set": update_fields}
+                    key,
+                    response_time_update(update_fields, bulk_data.status, False, update_fields["lastUpdatedAt"])
                 )
                 
                 if result.modified_count > 0:
+                    await invalidate_guest_request_cache(existing_request)
+                    sla_watcher.notify(update_fields.get("slaDueAt"))
                     updated_count += 1
                 else:
                     failed_updates.append({"id": request_id, "error": "No changes made"})
@@ -1347,59 +2076,139 @@ async def bulk_update_guest_requests(bulk_data: BulkUpdateRequest):
             "message": str(e)
         }
 
-@api_router.get("/admin/analytics")
-async def get_admin_analytics():
-    """Get analytics data for admin dashboard."""
-    try:
-        # Get basic counts
-        total_requests = await db.guest_requests.count_documents({})
-        pending_requests = await db.guest_requests.count_documents({"status": "pending"})
-        completed_requests = await db.guest_requests.count_documents({"status": {"$in": ["completed", "resolved"]}})
-        urgent_requests = await db.guest_requests.count_documents({"priority": "urgent"})
-        
-        # Get booking analytics
-        total_bookings = await db.bookings.count_documents({})
-        current_guests = await db.bookings.count_documents({
-            "checkInDate": {"$lte": datetime.utcnow().isoformat()},
-            "checkOutDate": {"$gte": datetime.utcnow().isoformat()},
-            "bookingStatus": "confirmed"
-        })
-        
-        # Get request types breakdown
-        request_types_pipeline = [
-            {"$group": {"_id": "$requestType", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}}
-        ]
-        request_types = await db.guest_requests.aggregate(request_types_pipeline).to_list(100)
-        
-        # Get requests by status
-        status_pipeline = [
-            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}}
-        ]
-        status_breakdown = await db.guest_requests.aggregate(status_pipeline).to_list(100)
-        
-        # Get recent activity (last 7 days)
-        seven_days_ago = datetime.utcnow() - timedelta(days=7)
-        recent_requests = await db.guest_requests.count_documents({
-            "createdAt": {"$gte": seven_days_ago}
-        })
-        
+async def compute_admin_analytics():
+    """Run the analytics counts and aggregations behind the admin dashboard."""
+    # Get basic counts
+    total_requests = await db.guest_requests.count_documents({})
+    pending_requests = await db.guest_requests.count_documents({"status": "pending"})
+    completed_requests = await db.guest_requests.count_documents({"status": {"$in": ["completed", "resolved"]}})
+    urgent_requests = await db.guest_requests.count_documents({"priority": "urgent"})
+    
+    # Get booking analytics
+    total_bookings = await db.bookings.count_documents({})
+    now = datetime.utcnow()
+    current_guests = await db.bookings.count_documents({
+        "checkOutAt": {"$gte": now},
+        "checkInAt": {"$lte": now},
+        "bookingStatus": "confirmed"
+    })
+    
+    # Get request types breakdown
+    request_types_pipeline = [
+        {"$group": {"_id": "$requestType", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}}
+    ]
+    request_types = await db.guest_requests.aggregate(request_types_pipeline).to_list(100)
+    
+    # Get requests by status
+    status_pipeline = [
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}}
+    ]
+    status_breakdown = await db.guest_requests.aggregate(status_pipeline).to_list(100)
+    
+    # Get recent activity (last 7 days)
+    seven_days_ago = datetime.utcnow() - timedelta(days=7)
+    recent_requests = await db.guest_requests.count_documents({
+        "createdAt": {"$gte": seven_days_ago}
+    })
+    
+    return {
+        "overview": {
+            "total_requests": total_requests,
+            "pending_requests": pending_requests,
+            "completed_requests": completed_requests,
+            "urgent_requests": urgent_requests,
+            "recent_requests": recent_requests,
+            "total_bookings": total_bookings,
+            "current_guests": current_guests
+        },
+        "request_types": request_types,
+        "status_breakdown": status_breakdown,
+        "generated_at": datetime.utcnow()
+    }
+
+RESPONSE_TIME_RAW_MAX_DAYS = int(os.environ.get('RESPONSE_TIME_RAW_MAX_DAYS', '92'))
+
+@api_router.get("/admin/analytics/response-times")
+async def get_response_time_analytics(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    group_by: str = "property,requestType,priority",
+    property_id: Optional[str] = None,
+    request_type: Optional[str] = None,
+    priority: Optional[str] = None,
+    source: str = "auto"
+):
+    """p50/p90/p99 time to first response and to resolution, in seconds.
+
+    Covers requests created from ``date_from`` through ``date_to``
+    (inclusive days, default the last 30). Ranges longer than
+    RESPONSE_TIME_RAW_MAX_DAYS are answered from the daily rollups, with
+    percentiles rounded up to the rollup's histogram buckets (within 10%);
+    ``source=raw`` or ``source=rollup`` forces one or the other.
+    """
+    try:
+        fields = [GROUP_FIELDS[name.strip()] for name in group_by.split(",") if name.strip()]
+    except KeyError as e:
         return {
+            "success": False,
+            "error": f"Unknown group_by field: {e.args[0]}",
+            "message": f"Use any of: {', '.join(GROUP_FIELDS)}"
+        }
+    try:
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        end_day = parse_stay_date(date_to) if date_to else today
+        start = parse_stay_date(date_from) if date_from else (end_day - timedelta(days=29) if end_day else None)
+        if start is None or end_day is None or end_day < start:
+            return {
+                "success": False,
+                "error": "Invalid date range"
+            }
+        end = end_day.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        filters = {"propertyId": property_id, "requestType": request_type, "priority": priority}
+
+        state = await db.rollup_state.find_one({"_id": "response_times"})
+        use_rollups = source == "rollup" or (source == "auto" and (end - start).days > RESPONSE_TIME_RAW_MAX_DAYS)
+        if use_rollups and state is not None:
+            groups = await rollup_percentiles(
+                db.guest_requests, db.response_time_rollups, start, end, state["through"], fields, filters
+            )
+        else:
+            use_rollups = False
+            groups = await exact_percentiles(db.guest_requests, start, end, fields, filters)
+        groups.sort(key=lambda group: group["requests"], reverse=True)
+
+        return json_response({
             "success": True,
             "data": {
-                "overview": {
-                    "total_requests": total_requests,
-                    "pending_requests": pending_requests,
-                    "completed_requests": completed_requests,
-                    "urgent_requests": urgent_requests,
-                    "recent_requests": recent_requests,
-                    "total_bookings": total_bookings,
-                    "current_guests": current_guests
-                },
-                "request_types": request_types,
-                "status_breakdown": status_breakdown
+                "from": start,
+                "to": end,
+                "source": "rollup" if use_rollups else "raw",
+                "approximate": use_rollups,
+                "unit": "seconds",
+                "groups": groups
             }
+        })
+    except Exception as e:
+        logger.error(f"Error getting response time analytics: {str(e)}")
+        return {
+            "success": False,
+            "error": "Unable to retrieve response time analytics",
+            "message": str(e)
+        }
+
+@api_router.get("/admin/analytics")
+async def get_admin_analytics(fresh: bool = False):
+    """Get analytics data for admin dashboard.
+
+    Served from a short-lived cache refreshed in the background; pass
+    ``fresh=1`` to wait for a recomputation.
+    """
+    try:
+        return {
+            "success": True,
+            "data": await analytics_cache.get(compute_admin_analytics, fresh=fresh)
         }
     except Exception as e:
         logger.error(f"Error getting analytics: {str(e)}")
@@ -1411,6 +2220,170 @@ async def get_admin_analytics():
 
 # Property Management Endpoints
 
+async def invalidate_property_caches(owner_email: str, addresses: List[str]):
+    """After a property write, on every worker: drop cached owner portal
+    lookups and the address index, then stamp records whose address (one of
+    ``addresses``, old and new) now resolves differently."""
+    keys = sorted({normalize_address(address) for address in addresses} - {""})
+    try:
+        property_addresses.invalidate()
+        await owner_property_cache.invalidate(owner_email)
+        await cache_registry.publish_invalidation("property_address", "|".join(keys) or "*")
+    except Exception as e:
+        logger.error(f"Error invalidating property caches: {str(e)}")
+    property_id_stamper.request(keys)
+
+async def stamp_all_property_ids(addresses: Optional[Set[str]] = None):
+    """Stamp propertyId on unstamped bookings and requests; with
+    ``addresses`` (normalized), restamp every record with one of those."""
+    try:
+        for collection, updated_field in ((db.bookings, "updatedAt"), (db.guest_requests, "lastUpdatedAt")):
+            stamped = await stamp_property_ids(collection, property_addresses, updated_field=updated_field, addresses=addresses)
+            if stamped:
+                logger.info(f"Stamped propertyId on {stamped} {collection.name}")
+                if collection is db.bookings:
+                    # Stays moved from the unassigned group to their property
+                    occupancy.invalidate()
+                    await cache_registry.publish_invalidation("occupancy", "*")
+    except Exception as e:
+        logger.error(f"Error stamping property ids: {str(e)}")
+
+# Runs the stamping after property writes, one run at a time
+property_id_stamper = PropertyIdStamper(
+    stamp_all_property_ids,
+    grace=float(os.environ.get('PROPERTY_STAMP_GRACE_SECONDS', '300'))
+)
+
+@api_router.get("/admin/cache/stats")
+async def get_cache_stats():
+    """Get hit/miss metrics for the response caches."""
+    return {
+        "success": True,
+        "data": cache_registry.stats()
+    }
+
+@api_router.get("/admin/single-flight/stats")
+async def get_single_flight_stats():
+    """Get how many concurrent read calls were collapsed per route."""
+    return {
+        "success": True,
+        "data": single_flight_stats()
+    }
+
+@api_router.get("/admin/live")
+async def admin_live_feed(request: Request):
+    """Server-Sent Events stream of guest request and booking inserts/updates.
+
+    Events are named ``<collection>.<operation>`` and carry the document. A
+    ``resync`` event means events were dropped and the client should reload
+    (or catch up via /admin/guest-requests/changes).
+    """
+    return StreamingResponse(
+        live_feed.stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/admin/live/stats")
+async def get_live_feed_stats():
+    """Get the live feed's event source and subscriber counts."""
+    return {
+        "success": True,
+        "data": live_feed.stats()
+    }
+
+def occupancy_groups(stays_by_property: dict) -> list:
+    """Occupancy query results as a list of properties with their stays."""
+    return [
+        {
+            "propertyId": property_id or None,
+            "propertyAddress": stays[0]["propertyAddress"] if property_id else None,
+            "stays": stays
+        }
+        for property_id, stays in stays_by_property.items()
+    ]
+
+@api_router.get("/admin/occupancy/now")
+async def get_occupancy_now(property_id: Optional[str] = None):
+    """Guests in-house right now, per property."""
+    try:
+        now = datetime.utcnow()
+        in_house = await occupancy.occupied_at(now, property_id)
+        return json_response({
+            "success": True,
+            "data": {
+                "at": now,
+                "properties": occupancy_groups(in_house),
+                "total_guests": sum(stay.get("guestCount") or 0 for stays in in_house.values() for stay in stays)
+            }
+        })
+    except Exception as e:
+        logger.error(f"Error getting current occupancy: {str(e)}")
+        return {
+            "success": False,
+            "error": "Unable to retrieve occupancy",
+            "message": str(e)
+        }
+
+@api_router.get("/admin/occupancy/today")
+async def get_occupancy_today(property_id: Optional[str] = None, date: Optional[str] = None):
+    """Arrivals and departures for one (UTC) day, today by default."""
+    try:
+        day = parse_stay_date(date) if date else datetime.utcnow()
+        if day is None:
+            return {
+                "success": False,
+                "error": "Invalid date"
+            }
+        start = day.replace(hour=0, minute=0, second=0, microsecond=0)
+        end = start + timedelta(days=1)
+        return json_response({
+            "success": True,
+            "data": {
+                "date": start.date().isoformat(),
+                "arrivals": occupancy_groups(await occupancy.arriving(start, end, property_id)),
+                "departures": occupancy_groups(await occupancy.departing(start, end, property_id))
+            }
+        })
+    except Exception as e:
+        logger.error(f"Error getting arrivals and departures: {str(e)}")
+        return {
+            "success": False,
+            "error": "Unable to retrieve arrivals and departures",
+            "message": str(e)
+        }
+
+@api_router.get("/admin/occupancy/{property_id}/free-windows")
+async def get_free_windows(property_id: str, start: Optional[str] = None, end: Optional[str] = None, min_nights: int = 1):
+    """Unbooked stretches of a property between ``start`` (default today) and
+    ``end`` (default 90 days later) of at least ``min_nights``."""
+    try:
+        range_start = parse_stay_date(start) if start else datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        range_end = parse_stay_date(end) if end else (range_start + timedelta(days=90) if range_start else None)
+        if range_start is None or range_end is None or range_end <= range_start:
+            return {
+                "success": False,
+                "error": "Invalid date range"
+            }
+        windows = await occupancy.free_windows(property_id, range_start, range_end, timedelta(days=max(min_nights, 0)))
+        return json_response({
+            "success": True,
+            "data": {
+                "propertyId": property_id,
+                "windows": [
+                    {"start": window_start, "end": window_end, "nights": (window_end - window_start).days}
+                    for window_start, window_end in windows
+                ]
+            }
+        })
+    except Exception as e:
+        logger.error(f"Error getting free windows: {str(e)}")
+        return {
+            "success": False,
+            "error": "Unable to retrieve free windows",
+            "message": str(e)
+        }
+
 @api_router.post("/admin/properties", response_model=dict)
 async def create_property(property_data: PropertyCreate):
     """Create a new property record for an owner."""
@@ -1432,9 +2405,10 @@ async def create_property(property_data: PropertyCreate):
         property_obj = PropertyModel(**property_data.dict())
         
         # Insert into database
-        result = await db.properties.insert_one(property_obj.dict())
+        result = await db.properties.insert_one(document_for(property_obj))
         
         if result.inserted_id:
+            await invalidate_property_caches(property_obj.ownerEmail, [property_obj.propertyAddress])
             logger.info(f"Property created for owner: {property_obj.ownerEmail} - {property_obj.propertyAddress}")
             return {
                 "success": True,
@@ -1457,10 +2431,14 @@ async def get_all_properties(
     page: int = 1,
     limit: int = 50,
     search: Optional[str] = None,
-    owner_email: Optional[str] = None
+    owner_email: Optional[str] = None,
+    fields: Optional[str] = None,
+    view: Optional[str] = None
 ):
-    """Get all properties for admin management."""
+    """Get all properties for admin management; supports ``view=summary`` / ``fields=``."""
     try:
+        selected_fields = select_fields(PropertyModel, fields, view, PROPERTY_SUMMARY_FIELDS)
+
         # Build filter query
         filter_query = {"isActive": True}
         
@@ -1479,12 +2457,12 @@ async def get_all_properties(
         
         # Get paginated results
         skip = (page - 1) * limit
-        properties = await db.properties.find(filter_query).sort("createdAt", -1).skip(skip).limit(limit).to_list(limit)
+        properties = await db.properties.find(filter_query, projection_for(selected_fields)).sort("createdAt", -1).skip(skip).limit(limit).to_list(limit)
         
-        return {
+        return json_response({
             "success": True,
             "data": {
-                "properties": [PropertyModel(**prop).dict() for prop in properties],
+                "properties": to_rows(PropertyModel, properties, selected_fields),
                 "pagination": {
                     "current_page": page,
                     "total_pages": (total_count + limit - 1) // limit,
@@ -1492,7 +2470,7 @@ async def get_all_properties(
                     "per_page": limit
                 }
             }
-        }
+        })
     except Exception as e:
         logger.error(f"Error getting properties: {str(e)}")
         return {
@@ -1502,21 +2480,25 @@ async def get_all_properties(
         }
 
 @api_router.get("/properties/owner/{owner_email}")
-async def get_owner_property(owner_email: str, property_address: Optional[str] = None):
+async def get_owner_property(owner_email: str, request: Request, property_address: Optional[str] = None):
     """Get property data for a specific owner."""
-    try:
+    async def load_owner_property():
         # Build query
         query = {"ownerEmail": owner_email, "isActive": True}
         if property_address:
-            query["propertyAddress"] = {"$regex": property_address, "$options": "i"}
+            property_id = await property_addresses.resolve(property_address)
+            if property_id:
+                query["_id"] = property_id
+            else:
+                query["propertyAddress"] = {"$regex": property_address, "$options": "i"}
         
         # Find property
-        property_data = await db.properties.find_one(query)
+        property_data = await db.properties.find_one(query, {"_id": 0})
         
         if property_data:
             return {
                 "success": True,
-                "data": PropertyModel(**property_data).dict()
+                "data": to_row(PropertyModel, property_data)
             }
         else:
             # Return default fallback for owners without property setup
@@ -1533,6 +2515,14 @@ async def get_owner_property(owner_email: str, property_address: Optional[str] =
                 },
                 "message": "Property not yet configured. Please contact admin."
             }
+
+    try:
+        response = await owner_property_cache.get_or_load(owner_email, property_address or "", load_owner_property)
+        # The payload is cached, so hashing it is cheaper than asking Mongo for a version
+        etag = content_etag(response)
+        if matches_if_none_match(request, etag):
+            return not_modified(etag)
+        return json_response(response, headers=etag_headers(etag))
     except Exception as e:
         logger.error(f"Error getting owner property: {str(e)}")
         return {
@@ -1546,7 +2536,8 @@ async def update_property(property_id: str, update_data: PropertyUpdate):
     """Update property information."""
     try:
         # Find the property
-        existing_property = await db.properties.find_one({"id": property_id})
+        key = await legacy_keys.filter(property_id)
+        existing_property = await db.properties.find_one(key)
         if not existing_property:
             return {
                 "success": False,
@@ -1559,13 +2550,17 @@ async def update_property(property_id: str, update_data: PropertyUpdate):
         
         # Update the property
         result = await db.properties.update_one(
-            {"id": property_id},
+            key,
             {"$set": update_fields}
         )
         
         if result.modified_count > 0:
+            await invalidate_property_caches(
+                existing_property["ownerEmail"],
+                [existing_property.get("propertyAddress"), update_fields.get("propertyAddress")]
+            )
             # Get updated property
-            updated_property = await db.properties.find_one({"id": property_id})
+            updated_property = await db.properties.find_one(key)
             return {
                 "success": True,
                 "data": PropertyModel(**updated_property).dict(),
@@ -1589,12 +2584,16 @@ async def delete_property(property_id: str):
     """Soft delete a property (set isActive to False)."""
     try:
         # Update property to inactive
-        result = await db.properties.update_one(
-            {"id": property_id},
-            {"$set": {"isActive": False, "updatedAt": datetime.utcnow()}}
+        key = await legacy_keys.filter(property_id)
+        deleted_property = await db.properties.find_one_and_update(
+            {**key, "isActive": True},
+            {"$set": {"isActive": False, "updatedAt": datetime.utcnow()}},
+            projection={"ownerEmail": 1, "propertyAddress": 1}
         )
         
-        if result.modified_count > 0:
+        if deleted_property:
+            # Another property sharing the address may now resolve alone
+            await invalidate_property_caches(deleted_property["ownerEmail"], [deleted_property.get("propertyAddress")])
             return {
                 "success": True,
                 "message": "Property deleted successfully"
@@ -1612,6 +2611,186 @@ async def delete_property(property_id: str):
             "message": str(e)
         }
 
+# Export Endpoints
+
+@api_router.get("/admin/export/guest-requests")
+async def export_guest_requests(
+    format: str = "ndjson",
+    search: Optional[str] = None,
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    request_type: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None
+):
+    """Stream all guest requests matching the admin filters as NDJSON or CSV."""
+    try:
+        filter_query = build_guest_request_filter(search, status, priority, request_type, date_from, date_to)
+        return stream_export(db.guest_requests, filter_query, GuestRequest, format, "guest-requests", sort=[("createdAt", -1)])
+    except Exception as e:
+        logger.error(f"Error exporting guest requests: {str(e)}")
+        return {
+            "success": False,
+            "error": "Unable to export guest requests",
+            "message": str(e)
+        }
+
+@api_router.get("/admin/export/bookings")
+async def export_bookings(
+    format: str = "ndjson",
+    property_address: Optional[str] = None,
+    platform: Optional[str] = None,
+    status: Optional[str] = None
+):
+    """Stream all bookings matching the admin filters as NDJSON or CSV."""
+    try:
+        filter_query = await build_booking_filter(property_address, platform, status)
+        return stream_export(db.bookings, filter_query, Booking, format, "bookings", sort=[("checkInAt", -1)])
+    except Exception as e:
+        logger.error(f"Error exporting bookings: {str(e)}")
+        return {
+            "success": False,
+            "error": "Unable to export bookings",
+            "message": str(e)
+        }
+
+@api_router.get("/admin/export/messages")
+async def export_messages(
+    format: str = "ndjson",
+    owner_email: Optional[str] = None,
+    status: Optional[str] = None
+):
+    """Stream all owner messages as NDJSON or CSV."""
+    try:
+        filter_query = {}
+        if owner_email:
+            filter_query["ownerEmail"] = owner_email
+        if status:
+            filter_query["status"] = status
+        return stream_export(db.owner_messages, filter_query, OwnerMessage, format, "messages", sort=[("createdAt", -1)])
+    except Exception as e:
+        logger.error(f"Error exporting messages: {str(e)}")
+        return {
+            "success": False,
+            "error": "Unable to export messages",
+            "message": str(e)
+        }
+
+# Maintenance Endpoints
+
+@api_router.post("/admin/maintenance/upload-gc")
+async def run_upload_gc(dry_run: bool = True, report_limit: int = 100):
+    """Quarantine and purge upload files that no record references."""
+    try:
+        report = await upload_gc.run(dry_run=dry_run, report_limit=report_limit)
+        return {
+            "success": True,
+            "data": report
+        }
+    except Exception as e:
+        logger.error(f"Error running upload GC: {str(e)}")
+        return {
+            "success": False,
+            "error": "Unable to run upload GC",
+            "message": str(e)
+        }
+
+@api_router.get("/admin/jobs")
+async def get_jobs(job: Optional[str] = None, status: Optional[str] = None, limit: int = 50):
+    """Registered jobs with their schedules, and recent runs."""
+    try:
+        limit = max(1, min(limit, 500))
+        return json_response({
+            "success": True,
+            "data": {
+                "jobs": await job_runner.definitions(),
+                "runs": await job_runner.recent_runs(job, status, limit)
+            }
+        })
+    except Exception as e:
+        logger.error(f"Error getting jobs: {str(e)}")
+        return {
+            "success": False,
+            "error": "Unable to retrieve jobs",
+            "message": str(e)
+        }
+
+@api_router.post("/admin/jobs/{job_name}/run")
+async def enqueue_job(job_name: str, params: Optional[dict] = None):
+    """Queue a one-off run of a job; it starts as soon as a slot is free."""
+    if job_name not in job_runner.jobs:
+        return {
+            "success": False,
+            "error": "Unknown job"
+        }
+    try:
+        run_id = await job_runner.enqueue(job_name, params)
+        return {
+            "success": True,
+            "data": {"run_id": run_id},
+            "message": "Job queued"
+        }
+    except Exception as e:
+        logger.error(f"Error queueing job: {str(e)}")
+        return {
+            "success": False,
+            "error": "Unable to queue job",
+            "message": str(e)
+        }
+
+async def upload_gc_job(params: dict) -> dict:
+    dry_run = params.get("dry_run", os.environ.get('UPLOAD_GC_SCHEDULED_DRY_RUN', 'true').lower() == 'true')
+    return await upload_gc.run(dry_run=dry_run, report_limit=params.get("report_limit", 100))
+
+job_runner.register(
+    "upload_gc",
+    upload_gc_job,
+    cron=os.environ.get('UPLOAD_GC_SCHEDULE', '30 3 * * *'),
+    lease=300
+)
+
+async def response_time_rollup_job(params: dict) -> dict:
+    refresh_days = params.get("refresh_days", int(os.environ.get('RESPONSE_TIME_ROLLUP_REFRESH_DAYS', '30')))
+    return await refresh_rollups(
+        db.guest_requests, db.response_time_rollups, db.rollup_state, refresh_days, db.guest_request_tombstones
+    )
+
+job_runner.register(
+    "response_time_rollup",
+    response_time_rollup_job,
+    cron=os.environ.get('RESPONSE_TIME_ROLLUP_SCHEDULE', '20 0 * * *'),
+    lease=300
+)
+
+async def id_migration_job(params: dict) -> dict:
+    """Give old guest requests the confirmation number they were issued
+    (id[:8]), then re-key documents from before ids were stored as _id.
+
+    Numbering first means the legacy lookups (:class:`LegacyKeys`) are
+    needed for exactly as long as documents are left to re-key.
+    """
+    numbered, conflicts = 0, 0
+    async for request in db.guest_requests.find({"confirmationNumber": None}, {"id": 1}):
+        try:
+            await db.guest_requests.update_one(
+                {"_id": request["_id"], "confirmationNumber": None},
+                {"$set": {"confirmationNumber": request["id"][:8].upper(), "lastUpdatedAt": datetime.utcnow()}}
+            )
+            numbered += 1
+        except DuplicateKeyError:
+            # Two old requests share a prefix; neither lookup was reliable
+            conflicts += 1
+            logger.error(f"Confirmation number for request {request['_id']} collides with another request")
+    results = await migrate_primary_keys(db, batch_size=params.get("batch_size", 500))
+    if not await needs_migration(db):
+        legacy_keys.mark_done()
+        # Other workers re-check and stop matching the old ids
+        await cache_registry.publish_invalidation("legacy_keys", "*")
+        await drop_legacy_id_indexes(db)
+    return {"rekeyed": results, "confirmationNumbers": numbered, "confirmationConflicts": conflicts}
+
+job_runner.register("id_migration", id_migration_job, lease=300)
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -1623,6 +2802,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.environ.get('COMPRESSION_MIN_SIZE', '1024')),
+    gzip_level=int(os.environ.get('COMPRESSION_GZIP_LEVEL', '6')),
+    brotli_quality=int(os.environ.get('COMPRESSION_BROTLI_QUALITY', '4'))
+)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -1630,9 +2816,192 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def queue_id_migration():
+    """Queue the id migration when there is anything left for it to do; the
+    job runner runs it once, whichever worker gets here first. Lookups match
+    old ids meanwhile (``legacy_keys``), through an index on ``id``."""
+    try:
+        if not await needs_migration(db):
+            legacy_keys.mark_done()
+            return
+        await ensure_legacy_id_indexes(db)
+        active = await job_runner.runs.find_one({"job": "id_migration", "status": {"$in": ["queued", "running"]}})
+        if active is None:
+            await job_runner.enqueue("id_migration", trigger="startup")
+            logger.info("Queued id migration")
+    except Exception as e:
+        logger.error(f"Error queueing id migration: {str(e)}")
+
+@app.on_event("startup")
+async def ensure_indexes():
+    """Create the indexes the query paths rely on (no-op when present)."""
+    try:
+        await db.properties.create_index([("ownerEmail", 1), ("propertyAddress", 1)])
+        # Documents are keyed by _id = id, so keyset tie-breaks use _id
+        await db.guest_requests.create_index([("createdAt", -1), ("_id", -1)])
+        await db.owner_messages.create_index([("createdAt", -1), ("_id", -1)])
+        await db.owner_messages.create_index([("ownerEmail", 1), ("createdAt", -1)])
+        await db.contact_submissions.create_index([("createdAt", -1), ("_id", -1)])
+        await db.status_checks.create_index([("timestamp", 1), ("_id", 1)])
+        await db.property_photos.create_index([("ownerEmail", 1), ("uploadedAt", -1), ("_id", -1)])
+        await db.inspection_reports.create_index([("ownerEmail", 1), ("inspectionDate", -1), ("_id", -1)])
+        await db.inspection_reports.create_index([("ownerEmail", 1), ("createdAt", -1)])
+        await db.guest_requests.create_index([("lastUpdatedAt", 1), ("_id", 1)])
+        await db.guest_request_tombstones.create_index(
+            "deletedAt", expireAfterSeconds=TOMBSTONE_RETENTION_DAYS * 24 * 3600
+        )
+        await db.guest_request_tombstones.create_index([("deletedAt", 1), ("_id", 1)])
+        await db.bookings.create_index("platformBookingId")
+        await db.bookings.create_index([("propertyId", 1), ("checkInAt", 1), ("checkOutAt", 1)])
+        await db.bookings.create_index([("checkOutAt", 1), ("checkInAt", 1)])
+        await db.bookings.create_index([("checkInAt", -1)])
+        await db.bookings.create_index([("updatedAt", 1), ("_id", 1)])
+        await db.parked_booking_events.create_index([("platform", 1), ("platformBookingId", 1), ("receivedAt", 1)])
+        await db.parked_booking_events.create_index("expiresAt", expireAfterSeconds=0)
+        await db.guest_requests.create_index([("propertyId", 1), ("checkInAt", 1), ("checkOutAt", 1)])
+    except Exception as e:
+        logger.error(f"Error creating indexes: {str(e)}")
+
+@app.on_event("startup")
+async def ensure_unique_bookings():
+    """Archive duplicate bookings left by webhook retries, then enforce one
+    booking per (platform, platformBookingId)."""
+    try:
+        archived = await archive_duplicate_bookings(db.bookings, db.booking_duplicates)
+        if archived:
+            logger.info(f"Archived {archived} duplicate bookings to booking_duplicates")
+        await db.bookings.create_index([("platform", 1), ("platformBookingId", 1)], unique=True)
+        await webhook_idempotency.ensure_indexes()
+    except Exception as e:
+        logger.error(f"Error enforcing unique bookings: {str(e)}")
+
+@app.on_event("startup")
+async def ensure_unique_confirmation_numbers():
+    """One request per confirmation number, so a guest lookup can never
+    return someone else's request."""
+    try:
+        indexes = await db.guest_requests.index_information()
+        existing = indexes.get("confirmationNumber_1")
+        if existing is not None and not existing.get("unique"):
+            await db.guest_requests.drop_index("confirmationNumber_1")
+        await db.guest_requests.create_index(
+            "confirmationNumber",
+            unique=True,
+            partialFilterExpression={"confirmationNumber": {"$type": "string"}}
+        )
+    except Exception as e:
+        # Most likely old duplicates; keep the lookup indexed until they are fixed
+        logger.error(f"Error enforcing unique confirmation numbers: {str(e)}")
+        try:
+            await db.guest_requests.create_index("confirmationNumber")
+        except Exception as e:
+            logger.error(f"Error creating confirmation number index: {str(e)}")
+
+@app.on_event("startup")
+async def backfill_last_updated_at():
+    """Give requests written before delta sync a lastUpdatedAt, and bookings
+    written before the live feed polled on it an updatedAt (their createdAt)."""
+    try:
+        result = await db.guest_requests.update_many(
+            {"lastUpdatedAt": None},
+            [{"$set": {"lastUpdatedAt": "$createdAt"}}]
+        )
+        if result.modified_count:
+            logger.info(f"Backfilled lastUpdatedAt on {result.modified_count} guest requests")
+        result = await db.bookings.update_many(
+            {"updatedAt": None},
+            [{"$set": {"updatedAt": {"$ifNull": ["$lastEventAt", "$createdAt"]}}}]
+        )
+        if result.modified_count:
+            logger.info(f"Backfilled updatedAt on {result.modified_count} bookings")
+    except Exception as e:
+        logger.error(f"Error backfilling lastUpdatedAt: {str(e)}")
+
+@app.on_event("startup")
+async def backfill_stay_date_fields():
+    """Parse stay dates on bookings and requests stored before checkInAt/checkOutAt."""
+    try:
+        for collection in (db.bookings, db.guest_requests):
+            updated = await backfill_stay_dates(collection)
+            if updated:
+                logger.info(f"Backfilled stay dates on {updated} {collection.name}")
+    except Exception as e:
+        logger.error(f"Error backfilling stay dates: {str(e)}")
+
+@app.on_event("startup")
+async def start_cache():
+    await cache_registry.start()
+
+@app.on_event("startup")
+async def backfill_property_ids():
+    await stamp_all_property_ids()
+
+@app.on_event("startup")
+async def load_occupancy():
+    try:
+        await occupancy.load()
+        logger.info(f"Occupancy index loaded: {occupancy.stats()}")
+    except Exception as e:
+        logger.error(f"Error loading occupancy index: {str(e)}")
+
+@app.on_event("startup")
+async def start_booking_inbox():
+    try:
+        await booking_inbox.ensure_indexes()
+    except Exception as e:
+        logger.error(f"Error creating booking inbox indexes: {str(e)}")
+    booking_inbox.start()
+
+@app.on_event("startup")
+async def backfill_response_tracking():
+    try:
+        await db.response_time_rollups.create_index([("day", 1), ("propertyId", 1)])
+        updated = await backfill_response_times(db.guest_requests)
+        if updated:
+            logger.info(f"Backfilled first response times on {updated} guest requests")
+    except Exception as e:
+        logger.error(f"Error backfilling response times: {str(e)}")
+
+@app.on_event("startup")
+async def start_sla_watcher():
+    try:
+        await sla_watcher.ensure_indexes()
+        backfilled = await backfill_sla_due(db.guest_requests, on_change=invalidate_guest_request_cache)
+        if backfilled:
+            logger.info(f"Backfilled SLA deadlines on {backfilled} guest requests")
+    except Exception as e:
+        logger.error(f"Error preparing SLA watcher: {str(e)}")
+    sla_watcher.start()
+
+@app.on_event("startup")
+async def start_service_scheduler():
+    try:
+        await service_scheduler.ensure_indexes()
+    except Exception as e:
+        logger.error(f"Error creating scheduled job indexes: {str(e)}")
+    service_scheduler.start()
+
+@app.on_event("startup")
+async def start_job_runner():
+    try:
+        await job_runner.ensure_indexes()
+    except Exception as e:
+        logger.error(f"Error creating job indexes: {str(e)}")
+    # Set to false when jobs run in a dedicated `python cli.py jobs worker` process
+    if os.environ.get('JOB_RUNNER_IN_PROCESS', 'true').lower() == 'true':
+        job_runner.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await job_runner.stop()
+    await property_id_stamper.stop()
+    await live_feed.close()
+    await booking_inbox.stop()
+    await service_scheduler.stop()
+    await sla_watcher.stop()
     client.close()
+    await cache_registry.close()
 
 if __name__ == "__main__":
     import uvicorn
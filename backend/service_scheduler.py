@@ -0,0 +1,271 @@
+import os
+import uuid
+import heapq
+import random
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict], Awaitable[Any]]
+
+DUPLICATE_KEY = 11000
+
+# Services run for every confirmed stay: (service, anchor, offset from anchor).
+# "midpoint" is halfway between check-in and check-out.
+STAY_SERVICES: List[Tuple[str, str, timedelta]] = [
+    ("grocery_stocking", "checkInAt", -timedelta(days=1)),
+    ("housekeeping", "checkInAt", -timedelta(hours=6)),
+    ("mid_stay_check", "midpoint", timedelta(0)),
+    ("post_checkout_inspection", "checkOutAt", timedelta(hours=2)),
+]
+
+# Stay fields copied onto each job so handlers need not load the booking
+JOB_BOOKING_FIELDS = ("propertyId", "propertyAddress", "guestName", "guestEmail", "guestCount", "checkInAt", "checkOutAt", "specialRequests")
+
+
+def service_due_times(booking: Dict) -> Dict[str, datetime]:
+    check_in, check_out = booking.get("checkInAt"), booking.get("checkOutAt")
+    if not check_in or not check_out:
+        return {}
+    anchors = {"checkInAt": check_in, "checkOutAt": check_out, "midpoint": check_in + (check_out - check_in) / 2}
+    return {service: anchors[anchor] + offset for service, anchor, offset in STAY_SERVICES}
+
+
+class ServiceScheduler:
+    """Timed per-booking service jobs stored in Mongo and run when due.
+
+    Each booking gets one job per entry of ``STAY_SERVICES`` with a
+    deterministic ``_id`` (``<booking id>:<service>``), so rescheduling a
+    booking moves its pending (or cancelled) jobs instead of adding new ones. The worker
+    keeps a min-heap of the jobs due within ``lookahead`` and sleeps until
+    the earliest one (or until a new job lands ahead of it) rather than
+    polling the collection; the heap is refilled from the ``(status, dueAt)``
+    index every ``lookahead / 2``. Jobs are claimed with a lease, so several
+    workers can share the table; failures back off exponentially and stop
+    at ``max_attempts`` with status ``failed``.
+    """
+
+    def __init__(
+        self,
+        collection,
+        lookahead: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        retry_base: Optional[float] = None,
+        lease: float = 300.0
+    ):
+        self.collection = collection
+        self.lookahead = lookahead if lookahead is not None else float(os.environ.get('SERVICE_SCHEDULER_LOOKAHEAD_SECONDS', '3600'))
+        self.max_attempts = max_attempts if max_attempts is not None else int(os.environ.get('SERVICE_SCHEDULER_MAX_ATTEMPTS', '5'))
+        self.retry_base = retry_base if retry_base is not None else float(os.environ.get('SERVICE_SCHEDULER_RETRY_BASE_SECONDS', '60'))
+        self.lease = lease
+        self.worker_id = uuid.uuid4().hex
+        self.handlers: Dict[str, Handler] = {}
+        self._heap: List[Tuple[datetime, str]] = []
+        # Due time each job id is queued under; heap entries that disagree are stale
+        self._queued: Dict[str, datetime] = {}
+        self._refill_at = datetime.min
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.completed = 0
+        self.failed = 0
+
+    def register(self, service: str, handler: Handler):
+        self.handlers[service] = handler
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("status", 1), ("dueAt", 1)])
+        await self.collection.create_index("bookingId")
+
+    async def schedule_for_booking(self, booking: Dict) -> int:
+        """Create, move or revive the jobs for ``booking``; cancel them if it
+        is no longer a confirmed stay, and any moved into the past. Jobs
+        already run are left alone."""
+        return await self.schedule_for_bookings([booking])
+
+    async def schedule_for_bookings(self, bookings: List[Dict]) -> int:
+        """Bulk form of :meth:`schedule_for_booking`: one ``bulk_write`` for
+        all the jobs, one update for all the cancellations."""
+        now = datetime.utcnow()
+        operations = []
+        queued = []
+        cancelled = []
+        for booking in bookings:
+            due_times = service_due_times(booking) if booking.get("bookingStatus") == "confirmed" else {}
+            if not due_times:
+                cancelled.append(booking["id"])
+                continue
+            details = {field: booking.get(field) for field in JOB_BOOKING_FIELDS}
+            for service, due_at in due_times.items():
+                job_id = f"{booking['id']}:{service}"
+                if due_at < now:
+                    # Booked too late for this one (e.g. a same-day arrival),
+                    # or moved into the past by a date change
+                    self._queued.pop(job_id, None)
+                    operations.append(UpdateOne(
+                        {"_id": job_id, "status": "pending"},
+                        {"$set": {"status": "cancelled", "updatedAt": now}}
+                    ))
+                    continue
+                queued.append((job_id, due_at))
+                # A cancelled job comes back if its booking is confirmed again
+                operations.append(UpdateOne(
+                    {"_id": job_id, "status": {"$in": ["pending", "cancelled"]}},
+                    {
+                        "$set": {"status": "pending", "dueAt": due_at, "booking": details, "updatedAt": now},
+                        "$setOnInsert": {"id": job_id, "bookingId": booking["id"], "service": service, "attempts": 0, "createdAt": now}
+                    },
+                    upsert=True
+                ))
+        if cancelled:
+            await self.cancel_for_bookings(cancelled)
+        if not operations:
+            return 0
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # A duplicate key means the job has already run (or is running)
+            errors = [error for error in e.details.get("writeErrors", []) if error.get("code") != DUPLICATE_KEY]
+            if errors:
+                raise
+        for job_id, due_at in queued:
+            self._push(job_id, due_at)
+        return len(queued)
+
+    async def cancel_for_booking(self, booking_id: str) -> int:
+        return await self.cancel_for_bookings([booking_id])
+
+    async def cancel_for_bookings(self, booking_ids: List[str]) -> int:
+        result = await self.collection.update_many(
+            {"bookingId": {"$in": booking_ids}, "status": "pending"},
+            {"$set": {"status": "cancelled", "updatedAt": datetime.utcnow()}}
+        )
+        return result.modified_count
+
+    def _push(self, job_id: str, due_at: datetime):
+        if due_at > datetime.utcnow() + timedelta(seconds=self.lookahead):
+            # Picked up by a later refill
+            self._queued.pop(job_id, None)
+            return
+        self._queued[job_id] = due_at
+        heapq.heappush(self._heap, (due_at, job_id))
+        if self._heap[0][1] == job_id:
+            self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _refill(self, now: datetime):
+        horizon = now + timedelta(seconds=self.lookahead)
+        cursor = self.collection.find(
+            {"$or": [
+                {"status": "pending", "dueAt": {"$lte": horizon}},
+                {"status": "running", "lockedUntil": {"$lt": now}}
+            ]},
+            {"dueAt": 1, "status": 1}
+        )
+        async for job in cursor:
+            due_at = job["dueAt"] if job["status"] == "pending" else now
+            if self._queued.get(job["_id"]) != due_at:
+                self._queued[job["_id"]] = due_at
+                heapq.heappush(self._heap, (due_at, job["_id"]))
+        self._refill_at = now + timedelta(seconds=self.lookahead / 2)
+
+    async def _run(self):
+        while True:
+            try:
+                now = datetime.utcnow()
+                if now >= self._refill_at:
+                    await self._refill(now)
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    due_at, job_id = heapq.heappop(self._heap)
+                    if self._queued.get(job_id) == due_at:
+                        del self._queued[job_id]
+                        due.append(job_id)
+                if due:
+                    await asyncio.gather(*(self._run_job(job_id) for job_id in due))
+                    continue
+                wake_at = min(self._heap[0][0], self._refill_at) if self._heap else self._refill_at
+                timeout = max((wake_at - datetime.utcnow()).total_seconds(), 0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Service scheduler error: {str(e)}")
+                timeout = self.retry_base
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_job(self, job_id: str):
+        now = datetime.utcnow()
+        job = await self.collection.find_one_and_update(
+            {"_id": job_id, "$or": [
+                {"status": "pending", "dueAt": {"$lte": now}},
+                {"status": "running", "lockedUntil": {"$lt": now}}
+            ]},
+            {
+                "$set": {"status": "running", "lockedBy": self.worker_id, "lockedUntil": now + timedelta(seconds=self.lease)},
+                "$inc": {"attempts": 1}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        if job is None:
+            # Another worker took it, or it was moved or cancelled; a moved
+            # job is back in the heap through schedule or the next refill
+            return
+        handler = self.handlers.get(job["service"])
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler for service {job['service']}")
+            result = await handler(job)
+            await self.collection.update_one(
+                {"_id": job_id, "lockedBy": self.worker_id},
+                {
+                    "$set": {"status": "done", "result": result, "completedAt": datetime.utcnow()},
+                    "$unset": {"lockedBy": "", "lockedUntil": "", "lastError": ""}
+                }
+            )
+            self.completed += 1
+        except Exception as e:
+            self.failed += 1
+            attempts = job.get("attempts", 1)
+            if attempts >= self.max_attempts:
+                logger.error(f"Service job {job_id} failed after {attempts} attempts: {str(e)}")
+                update = {"status": "failed", "lastError": str(e), "failedAt": datetime.utcnow()}
+            else:
+                delay = min(self.retry_base * 2 ** (attempts - 1), 3600) * random.uniform(0.8, 1.2)
+                logger.warning(f"Service job {job_id} failed (attempt {attempts}), retrying in {delay:.0f}s: {str(e)}")
+                retry_at = datetime.utcnow() + timedelta(seconds=delay)
+                update = {"status": "pending", "lastError": str(e), "dueAt": retry_at}
+            await self.collection.update_one(
+                {"_id": job_id, "lockedBy": self.worker_id},
+                {"$set": update, "$unset": {"lockedBy": "", "lockedUntil": ""}}
+            )
+            if update["status"] == "pending":
+                self._push(job_id, update["dueAt"])
+
+    async def stats(self) -> Dict:
+        counts = await self.collection.aggregate([
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+        ]).to_list(10)
+        return {
+            "by_status": {entry["_id"]: entry["count"] for entry in counts},
+            "queued": len(self._queued),
+            "next_due": self._heap[0][0] if self._heap else None,
+            "completed": self.completed,
+            "failed": self.failed
+        }
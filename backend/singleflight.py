@@ -0,0 +1,73 @@
+import asyncio
+import functools
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key onto one in-flight coroutine.
+
+    The shared call runs as its own task, so a caller disconnecting does not
+    cancel the work the other callers are waiting on. Nothing is cached: once
+    the call completes the next request starts a new one.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+        self.collapsed = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.collapsed += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        # Callers may all have gone away; retrieve the error so it is not reported as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "executions": self.executions,
+            "collapsed": self.collapsed,
+            "in_flight": len(self._inflight)
+        }
+
+
+single_flight_groups: Dict[str, SingleFlight] = {}
+
+
+def single_flight(name: str, key: Optional[Callable[..., Hashable]] = None):
+    """Opt a read handler into request coalescing.
+
+    Concurrent calls whose keyword arguments match (or whose ``key(**kwargs)``
+    matches) share one execution of the handler. Only use this on handlers
+    whose result depends solely on their arguments.
+    """
+    def decorator(handler):
+        group = single_flight_groups.setdefault(name, SingleFlight(name))
+
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            call_key = key(**kwargs) if key else (args, tuple(sorted(kwargs.items())))
+            return await group.do(call_key, lambda: handler(*args, **kwargs))
+
+        return wrapper
+
+    return decorator
+
+
+def single_flight_stats() -> list:
+    return [group.stats() for group in single_flight_groups.values()]
@@ -0,0 +1,235 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from pymongo import UpdateOne
+
+from ids import new_id
+
+logger = logging.getLogger(__name__)
+
+# Response times promised to guests in the confirmation email and Telegram alert
+SLA_WINDOWS = {
+    "urgent": timedelta(hours=2),
+    "high": timedelta(hours=4),
+    "normal": timedelta(hours=24),
+}
+
+# A request is waiting on us while it is pending and nobody has replied
+AWAITING_RESPONSE = {"status": "pending", "respondedAt": None, "slaBreachedAt": None}
+
+# Equality fields of AWAITING_RESPONSE first, then the deadline to sort on
+AWAITING_RESPONSE_INDEX = [("status", 1), ("respondedAt", 1), ("slaBreachedAt", 1), ("slaDueAt", 1)]
+
+# Callback for a request the SLA code changed, e.g. to drop cached copies
+OnChange = Callable[[Dict], Awaitable[None]]
+
+
+def sla_due_at(created_at: datetime, priority: Optional[str]) -> datetime:
+    return created_at + SLA_WINDOWS.get(priority, SLA_WINDOWS["normal"])
+
+
+async def backfill_sla_due(collection, batch_size: int = 500, on_change: Optional[OnChange] = None) -> int:
+    """Set slaDueAt on requests stored before it existed.
+
+    Requests already past due are marked breached without an escalation, so
+    the first deploy does not page the team about every old request.
+    ``on_change`` is awaited for each request updated.
+    """
+    updated = 0
+    now = datetime.utcnow()
+    while True:
+        docs = await collection.find(
+            {"slaDueAt": {"$exists": False}},
+            {"createdAt": 1, "priority": 1, "id": 1, "confirmationNumber": 1}
+        ).limit(batch_size).to_list(batch_size)
+        if not docs:
+            return updated
+        operations = []
+        for doc in docs:
+            due_at = sla_due_at(doc.get("createdAt") or now, doc.get("priority"))
+            operations.append(UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": {"slaDueAt": due_at, "slaBreachedAt": now if due_at <= now else None, "lastUpdatedAt": now}}
+            ))
+        await collection.bulk_write(operations, ordered=False)
+        if on_change is not None:
+            for doc in docs:
+                await on_change(doc)
+        updated += len(docs)
+
+
+class SlaWatcher:
+    """Escalates guest requests that pass their ``slaDueAt`` unanswered.
+
+    The watcher reads only the earliest due request still awaiting a
+    response (``AWAITING_RESPONSE_INDEX`` serves both the filter and the
+    sort) and sleeps until
+    that moment, or until ``notify()`` reports an earlier deadline; it
+    re-checks at least every ``max_sleep`` seconds to see deadlines set on
+    other workers. Each breach is claimed by setting ``slaBreachedAt`` on
+    the request, so with several workers watching it is escalated once, and
+    recorded in the breaches collection; ``on_change`` is awaited with the
+    claimed request. An escalation that fails (or reports it was not sent)
+    is retried from its breach record with exponential backoff, up to
+    ``max_attempts``, unless the request is answered first.
+    """
+
+    def __init__(
+        self,
+        collection,
+        breaches,
+        escalate: Callable[[Dict], Awaitable[bool]],
+        max_sleep: Optional[float] = None,
+        on_change: Optional[OnChange] = None,
+        retry_base: Optional[float] = None,
+        max_attempts: Optional[int] = None
+    ):
+        self.collection = collection
+        self.breaches = breaches
+        self.escalate = escalate
+        self.on_change = on_change
+        self.max_sleep = max_sleep if max_sleep is not None else float(os.environ.get('SLA_WATCHER_MAX_SLEEP_SECONDS', '600'))
+        self.retry_base = retry_base if retry_base is not None else float(os.environ.get('SLA_ESCALATION_RETRY_BASE_SECONDS', '60'))
+        self.max_attempts = max_attempts if max_attempts is not None else int(os.environ.get('SLA_ESCALATION_MAX_ATTEMPTS', '8'))
+        self.next_due: Optional[datetime] = None
+        self.next_retry: Optional[datetime] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.escalated = 0
+
+    async def ensure_indexes(self):
+        await self.collection.create_index(AWAITING_RESPONSE_INDEX)
+        try:
+            # Superseded: it could not skip answered or breached requests
+            await self.collection.drop_index("status_1_slaDueAt_1")
+        except Exception:
+            pass
+        await self.breaches.create_index([("detectedAt", -1)])
+        await self.breaches.create_index("requestId")
+        await self.breaches.create_index([("notified", 1), ("nextAttemptAt", 1)])
+
+    def notify(self, due_at: Optional[datetime]):
+        """A request's deadline was set or moved; wake up if it is the earliest."""
+        if due_at is not None and (self.next_due is None or due_at < self.next_due):
+            self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            timeout = self.max_sleep
+            try:
+                now = datetime.utcnow()
+                earliest = await self.collection.find_one(
+                    {**AWAITING_RESPONSE, "slaDueAt": {"$ne": None}},
+                    sort=[("slaDueAt", 1)]
+                )
+                self.next_due = earliest["slaDueAt"] if earliest else None
+                if earliest is not None and earliest["slaDueAt"] <= now:
+                    await self._breach(earliest, now)
+                    continue
+                retry = await self.breaches.find_one(
+                    {"notified": False, "nextAttemptAt": {"$ne": None}},
+                    sort=[("nextAttemptAt", 1)]
+                )
+                self.next_retry = retry["nextAttemptAt"] if retry else None
+                if retry is not None and retry["nextAttemptAt"] <= now:
+                    await self._retry(retry, now)
+                    continue
+                for moment in (self.next_due, self.next_retry):
+                    if moment is not None:
+                        timeout = min(timeout, (moment - now).total_seconds())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"SLA watcher error: {str(e)}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _breach(self, request: Dict, now: datetime):
+        claimed = await self.collection.update_one(
+            {"_id": request["_id"], **AWAITING_RESPONSE, "slaDueAt": request["slaDueAt"]},
+            {"$set": {"slaBreachedAt": now, "lastUpdatedAt": now}}
+        )
+        if not claimed.modified_count:
+            # Answered, moved or claimed by another worker meanwhile
+            return
+        if self.on_change is not None:
+            try:
+                await self.on_change(request)
+            except Exception as e:
+                logger.error(f"SLA change callback failed for request {request['_id']}: {str(e)}")
+        notified = await self._notify(request)
+        breach_id = new_id()
+        await self.breaches.insert_one({
+            "_id": breach_id,
+            "id": breach_id,
+            "requestId": request["_id"],
+            "confirmationNumber": request.get("confirmationNumber"),
+            "priority": request.get("priority"),
+            "requestType": request.get("requestType"),
+            "propertyId": request.get("propertyId"),
+            "slaDueAt": request["slaDueAt"],
+            "detectedAt": now,
+            "overdueSeconds": round((now - request["slaDueAt"]).total_seconds()),
+            "notified": notified,
+            "attempts": 1,
+            "nextAttemptAt": None if notified else self._next_attempt(request, 1, now)
+        })
+        self.escalated += 1
+        logger.warning(f"SLA breached for request {request.get('confirmationNumber')} ({request.get('priority')})")
+
+    async def _notify(self, request: Dict) -> bool:
+        try:
+            return bool(await self.escalate(request))
+        except Exception as e:
+            logger.error(f"SLA escalation failed for request {request['_id']}: {str(e)}")
+            return False
+
+    def _next_attempt(self, request: Dict, attempts: int, now: datetime) -> Optional[datetime]:
+        """When to retry an escalation that was not sent; None to give up."""
+        if attempts >= self.max_attempts:
+            logger.error(f"SLA escalation for request {request.get('confirmationNumber')} not sent after {attempts} attempts")
+            return None
+        return now + timedelta(seconds=min(self.retry_base * 2 ** (attempts - 1), 3600))
+
+    async def _retry(self, breach: Dict, now: datetime):
+        # Push the attempt time out while sending, so one worker retries it
+        claimed = await self.breaches.update_one(
+            {"_id": breach["_id"], "notified": False, "nextAttemptAt": breach["nextAttemptAt"]},
+            {"$set": {"nextAttemptAt": now + timedelta(seconds=self.retry_base)}}
+        )
+        if not claimed.modified_count:
+            return
+        attempts = breach.get("attempts", 1) + 1
+        request = await self.collection.find_one({"_id": breach["requestId"]})
+        if request is None or request.get("status") != "pending" or request.get("respondedAt"):
+            # Dealt with meanwhile; nobody needs paging any more
+            await self.breaches.update_one({"_id": breach["_id"]}, {"$set": {"nextAttemptAt": None}})
+            return
+        if await self._notify(request):
+            update = {"notified": True, "notifiedAt": datetime.utcnow(), "nextAttemptAt": None}
+        else:
+            update = {"nextAttemptAt": self._next_attempt(request, attempts, now)}
+        await self.breaches.update_one({"_id": breach["_id"]}, {"$set": {**update, "attempts": attempts}})
+
+    def stats(self) -> Dict:
+        return {
+            "running": self._task is not None,
+            "next_due": self.next_due,
+            "next_retry": self.next_retry,
+            "escalated": self.escalated
+        }
@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from pymongo import UpdateOne
+
+# Formats seen in booking webhooks and the guest form, after ISO 8601.
+# Slashed dates are read month-first (US), as guests and platforms send them.
+STAY_DATE_FORMATS = (
+    "%m/%d/%Y",
+    "%m/%d/%y",
+    "%m-%d-%Y",
+    "%Y/%m/%d",
+    "%B %d, %Y",
+    "%b %d, %Y",
+    "%B %d %Y",
+    "%b %d %Y",
+    "%d %B %Y",
+    "%d %b %Y",
+)
+
+
+def parse_stay_date(value: Optional[str]) -> Optional[datetime]:
+    """Naive UTC datetime for a free-form stay date, or None if unreadable.
+
+    Date-only values become midnight of that day.
+    """
+    if not value or not isinstance(value, str):
+        return None
+    text = value.strip()
+    try:
+        parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        parsed = None
+        for date_format in STAY_DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(text, date_format)
+                break
+            except ValueError:
+                continue
+    if parsed is not None and parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def stay_date_fields(check_in: Optional[str], check_out: Optional[str]) -> Dict[str, Optional[datetime]]:
+    return {
+        "checkInAt": parse_stay_date(check_in),
+        "checkOutAt": parse_stay_date(check_out),
+    }
+
+
+async def backfill_stay_dates(collection, batch_size: int = 500) -> int:
+    """Parse checkInDate/checkOutDate into checkInAt/checkOutAt where missing.
+
+    Unreadable dates are stored as None so they are not retried on every run.
+    """
+    updated = 0
+    while True:
+        docs = await collection.find(
+            {"checkInAt": {"$exists": False}},
+            {"checkInDate": 1, "checkOutDate": 1}
+        ).limit(batch_size).to_list(batch_size)
+        if not docs:
+            return updated
+        await collection.bulk_write([
+            UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": stay_date_fields(doc.get("checkInDate"), doc.get("checkOutDate"))}
+            )
+            for doc in docs
+        ], ordered=False)
+        updated += len(docs)
@@ -0,0 +1,109 @@
+import json
+import base64
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, Optional
+
+from fastapi.responses import StreamingResponse
+
+from ids import key_from_json, key_to_json, keys_past
+from serialization import dumps, row_projector
+
+STREAM_BATCH_SIZE = 200
+MAX_LIST_LIMIT = 1000
+
+
+def encode_cursor(doc: Dict, sort_field: str) -> str:
+    """Opaque keyset cursor pointing just past ``doc`` in (sort_field, _id) order."""
+    value = doc.get(sort_field)
+    payload = {"id": key_to_json(doc.get("_id"))}
+    if isinstance(value, datetime):
+        payload["dt"] = value.isoformat()
+    else:
+        payload["v"] = value
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Dict:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if "dt" in payload:
+            payload["v"] = datetime.fromisoformat(payload.pop("dt"))
+        payload["id"] = key_from_json(payload.get("id"))
+        return payload
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def keyset_query(query: Dict, sort_field: str, direction: int, cursor: Optional[str]) -> Dict:
+    """Restrict ``query`` to documents after ``cursor`` in (sort_field, _id) order."""
+    if not cursor:
+        return query
+    position = decode_cursor(cursor)
+    op = "$lt" if direction < 0 else "$gt"
+    after = {"$or": [
+        {sort_field: {op: position["v"]}},
+        {sort_field: position["v"], **keys_past(position["id"], op)}
+    ]}
+    return {"$and": [query, after]} if query else after
+
+
+async def _json_array_chunks(cursor, project: Callable[[Dict], Dict], prefix: bytes, suffix: bytes) -> AsyncIterator[bytes]:
+    yield prefix
+    rows = []
+    first = True
+    async for doc in cursor:
+        rows.append(dumps(project(doc)))
+        if len(rows) >= STREAM_BATCH_SIZE:
+            yield (b"" if first else b",") + b",".join(rows)
+            first = False
+            rows = []
+    if rows:
+        yield (b"" if first else b",") + b",".join(rows)
+    yield suffix
+
+
+async def stream_json_list(
+    collection,
+    query: Dict,
+    model,
+    sort_field: str,
+    direction: int = -1,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    envelope: bool = True,
+    headers: Optional[Dict[str, str]] = None
+) -> StreamingResponse:
+    """Stream one page of documents as a JSON array, serialised off the cursor.
+
+    Pages are keyset-paginated on (sort_field, _id). The next page's cursor
+    is found up front with a cheap index-only probe, so it can be sent before
+    the rows: inside the ``{"success", "next_cursor", "data"}`` envelope, or
+    as an ``X-Next-Cursor`` header when ``envelope`` is false.
+    """
+    limit = max(1, min(limit, MAX_LIST_LIMIT))
+    query = keyset_query(query, sort_field, direction, cursor)
+    sort = [(sort_field, direction), ("_id", direction)]
+
+    probe = await collection.find(query, {sort_field: 1}) \
+        .sort(sort).skip(limit - 1).limit(2).to_list(2)
+    next_cursor = encode_cursor(probe[0], sort_field) if len(probe) == 2 else None
+
+    project = row_projector(model)
+    documents = collection.find(query, {"_id": 0}).sort(sort).limit(limit).batch_size(STREAM_BATCH_SIZE)
+
+    headers = dict(headers or {})
+    if envelope:
+        prefix = b'{"success":true,"next_cursor":' + dumps(next_cursor) + b',"data":['
+        suffix = b"]}"
+    else:
+        prefix, suffix = b"[", b"]"
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+
+    return StreamingResponse(
+        _json_array_chunks(documents, project, prefix, suffix),
+        media_type="application/json",
+        headers=headers
+    )
@@ -101,6 +101,25 @@ Message: {message[:200]}{"..." if len(message) > 200 else ""}"""
             
             return False
     
+    async def send_text(self, text: str, chat_id: Optional[str] = None) -> bool:
+        """Send a plain-text message to the team chat."""
+        if not self.bot:
+            logger.warning("Telegram bot not configured, skipping notification")
+            return False
+
+        target_chat_id = chat_id or self.default_chat_id
+        if not target_chat_id:
+            logger.warning("No Telegram chat ID configured, skipping notification")
+            return False
+
+        try:
+            chat_id_int = int(target_chat_id) if isinstance(target_chat_id, str) else target_chat_id
+            await self.bot.send_message(chat_id=chat_id_int, text=text)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to send Telegram message: {str(e)}")
+            return False
+    
     def _create_telegram_message(
         self, guest_name, guest_email, property_address, request_type,
         priority, message, confirmation_number, photo_count
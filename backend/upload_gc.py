@@ -0,0 +1,257 @@
+import os
+import heapq
+import shutil
+import asyncio
+import itertools
+import logging
+import tempfile
+import time
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Pipelines yielding {"filename": ...} documents sorted by filename. Files
+# that belong to a soft-deleted property (a matching properties record exists
+# but none of them is active) are left out so their uploads become orphans.
+# Records without any properties entry predate property management and are
+# always kept.
+_ACTIVE_PROPERTY_STAGES = [
+    {"$lookup": {
+        "from": "properties",
+        "let": {"ownerEmail": "$ownerEmail", "propertyAddress": "$propertyAddress"},
+        "pipeline": [
+            {"$match": {"$expr": {"$and": [
+                {"$eq": ["$ownerEmail", "$$ownerEmail"]},
+                {"$eq": ["$propertyAddress", "$$propertyAddress"]}
+            ]}}},
+            {"$project": {"_id": 0, "isActive": 1}}
+        ],
+        "as": "property"
+    }},
+    {"$match": {"$or": [{"property": {"$size": 0}}, {"property.isActive": True}]}},
+]
+
+REFERENCE_PIPELINES = {
+    "reports": ("inspection_reports", [
+        {"$match": {"reportFile": {"$type": "string"}}},
+        *_ACTIVE_PROPERTY_STAGES,
+        {"$project": {"_id": 0, "filename": "$reportFile"}},
+        {"$sort": {"filename": 1}}
+    ]),
+    "photos": ("property_photos", [
+        {"$project": {"_id": 0, "filename": 1, "ownerEmail": 1, "propertyAddress": 1}},
+        *_ACTIVE_PROPERTY_STAGES,
+        {"$project": {"filename": 1}},
+        {"$sort": {"filename": 1}}
+    ]),
+    "guest_photos": ("guest_requests", [
+        {"$project": {"_id": 0, "filename": {"$concatArrays": [
+            {"$ifNull": ["$photos.filename", []]},
+            {"$ifNull": ["$adminPhotos.filename", []]}
+        ]}}},
+        {"$unwind": "$filename"},
+        {"$sort": {"filename": 1}}
+    ]),
+}
+
+
+class UploadGarbageCollector:
+    """Finds upload files no database record points at.
+
+    Orphans are first moved into a quarantine directory; files that have sat
+    in quarantine longer than the grace period are deleted on a later run.
+    Directory listings and reference cursors are both consumed in filename
+    order and merge-joined, so memory stays bounded by the batch size.
+    """
+
+    def __init__(
+        self,
+        db,
+        upload_dir: Path,
+        batch_size: Optional[int] = None,
+        grace_period: Optional[int] = None,
+        min_file_age: Optional[int] = None
+    ):
+        self.db = db
+        self.upload_dir = upload_dir
+        self.quarantine_dir = upload_dir / ".quarantine"
+        self.batch_size = batch_size if batch_size is not None else int(os.environ.get('UPLOAD_GC_BATCH_SIZE', '1000'))
+        self.grace_period = grace_period if grace_period is not None else int(os.environ.get('UPLOAD_GC_GRACE_SECONDS', str(7 * 24 * 3600)))
+        # Uploads are written before their record is inserted; never touch
+        # files young enough to belong to an in-flight request.
+        self.min_file_age = min_file_age if min_file_age is not None else int(os.environ.get('UPLOAD_GC_MIN_AGE_SECONDS', '3600'))
+
+    async def run(self, dry_run: bool = True, report_limit: int = 100) -> Dict:
+        """Run one collection pass and return a report per upload directory."""
+        started_at = time.time()
+        report = {"dryRun": dry_run, "directories": {}}
+
+        for subdir, (collection_name, pipeline) in REFERENCE_PIPELINES.items():
+            directory = self.upload_dir / subdir
+            if not await asyncio.to_thread(directory.exists):
+                continue
+            references = self._referenced_filenames(collection_name, pipeline)
+            report["directories"][subdir] = await self._collect_directory(
+                subdir, directory, references, dry_run, report_limit
+            )
+
+        report["durationSeconds"] = round(time.time() - started_at, 3)
+        logger.info(
+            "Upload GC finished (dry_run=%s): %s",
+            dry_run,
+            {name: stats["orphans"] for name, stats in report["directories"].items()}
+        )
+        return report
+
+    async def _collect_directory(self, subdir, directory, references, dry_run, report_limit) -> Dict:
+        now = time.time()
+        quarantine = self.quarantine_dir / subdir
+        stats = {
+            "scanned": 0,
+            "referenced": 0,
+            "tooRecent": 0,
+            "orphans": 0,
+            "orphanBytes": 0,
+            "quarantined": 0,
+            "restored": 0,
+            "deleted": 0,
+            "sample": []
+        }
+
+        async for filename, is_referenced in self._merge_join(directory, references):
+            stats["scanned"] += 1
+            if is_referenced:
+                stats["referenced"] += 1
+                continue
+
+            file_path = directory / filename
+            try:
+                file_stat = await asyncio.to_thread(file_path.stat)
+            except FileNotFoundError:
+                continue
+            if now - file_stat.st_mtime < self.min_file_age:
+                stats["tooRecent"] += 1
+                continue
+
+            stats["orphans"] += 1
+            stats["orphanBytes"] += file_stat.st_size
+            if len(stats["sample"]) < report_limit:
+                stats["sample"].append(filename)
+
+            if not dry_run:
+                await asyncio.to_thread(_quarantine_file, file_path, quarantine / filename, now)
+                stats["quarantined"] += 1
+
+        if await asyncio.to_thread(quarantine.exists):
+            await self._sweep_quarantine(subdir, directory, quarantine, now, dry_run, stats)
+
+        return stats
+
+    async def _sweep_quarantine(self, subdir, directory, quarantine, now, dry_run, stats):
+        """Restore quarantined files that regained a reference, purge expired ones."""
+        collection_name, pipeline = REFERENCE_PIPELINES[subdir]
+        references = self._referenced_filenames(collection_name, pipeline)
+
+        async for filename, is_referenced in self._merge_join(quarantine, references):
+            file_path = quarantine / filename
+            if is_referenced:
+                if not dry_run:
+                    await asyncio.to_thread(shutil.move, str(file_path), str(directory / filename))
+                stats["restored"] += 1
+                continue
+
+            try:
+                quarantined_at = (await asyncio.to_thread(file_path.stat)).st_mtime
+            except FileNotFoundError:
+                continue
+            if now - quarantined_at >= self.grace_period:
+                if not dry_run:
+                    await asyncio.to_thread(file_path.unlink, missing_ok=True)
+                stats["deleted"] += 1
+
+    async def _referenced_filenames(self, collection_name: str, pipeline: List[Dict]) -> AsyncIterator[str]:
+        cursor = self.db[collection_name].aggregate(
+            pipeline, allowDiskUse=True, batchSize=self.batch_size
+        )
+        async for doc in cursor:
+            yield doc["filename"]
+
+    async def _merge_join(self, directory: Path, references: AsyncIterator[str]):
+        """Yield (filename, is_referenced) for every file in ``directory``.
+
+        Both inputs are sorted by filename (Python's code point order matches
+        MongoDB's binary string order), so a single forward pass suffices.
+        The listing and the spill files are read in worker threads, a batch
+        at a time, so a large directory does not stall the event loop.
+        """
+        runs = await asyncio.to_thread(self._spill_sorted_runs, directory)
+        merged = _merge_runs(runs)
+        try:
+            reference = await anext(references, None)
+            while True:
+                filenames = await asyncio.to_thread(list, itertools.islice(merged, self.batch_size))
+                if not filenames:
+                    break
+                for filename in filenames:
+                    while reference is not None and reference < filename:
+                        reference = await anext(references, None)
+                    yield filename, reference == filename
+        finally:
+            merged.close()
+            await asyncio.to_thread(_remove_runs, runs)
+
+    def _spill_sorted_runs(self, directory: Path) -> List:
+        """List ``directory`` in sorted runs of at most ``batch_size`` names.
+
+        A single run is kept in memory; larger directories are spilled to
+        temporary files and merged lazily by ``_merge_runs``.
+        """
+        runs = []
+        batch = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.is_file() or "\n" in entry.name:
+                    continue
+                batch.append(entry.name)
+                if len(batch) >= self.batch_size:
+                    runs.append(_write_run(sorted(batch)))
+                    batch = []
+        if batch:
+            batch.sort()
+            runs.append(_write_run(batch) if runs else batch)
+        return runs
+
+
+def _write_run(names: List[str]) -> Path:
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".gcrun", delete=False) as handle:
+        for name in names:
+            handle.write(name + "\n")
+    return Path(handle.name)
+
+
+def _read_run(run) -> Iterator[str]:
+    if isinstance(run, list):
+        yield from run
+        return
+    with open(run, encoding="utf-8") as handle:
+        for line in handle:
+            yield line.rstrip("\n")
+
+
+def _merge_runs(runs: List) -> Iterator[str]:
+    return heapq.merge(*(_read_run(run) for run in runs))
+
+
+def _remove_runs(runs: List):
+    for run in runs:
+        if isinstance(run, Path):
+            run.unlink(missing_ok=True)
+
+
+def _quarantine_file(source: Path, target: Path, now: float):
+    target.parent.mkdir(parents=True, exist_ok=True)
+    shutil.move(str(source), str(target))
+    # The quarantine clock starts from the move, not the upload
+    os.utime(target, (now, now))
+
@@ -0,0 +1,255 @@
+import os
+import uuid
+import random
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from pymongo import ReturnDocument
+
+from ids import new_id
+
+logger = logging.getLogger(__name__)
+
+# Called with the event payload and when the event reached the inbox
+Handler = Callable[[Dict, datetime], Awaitable[Any]]
+
+# Events still waiting their turn; these hold back later events for the same partition
+UNFINISHED = ["pending", "processing"]
+
+
+class WebhookInbox:
+    """Durable queue between the webhook fast path and the processing work.
+
+    Webhooks store the raw event and return immediately; a background
+    worker per process claims events and runs the handler registered for
+    their type. Events with the same ``partitionKey`` (one booking) are
+    processed strictly in arrival order: an event only runs once every
+    older event for its partition is done or dead-lettered. A claim is a
+    lease of ``lease`` seconds, renewed by a heartbeat while the handler
+    runs, so only an event whose worker died is claimed again. Failures are
+    retried with exponential backoff; after ``max_attempts`` the event is
+    marked ``dead`` and waits for a manual retry.
+    """
+
+    def __init__(
+        self,
+        collection,
+        concurrency: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        retry_base: Optional[float] = None,
+        poll_interval: Optional[float] = None,
+        lease: float = 60.0,
+        done_retention_days: int = 7
+    ):
+        self.collection = collection
+        self.concurrency = concurrency if concurrency is not None else int(os.environ.get('BOOKING_INBOX_CONCURRENCY', '4'))
+        self.max_attempts = max_attempts if max_attempts is not None else int(os.environ.get('BOOKING_INBOX_MAX_ATTEMPTS', '8'))
+        self.retry_base = retry_base if retry_base is not None else float(os.environ.get('BOOKING_INBOX_RETRY_BASE_SECONDS', '5'))
+        self.poll_interval = poll_interval if poll_interval is not None else float(os.environ.get('BOOKING_INBOX_POLL_SECONDS', '5'))
+        self.lease = lease
+        self.max_scan = 200
+        self.done_retention = timedelta(days=done_retention_days)
+        self.worker_id = uuid.uuid4().hex
+        self.handlers: Dict[str, Handler] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.processed = 0
+        self.failed = 0
+
+    def register(self, event_type: str, handler: Handler):
+        self.handlers[event_type] = handler
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("status", 1), ("nextAttemptAt", 1)])
+        await self.collection.create_index([("status", 1), ("lockedUntil", 1)])
+        await self.collection.create_index([("partitionKey", 1), ("status", 1), ("_id", 1)])
+        # Finished events are only kept for a while; dead ones stay until handled
+        await self.collection.create_index("expiresAt", expireAfterSeconds=0)
+
+    async def enqueue(self, event_type: str, partition_key: str, payload: Dict) -> str:
+        # Time-ordered ids give arrival order within a partition
+        event_id = new_id()
+        now = datetime.utcnow()
+        await self.collection.insert_one({
+            "_id": event_id,
+            "id": event_id,
+            "eventType": event_type,
+            "partitionKey": partition_key,
+            "payload": payload,
+            "status": "pending",
+            "attempts": 0,
+            "receivedAt": now,
+            "nextAttemptAt": now
+        })
+        self._wakeup.set()
+        return event_id
+
+    async def retry(self, event_id: str) -> bool:
+        """Put a dead-lettered event back in the queue."""
+        result = await self.collection.update_one(
+            {"_id": event_id, "status": "dead"},
+            {"$set": {"status": "pending", "attempts": 0, "nextAttemptAt": datetime.utcnow()}}
+        )
+        if result.modified_count:
+            self._wakeup.set()
+        return result.modified_count > 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                claimed = await self._claim_batch()
+                if claimed:
+                    await asyncio.gather(*(self._process(event) for event in claimed))
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Webhook inbox worker error: {str(e)}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim_batch(self) -> List[Dict]:
+        now = datetime.utcnow()
+        ready = {"$or": [
+            {"status": "pending", "nextAttemptAt": {"$lte": now}},
+            # Lease ran out: the worker holding it died mid-event
+            {"status": "processing", "lockedUntil": {"$lt": now}}
+        ]}
+        heads: List[Dict] = []
+        seen: Set[str] = set()
+        for query, order in zip(ready["$or"], ("nextAttemptAt", "lockedUntil")):
+            if len(heads) < self.concurrency:
+                heads.extend(await self._partition_heads(query, order, self.concurrency - len(heads), seen))
+
+        claimed = []
+        for head in heads:
+            event = await self.collection.find_one_and_update(
+                {"_id": head["_id"], **ready},
+                {
+                    "$set": {
+                        "status": "processing",
+                        "lockedBy": self.worker_id,
+                        "lockedUntil": now + timedelta(seconds=self.lease)
+                    },
+                    "$inc": {"attempts": 1}
+                },
+                return_document=ReturnDocument.AFTER
+            )
+            if event:
+                claimed.append(event)
+        return claimed
+
+    async def _partition_heads(self, query: Dict, order: str, limit: int, seen: Set[str]) -> List[Dict]:
+        """Up to ``limit`` events matching ``query`` that are the oldest
+        unfinished event of their partition.
+
+        Only a partition's head may run, so a partition waiting on a retry
+        holds back its own later events only. Candidates come straight off
+        the ``(status, nextAttemptAt)`` or ``(status, lockedUntil)`` index
+        and each is checked against ``(partitionKey, status, _id)``; at most
+        ``max_scan`` are looked at per poll, so a backlog is never scanned
+        in full.
+        """
+        heads = []
+        checked = set(seen)
+        scanned = 0
+        cursor = self.collection.find(query, {"partitionKey": 1}).sort(order, 1).batch_size(self.max_scan)
+        async for candidate in cursor:
+            scanned += 1
+            if scanned > self.max_scan:
+                break
+            if candidate["partitionKey"] in checked:
+                continue
+            checked.add(candidate["partitionKey"])
+            older = await self.collection.find_one(
+                {"partitionKey": candidate["partitionKey"], "status": {"$in": UNFINISHED}, "_id": {"$lt": candidate["_id"]}},
+                {"_id": 1}
+            )
+            if older is None:
+                heads.append(candidate)
+                seen.add(candidate["partitionKey"])
+                if len(heads) >= limit:
+                    break
+        return heads
+
+    async def _heartbeat(self, event_id: str, work: asyncio.Task):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                renewed = await self.collection.update_one(
+                    {"_id": event_id, "status": "processing", "lockedBy": self.worker_id},
+                    {"$set": {"lockedUntil": datetime.utcnow() + timedelta(seconds=self.lease)}}
+                )
+            except Exception as e:
+                logger.error(f"Error renewing lease on webhook event {event_id}: {str(e)}")
+                continue
+            if not renewed.matched_count:
+                # Claimed again after a long stall; stop rather than run twice
+                logger.error(f"Webhook event {event_id} lost its lease; cancelling")
+                work.cancel()
+                return
+
+    async def _process(self, event: Dict):
+        handler = self.handlers.get(event["eventType"])
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler for event type {event['eventType']}")
+            work = asyncio.create_task(handler(event["payload"], event["receivedAt"]))
+            heartbeat = asyncio.create_task(self._heartbeat(event["_id"], work))
+            try:
+                result = await work
+            except asyncio.CancelledError:
+                if not heartbeat.done():
+                    # The worker is stopping
+                    raise
+                # The worker that holds the lease now finishes the event
+                return
+            finally:
+                heartbeat.cancel()
+            now = datetime.utcnow()
+            await self.collection.update_one(
+                {"_id": event["_id"], "lockedBy": self.worker_id},
+                {
+                    "$set": {"status": "done", "result": result, "processedAt": now, "expiresAt": now + self.done_retention},
+                    "$unset": {"lockedBy": "", "lockedUntil": "", "lastError": ""}
+                }
+            )
+            self.processed += 1
+        except Exception as e:
+            self.failed += 1
+            attempts = event.get("attempts", 1)
+            if attempts >= self.max_attempts:
+                logger.error(f"Webhook event {event['_id']} dead-lettered after {attempts} attempts: {str(e)}")
+                update = {"status": "dead", "lastError": str(e), "deadAt": datetime.utcnow()}
+            else:
+                delay = min(self.retry_base * 2 ** (attempts - 1), 3600) * random.uniform(0.8, 1.2)
+                logger.warning(f"Webhook event {event['_id']} failed (attempt {attempts}), retrying in {delay:.0f}s: {str(e)}")
+                update = {"status": "pending", "lastError": str(e), "nextAttemptAt": datetime.utcnow() + timedelta(seconds=delay)}
+            await self.collection.update_one(
+                {"_id": event["_id"], "lockedBy": self.worker_id},
+                {"$set": update, "$unset": {"lockedBy": "", "lockedUntil": ""}}
+            )
+
+    async def stats(self) -> Dict:
+        counts = await self.collection.aggregate([
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+        ]).to_list(10)
+        return {
+            "by_status": {entry["_id"]: entry["count"] for entry in counts},
+            "processed": self.processed,
+            "failed": self.failed
+        }
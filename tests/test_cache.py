@@ -0,0 +1,136 @@
+"""
+Shared cache tests against a local Redis (CACHE_TEST_REDIS_URL, default
+redis://localhost:6379/15); skipped when none is reachable.
+
+    python -m pytest tests/test_cache.py
+"""
+
+import os
+import sys
+import uuid
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from cache import RedisCacheBackend, SharedCache, _MISSING  # noqa: E402
+
+REDIS_URL = os.environ.get("CACHE_TEST_REDIS_URL", "redis://localhost:6379/15")
+
+
+def _redis_available() -> bool:
+    try:
+        import redis
+        redis.Redis.from_url(REDIS_URL, socket_connect_timeout=0.5).ping()
+        return True
+    except Exception:
+        return False
+
+
+pytestmark = pytest.mark.skipif(not _redis_available(), reason=f"no Redis at {REDIS_URL}")
+
+
+def run(test):
+    """Run ``test(make_worker)``; each worker is a SharedCache with its own
+    Redis connection, as in separate processes. Keys are removed afterwards."""
+    async def main():
+        prefix = f"test-{uuid.uuid4().hex}"
+        backends = []
+
+        async def make_worker(**kwargs) -> SharedCache:
+            backend = RedisCacheBackend(REDIS_URL, prefix=prefix)
+            backends.append(backend)
+            return SharedCache("lookups", backend, **kwargs)
+
+        try:
+            await test(make_worker)
+        finally:
+            async for key in backends[0].redis.scan_iter(match=f"{prefix}:*"):
+                await backends[0].redis.delete(key)
+            for backend in backends:
+                await backend.close()
+    asyncio.run(main())
+
+
+def test_value_loaded_on_one_worker_is_served_to_another():
+    async def scenario(make_worker):
+        a, b = await make_worker(), await make_worker()
+
+        async def loader():
+            return {"owner": "a@example.com", "properties": 2}
+        assert await a.get_or_load("a@example.com", "summary", loader) == {"owner": "a@example.com", "properties": 2}
+
+        async def unexpected():
+            raise AssertionError("should have been served from Redis")
+        assert await b.get_or_load("a@example.com", "summary", unexpected) == {"owner": "a@example.com", "properties": 2}
+        assert (a.loads, b.loads, b.backend_hits) == (1, 0, 1)
+    run(scenario)
+
+
+def test_invalidate_drops_the_group_for_every_worker():
+    async def scenario(make_worker):
+        a, b = await make_worker(local_ttl=0), await make_worker(local_ttl=0)
+        version = 1
+
+        async def loader():
+            return {"version": version}
+        await a.get_or_load("group", "key", loader)
+        version = 2
+        await b.invalidate("group")
+        assert await a.backend.get("lookups", "group", "key") is _MISSING
+        assert await a.get_or_load("group", "key", loader) == {"version": 2}
+    run(scenario)
+
+
+def test_load_started_before_an_invalidation_elsewhere_is_not_stored():
+    async def scenario(make_worker):
+        a, b = await make_worker(), await make_worker()
+        loading, release = asyncio.Event(), asyncio.Event()
+
+        async def slow_loader():
+            loading.set()
+            await release.wait()
+            return {"version": "stale"}
+        load = asyncio.create_task(a.get_or_load("group", "key", slow_loader))
+        await loading.wait()
+        # Worker B writes and invalidates; A has not heard of it yet
+        await b.invalidate("group")
+        release.set()
+        assert await load == {"version": "stale"}
+        assert a.discarded == 1
+        assert await b.backend.get("lookups", "group", "key") is _MISSING
+
+        async def fresh_loader():
+            return {"version": "fresh"}
+        assert await b.get_or_load("group", "key", fresh_loader) == {"version": "fresh"}
+        assert await a.get_or_load("group", "key", fresh_loader) == {"version": "fresh"}
+    run(scenario)
+
+
+def test_concurrent_misses_run_the_loader_once():
+    async def scenario(make_worker):
+        workers = [await make_worker(poll_interval=0.01) for _ in range(3)]
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.1)
+            return {"calls": calls}
+        results = await asyncio.gather(*(worker.get_or_load("group", "key", loader) for worker in workers))
+        assert calls == 1
+        assert results == [{"calls": 1}] * 3
+    run(scenario)
+
+
+def test_invalidations_reach_the_other_workers():
+    async def scenario(make_worker):
+        a, b = await make_worker(), await make_worker()
+        received = asyncio.Queue()
+        await a.backend.start(lambda namespace, group: received.put_nowait((namespace, group)))
+        # Let the subscription settle before publishing
+        await asyncio.sleep(0.2)
+        await b.invalidate("owner@example.com")
+        assert await asyncio.wait_for(received.get(), timeout=2) == ("lookups", "owner@example.com")
+    run(scenario)